@@ -33,7 +33,8 @@ export const sendMailChatMessage = async (req: Request, res: Response) => {
       userPrompt,
       systemPrompt,
       0.8, // temperature - slightly creative
-      800  // max tokens - enough for full email
+      800, // max tokens - enough for full email
+      'bulk' // mail generation queues behind interactive chat
     );
     console.log(answer);
     // ✅ This one was already correct
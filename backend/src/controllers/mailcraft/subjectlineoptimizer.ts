@@ -32,7 +32,8 @@ export const sendSubjectLineChatMessage = async (req: Request, res: Response) =>
       userPrompt,
       systemPrompt,
       0.9, // temperature - more creative for subject lines
-      300  // max tokens - subject lines are short
+      300, // max tokens - subject lines are short
+      'bulk' // mail generation queues behind interactive chat
     );
 
     await prisma.subjectLineChatMessage.create({
@@ -66,7 +66,8 @@ Always respond in a helpful, professional manner.`;
     const answer = await llmService.chatCompletion(
       fullConversation,
       0.7, // temperature
-      1000 // max tokens
+      1000, // max tokens
+      'bulk' // mail generation queues behind interactive chat
     );
 
     // Save AI response
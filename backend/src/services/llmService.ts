@@ -25,6 +25,12 @@ interface ChatMessage {
   content: string;
 }
 
+/**
+ * Generation queue lane in the LLM service (it defaults to 'interactive');
+ * 'bulk' work waits behind interactive chat when Ollama is busy
+ */
+type GenerationPriority = 'interactive' | 'default' | 'bulk';
+
 /**
  * Request payload for chat completion
  */
@@ -32,6 +38,7 @@ interface ChatCompletionRequest {
   messages: ChatMessage[];
   temperature?: number;
   max_tokens?: number;
+  priority?: GenerationPriority;
 }
 
 /**
@@ -92,18 +99,21 @@ class LLMService {
    * @param messages - Array of chat messages (system, user, assistant)
    * @param temperature - Randomness (0.0-1.0), default 0.7
    * @param maxTokens - Max response length, default 500
+   * @param priority - Generation queue lane, default 'interactive'
    * @returns Generated response text
    */
   async chatCompletion(
     messages: ChatMessage[],
     temperature: number = 0.7,
-    maxTokens: number = 500
+    maxTokens: number = 500,
+    priority?: GenerationPriority
   ): Promise<string> {
     try {
       const payload: ChatCompletionRequest = {
         messages,
         temperature,
         max_tokens: maxTokens,
+        ...(priority && { priority }),
       };
 
       console.log('🔵 Sending request to LLM service:', `${LLM_SERVICE_URL}/api/llm/chat`);
@@ -145,13 +155,15 @@ class LLMService {
    * @param systemPrompt - Optional system instruction
    * @param temperature - Randomness (0.0-1.0)
    * @param maxTokens - Max response length
+   * @param priority - Generation queue lane, default 'interactive'
    * @returns Generated response text
    */
   async simpleCompletion(
     prompt: string,
     systemPrompt?: string,
     temperature: number = 0.7,
-    maxTokens: number = 500
+    maxTokens: number = 500,
+    priority?: GenerationPriority
   ): Promise<string> {
     const messages: ChatMessage[] = [];
 
@@ -169,7 +181,7 @@ class LLMService {
       content: prompt,
     });
 
-    return this.chatCompletion(messages, temperature, maxTokens);
+    return this.chatCompletion(messages, temperature, maxTokens, priority);
   }
 
   /**
@@ -186,7 +198,7 @@ class LLMService {
       context || ''
     }`;
 
-    return this.simpleCompletion(userRequest, systemPrompt, 0.8, 800);
+    return this.simpleCompletion(userRequest, systemPrompt, 0.8, 800, 'bulk');
   }
 
   /**
@@ -202,7 +214,7 @@ class LLMService {
     const systemPrompt = 'You are an expert content editor and writer.';
     const prompt = `${instruction}\n\nText: ${text}`;
 
-    return this.simpleCompletion(prompt, systemPrompt, 0.7, 500);
+    return this.simpleCompletion(prompt, systemPrompt, 0.7, 500, 'bulk');
   }
 }
 
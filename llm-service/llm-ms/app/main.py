@@ -5,16 +5,33 @@ FastAPI server that provides LLM capabilities using self-hosted Llama models
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from starlette.routing import Match
 from dotenv import load_dotenv
 import os
 import time
+import uuid
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Configure JSON logging before the services log anything
+from app.services.logging_service import log_service, get_logger, request_id
+
+logger = get_logger(__name__)
+
 # Import routes
 from app.routes import chat, rag
+from app.services.http_service import http_service
+from app.services.cache_service import embedding_cache, response_cache
+from app.services.chroma_service import chroma_service
+from app.services.embedding_service import embedding_service
+from app.services.ollama_service import ollama_service
+from app.services.ollama_pool_service import generation_pool, embedding_pool
+from app.services.health_service import health_monitor
+from app.services.metrics_service import metrics, current_route
+from app.services.vector_store_service import InvalidCollectionName
+from app.services.upstream_service import UpstreamError, upstream, REQUEST_DEADLINE, INGEST_DEADLINE, REQUEST_DEADLINE_MAX
 
 # Create FastAPI application
 app = FastAPI(
@@ -36,21 +53,58 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+def route_template(request: Request) -> str:
+    """Matched route path (e.g. "/api/rag/document/{document_id}"), for bounded metric labels"""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+def request_budget(request: Request, route: str) -> float:
+    """Deadline budget in seconds (0 = none): X-Request-Timeout, else the route's default"""
+    try:
+        requested = float(request.headers.get("x-request-timeout", ""))
+    except ValueError:
+        requested = 0.0
+    if requested > 0:
+        return min(requested, REQUEST_DEADLINE_MAX)
+    # Ingestion is batch work that may legitimately take long
+    return INGEST_DEADLINE if route.startswith("/api/rag/ingest") else REQUEST_DEADLINE
+
 # Request logging middleware - logs every request
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Log all incoming requests with timing"""
+    """Log all incoming requests with timing and record request metrics"""
     start_time = time.time()
-    
-    # Process request
-    response = await call_next(request)
-    
-    # Calculate duration
-    process_time = time.time() - start_time
-    
-    # Log to console
-    print(f"{request.method} {request.url.path} - {response.status_code} - {process_time:.2f}s")
-    
+    route = route_template(request)
+    # Log lines and stages recorded while handling this request carry its
+    # id (taken from X-Request-ID when the caller sends one) and route
+    rid = request.headers.get("x-request-id") or uuid.uuid4().hex
+    request_id.set(rid)
+    current_route.set(route)
+    # Every upstream call of this request shares one deadline budget
+    upstream.set_deadline(request_budget(request, route))
+    metrics.request_started(route)
+    status_code = 500
+
+    try:
+        # Process request
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        # Calculate duration
+        process_time = time.time() - start_time
+        metrics.request_finished(request.method, route, status_code, process_time)
+
+    logger.info("request", extra={
+        "method": request.method,
+        "path": request.url.path,
+        "status": response.status_code,
+        "duration_ms": round(process_time * 1000, 2),
+    })
+
+    response.headers["X-Request-ID"] = rid
     return response
 
 # Include routers (API endpoints)
@@ -72,6 +126,38 @@ async def root():
         "health": "/api/llm/health"
     }
 
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Prometheus metrics: request and per-stage latency histograms, in-flight
+    gauges and error counters
+    """
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+# Upstream policy refusals: 429 (generation queue), 503 (circuit open), 504 (deadline)
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, exc: UpstreamError):
+    """
+    Answer with the status the upstream policy chose, plus Retry-After when known
+    """
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers=exc.headers
+    )
+
+@app.exception_handler(InvalidCollectionName)
+async def invalid_collection_name_handler(request: Request, exc: InvalidCollectionName):
+    """
+    Reject collection names that are unsafe as file names
+    """
+    return JSONResponse(
+        status_code=400,
+        content={"detail": str(exc)}
+    )
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -93,13 +179,29 @@ async def startup_event():
     """
     Run when the service starts
     """
-    print("=" * 50)
-    print("🚀 KaryoAI LLM Service Starting...")
-    print(f"📝 Model: {os.getenv('MODEL_NAME', 'llama3.2:latest')}")
-    print(f"🔗 Ollama: {os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')}")
-    print(f"🌐 CORS Origins: {CORS_ORIGINS}")
-    print(f"📚 API Docs: http://localhost:{os.getenv('PORT', '8001')}/docs")
-    print("=" * 50)
+    # Log writer thread (already running unless the app was restarted in-process)
+    log_service.start()
+
+    # Open the shared Ollama connection pool
+    await http_service.start()
+
+    # Open the persistent cache tiers (memory-only until now)
+    embedding_cache.open()
+    response_cache.open()
+
+    # Probe dependencies in the background; request paths read the cached status
+    health_monitor.register("ollama", ollama_service.check_health)
+    health_monitor.register("embedding_model", embedding_service.check_embedding_model_available)
+    health_monitor.register("chromadb", chroma_service.check_health)
+    await health_monitor.start()
+
+    logger.info("KaryoAI LLM Service starting", extra={
+        "model": os.getenv("MODEL_NAME", "llama3.2:latest"),
+        "ollama_generation": generation_pool.urls,
+        "ollama_embedding": embedding_pool.urls,
+        "cors_origins": CORS_ORIGINS,
+        "docs": f"http://localhost:{os.getenv('PORT', '8001')}/docs",
+    })
 
 # Shutdown event
 @app.on_event("shutdown")
@@ -107,4 +209,15 @@ async def shutdown_event():
     """
     Run when the service stops
     """
-    print("🛑 KaryoAI LLM Service Shutting Down...")
+    logger.info("KaryoAI LLM Service shutting down")
+
+    await health_monitor.stop()
+
+    # Close pooled upstream connections cleanly
+    await http_service.close()
+    chroma_service.close()
+    embedding_cache.close()
+    response_cache.close()
+
+    # Flush queued log records
+    log_service.stop()
@@ -4,7 +4,7 @@ These define the structure and types of data the API accepts and returns
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 class Message(BaseModel):
     """Single chat message"""
@@ -17,12 +17,18 @@ class ChatRequest(BaseModel):
     temperature: Optional[float] = Field(0.7, ge=0.0, le=2.0, description="Creativity (0=deterministic, 2=very creative)")
     max_tokens: Optional[int] = Field(512, ge=1, le=4096, description="Maximum response length")
     model: Optional[str] = Field(None, description="Override default model")
+    stream: Optional[bool] = Field(False, description="Stream tokens back as Server-Sent Events")
+    cache: Optional[bool] = Field(None, description="Response cache: default caches only temperature 0; true opts in at any temperature, so a sampled (temperature > 0) answer is replayed verbatim for identical requests instead of being re-sampled; false bypasses")
+    priority: Optional[Literal["interactive", "default", "bulk"]] = Field("interactive", description="Generation queue lane; chat is interactive unless the caller marks it \"bulk\" (e.g. mail generation)")
 
 class ChatResponse(BaseModel):
     """Response from chat endpoint"""
     response: str = Field(..., description="Generated text")
     model: str = Field(..., description="Model used for generation")
     tokens_used: Optional[int] = Field(None, description="Number of tokens in response")
+    prompt_tokens: Optional[int] = Field(None, description="Number of prompt tokens evaluated (not served from the KV cache)")
+    prompt_eval_ms: Optional[float] = Field(None, description="Time Ollama spent evaluating the prompt")
+    cached: Optional[bool] = Field(None, description="True if served from the response cache")
 
 class HealthResponse(BaseModel):
     """Health check response"""
@@ -30,3 +36,5 @@ class HealthResponse(BaseModel):
     service: str = Field(..., description="Service name")
     model: str = Field(..., description="Currently configured model")
     ollama_status: str = Field(..., description="Ollama service status")
+    last_checked: Optional[str] = Field(None, description="When Ollama was last probed (ISO-8601)")
+    last_seen: Optional[str] = Field(None, description="When Ollama was last seen healthy (ISO-8601)")
@@ -4,13 +4,73 @@ Defines endpoints for chatting with the LLM and checking health
 """
 
 from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
 from app.models.schemas import ChatRequest, ChatResponse, HealthResponse
 from app.services.ollama_service import ollama_service
+from app.services.health_service import health_monitor
+from app.services.cache_service import response_cache
+from app.services.singleflight_service import singleflight
+from app.services.scheduler_service import generation_scheduler
+from app.services.upstream_service import UpstreamError, upstream
+from app.services.ollama_pool_service import generation_pool, embedding_pool
+from typing import AsyncIterator, Dict, Optional
+import json
 import os
 
 # Create router (will be registered in main.py)
 router = APIRouter()
 
+
+def _sse(event: str, data: Dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_chat_events(
+    stream: AsyncIterator[Dict],
+    first: Optional[Dict],
+    model: str
+) -> AsyncIterator[str]:
+    """
+    Relay Ollama's token stream as SSE
+    
+    Emits a "token" event per generated piece, then one "done" event with the
+    model and token counts (or an "error" event if generation fails midway).
+    
+    Args:
+        stream: Started ollama_service.chat_stream iterator
+        first: Its first object, already read (None if it ended without one)
+        model: Requested model, reported if Ollama does not name it
+
+    The stream is closed as soon as this generator is, e.g. when the client
+    disconnects, which frees its generation slot and stops the upstream
+    request instead of leaving both to the garbage collector.
+    """
+    async def relay() -> AsyncIterator[Dict]:
+        if first is not None:
+            yield first
+            async for data in stream:
+                yield data
+
+    try:
+        async for data in relay():
+            token = data.get("response", "")
+            if token:
+                yield _sse("token", {"token": token})
+
+            if data.get("done"):
+                yield _sse("done", {
+                    "model": data.get("model", model),
+                    "tokens_used": data.get("eval_count", 0),
+                    "prompt_tokens": data.get("prompt_eval_count", 0),
+                    "prompt_eval_ms": round(data.get("prompt_eval_duration", 0) / 1e6, 2),
+                    "done_reason": data.get("done_reason")
+                })
+    except Exception as e:
+        yield _sse("error", {"detail": f"Error generating response: {str(e)}"})
+    finally:
+        await stream.aclose()
+
 @router.post("/chat", response_model=ChatResponse, status_code=status.HTTP_200_OK)
 async def chat_completion(request: ChatRequest):
     """
@@ -20,6 +80,21 @@ async def chat_completion(request: ChatRequest):
     - messages: List of {role, content} objects
     - temperature: Controls randomness (0-2)
     - max_tokens: Maximum response length (1-4096)
+    - stream: If true, respond with text/event-stream: "token" events as they
+      are generated, then a final "done" event with model and token counts
+    - cache: Exact-match response cache. By default only temperature 0
+      requests are cached; true opts in at any temperature, replaying one
+      sampled answer for identical requests; false bypasses (streams never
+      cache)
+    - priority: Generation queue lane, "interactive" (default), "default" or
+      "bulk". Interactive requests are served before queued default and bulk
+      ones, so batch callers such as mail generation should send "bulk";
+      when the queue is full or the wait would be too long the request is
+      rejected with 429 and a Retry-After header
+    
+    Fails fast with 503 while Ollama's circuit breaker is open, and with 504
+    once the request's deadline budget (X-Request-Timeout header, in
+    seconds) is spent.
     
     Example:
         POST /api/llm/chat
@@ -32,9 +107,8 @@ async def chat_completion(request: ChatRequest):
         }
     """
     try:
-        # Check if Ollama is running
-        is_healthy = await ollama_service.check_health()
-        if not is_healthy:
+        # Check if Ollama is running (cached by the background prober, no I/O)
+        if not health_monitor.is_healthy("ollama"):
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Ollama service is not running. Please start Ollama with 'docker start llm-service'"
@@ -43,24 +117,65 @@ async def chat_completion(request: ChatRequest):
         # Convert Pydantic models to dictionaries
         messages = [msg.dict() for msg in request.messages]
         
+        if request.stream:
+            stream = ollama_service.chat_stream(
+                messages=messages,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens,
+                model=request.model,
+                priority=request.priority
+            )
+            # Wait for the first object before answering, so a request the
+            # upstream policy turns away (full queue, open circuit, spent
+            # budget) still gets a proper 429/503/504 instead of a 200 stream
+            # with an error event
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                first = None
+            except UpstreamError:
+                raise
+            except Exception as e:
+                return StreamingResponse(
+                    iter([_sse("error", {"detail": f"Error generating response: {str(e)}"})]),
+                    media_type="text/event-stream",
+                    headers={"Cache-Control": "no-cache"}
+                )
+            return StreamingResponse(
+                _stream_chat_events(stream, first, model=request.model),
+                media_type="text/event-stream",
+                headers={
+                    "Cache-Control": "no-cache",
+                    "X-Accel-Buffering": "no"  # Stop reverse proxies from buffering tokens
+                }
+            )
+        
         # Generate response using Ollama
         result = await ollama_service.chat(
             messages=messages,
             temperature=request.temperature,
             max_tokens=request.max_tokens,
-            model=request.model
+            model=request.model,
+            cache=request.cache,
+            priority=request.priority
         )
         
         # Return formatted response
         return ChatResponse(
             response=result["response"],
             model=result["model"],
-            tokens_used=result.get("tokens_used")
+            tokens_used=result.get("tokens_used"),
+            prompt_tokens=result.get("prompt_tokens"),
+            prompt_eval_ms=result.get("prompt_eval_ms"),
+            cached=result.get("cached")
         )
     
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
+    except UpstreamError:
+        # Answered with 429/503/504 by the app-level handler
+        raise
     except Exception as e:
         # Catch any other errors and return 500
         raise HTTPException(
@@ -73,20 +188,59 @@ async def health_check():
     """
     Check if LLM service and Ollama are running
     
+    Reads the status cached by the background health prober (no upstream call).
+    
     Returns:
         - status: "healthy" or "unhealthy"
         - service: Service name
         - model: Currently configured model
         - ollama_status: "running" or "not running"
+        - last_checked / last_seen: When Ollama was last probed / last seen healthy
         
     Example:
         GET /api/llm/health
     """
-    is_ollama_healthy = await ollama_service.check_health()
+    is_ollama_healthy = health_monitor.is_healthy("ollama")
+    ollama = health_monitor.status("ollama")
     
     return HealthResponse(
         status="healthy" if is_ollama_healthy else "degraded",
         service="KaryoAI LLM Service",
         model=os.getenv("MODEL_NAME", "llama3.2:latest"),
-        ollama_status="running" if is_ollama_healthy else "not running"
+        ollama_status="running" if is_ollama_healthy else "not running",
+        last_checked=ollama["last_checked"],
+        last_seen=ollama["last_seen"]
     )
+
+
+@router.get("/cache/stats")
+async def get_response_cache_stats() -> dict:
+    """Get hit/miss counters, size and evictions for the chat response cache"""
+    return response_cache.stats()
+
+
+@router.get("/singleflight/stats")
+async def get_singleflight_stats() -> dict:
+    """Get how many identical in-flight embedding/generation calls were collapsed"""
+    return singleflight.stats()
+
+
+@router.get("/scheduler/stats")
+async def get_scheduler_stats() -> dict:
+    """Get running/queued generations, per-lane queue depth, wait times and rejections"""
+    return generation_scheduler.stats()
+
+
+@router.get("/backends")
+async def get_backend_stats() -> dict:
+    """Get the Ollama backend pools: in-flight requests, models and ejection state per backend"""
+    return {
+        "generation": generation_pool.stats(),
+        "embedding": embedding_pool.stats(),
+    }
+
+
+@router.get("/upstream/stats")
+async def get_upstream_stats() -> dict:
+    """Get the circuit breaker state of each upstream dependency and the deadline budgets"""
+    return upstream.stats()
@@ -3,12 +3,20 @@ RAG API Routes
 Defines endpoints for document ingestion, retrieval, and RAG queries
 """
 
-from fastapi import APIRouter, HTTPException, status
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Request, status
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, List, Literal, Optional
 from app.services.rag_service import rag_service
-from app.services.embedding_service import embedding_service
+from app.services.embedding_service import embedding_service, query_batcher
 from app.services.chroma_service import chroma_service
+from app.services.cache_service import embedding_cache, answer_cache
+from app.services.lexical_service import lexical_index
+from app.services.chunking_service import chunker
+from app.services.health_service import health_monitor
+from app.services.upstream_service import UpstreamError
+from app.services.vector_store_service import InvalidCollectionName
+import codecs
+import json
 import os
 
 # Create router
@@ -30,6 +38,41 @@ class IngestDocumentResponse(BaseModel):
     document_id: str
     chunk_count: int
     collection_id: str
+    # Re-ingestion only embeds new chunks and deletes the ones that disappeared
+    chunks_embedded: int = 0
+    chunks_unchanged: int = 0
+    chunks_deleted: int = 0
+
+
+class BatchIngestRequest(BaseModel):
+    """Request to ingest several documents at once"""
+    documents: List[IngestDocumentRequest] = Field(..., min_length=1)
+
+
+class BatchIngestResult(BaseModel):
+    """Outcome for one document of a batch ingestion"""
+    status: str
+    document_id: str
+    chunk_count: int
+    collection_id: Optional[str] = None
+    error: Optional[str] = None
+    chunks_embedded: int = 0
+    chunks_unchanged: int = 0
+    chunks_deleted: int = 0
+
+
+class BatchIngestResponse(BaseModel):
+    """Response from batch ingestion"""
+    results: List[BatchIngestResult]
+    succeeded: int
+    failed: int
+
+
+class DeleteDocumentResponse(BaseModel):
+    """Response from document deletion"""
+    status: str
+    document_id: str
+    chunks_deleted: int
 
 
 class RetrieveContextRequest(BaseModel):
@@ -37,6 +80,8 @@ class RetrieveContextRequest(BaseModel):
     query: str
     collection_name: str = "documents"
     n_results: int = 5
+    # None uses the configured RETRIEVAL_MODE
+    retrieval_mode: Optional[Literal["vector", "hybrid", "lexical"]] = None
 
 
 class RetrieveContextResponse(BaseModel):
@@ -45,6 +90,31 @@ class RetrieveContextResponse(BaseModel):
     source_count: int
 
 
+class BatchRetrieveRequest(BaseModel):
+    """Request to retrieve context for several queries at once"""
+    queries: List[str] = Field(..., min_length=1)
+    collection_name: str = "documents"
+    n_results: int = 5
+    # None uses the configured RETRIEVAL_MODE
+    retrieval_mode: Optional[Literal["vector", "hybrid", "lexical"]] = None
+    # Return each chunk only for the first query that retrieves it
+    deduplicate: bool = False
+
+
+class BatchRetrieveResult(BaseModel):
+    """Context retrieved for one query of a batch"""
+    query: str
+    chunks: List[dict]
+    source_count: int
+
+
+class BatchRetrieveResponse(BaseModel):
+    """Response from batch context retrieval"""
+    results: List[BatchRetrieveResult]
+    # Distinct chunks across all queries
+    unique_chunks: int
+
+
 class RAGQueryRequest(BaseModel):
     """Request for RAG query"""
     query: str
@@ -52,6 +122,13 @@ class RAGQueryRequest(BaseModel):
     n_context_chunks: int = 5
     temperature: float = 0.7
     max_tokens: int = 512
+    use_cache: bool = True
+    # None uses the configured RETRIEVAL_MODE
+    retrieval_mode: Optional[Literal["vector", "hybrid", "lexical"]] = None
+    # Generation scheduler lane; None uses "default"
+    priority: Optional[Literal["interactive", "default", "bulk"]] = None
+    # Estimated tokens of context in the prompt; None uses CONTEXT_TOKEN_BUDGET, 0 = no budget
+    context_token_budget: Optional[int] = Field(None, ge=0)
 
 
 class RAGQueryResponse(BaseModel):
@@ -60,6 +137,12 @@ class RAGQueryResponse(BaseModel):
     context: List[dict]
     source_count: int
     model: str
+    # Estimated prompt tokens of the packed context; saved by merging overlapping
+    # chunks (versus sending them verbatim); left out to stay within the budget
+    context_tokens: int = 0
+    tokens_saved: int = 0
+    tokens_dropped: int = 0
+    cached: bool = False
 
 
 # Endpoints
@@ -68,7 +151,8 @@ async def ingest_document(request: IngestDocumentRequest):
     """
     Ingest a document for RAG
     
-    Chunks the document, generates embeddings, and stores in ChromaDB
+    Chunks the document, generates embeddings, and stores in ChromaDB.
+    Re-ingesting an existing document_id only embeds chunks that changed.
     
     Args:
         document_id: Unique identifier for the document
@@ -87,6 +171,102 @@ async def ingest_document(request: IngestDocumentRequest):
             collection_name=request.collection_name
         )
         return IngestDocumentResponse(**result)
+    except (UpstreamError, InvalidCollectionName):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Document ingestion failed: {str(e)}"
+        )
+
+
+@router.post("/ingest/batch", response_model=BatchIngestResponse)
+async def ingest_documents_batch(request: BatchIngestRequest):
+    """
+    Ingest many documents in one call
+    
+    Documents are processed concurrently (up to INGEST_BATCH_CONCURRENCY at a
+    time), share embedding batches, and are written to ChromaDB with coalesced
+    upserts. Each document gets its own status, so one failure doesn't sink
+    the batch. If a document_id appears more than once for the same
+    collection, only the last entry is ingested; earlier ones fail as
+    superseded.
+    
+    Args:
+        documents: List of ingest requests (same fields as /ingest)
+        
+    Returns:
+        Per-document results plus succeeded/failed counts
+    """
+    try:
+        result = await rag_service.ingest_documents_batch(
+            [doc.model_dump() for doc in request.documents]
+        )
+        return BatchIngestResponse(**result)
+    except (UpstreamError, InvalidCollectionName):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Batch ingestion failed: {str(e)}"
+        )
+
+
+async def _decode_body(request: Request) -> AsyncIterator[str]:
+    """Decode a streamed UTF-8 request body piece by piece"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    async for data in request.stream():
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+@router.post("/ingest/stream", response_model=IngestDocumentResponse)
+async def ingest_document_stream(
+    request: Request,
+    document_id: str,
+    collection_name: str = "documents",
+    metadata: Optional[str] = None
+):
+    """
+    Ingest a document streamed as the raw request body
+    
+    The body (plain UTF-8 text, sent chunked or as an upload, e.g.
+    `curl --data-binary @doc.txt`) is chunked as it arrives. Chunking, embedding
+    and ChromaDB writes run as a bounded pipeline, so memory use does not
+    grow with document size. Poll /ingest/progress/{document_id} for progress.
+    
+    Args:
+        document_id: Unique identifier for the document (query parameter)
+        collection_name: Name of the collection to store in (query parameter)
+        metadata: Optional JSON-encoded metadata object (query parameter)
+        
+    Returns:
+        Ingestion status with chunk count
+    """
+    try:
+        parsed_metadata = json.loads(metadata) if metadata else None
+        if parsed_metadata is not None and not isinstance(parsed_metadata, dict):
+            raise ValueError("metadata must be a JSON object")
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid metadata: {str(e)}"
+        )
+
+    try:
+        result = await rag_service.ingest_document_stream(
+            document_id=document_id,
+            text_stream=_decode_body(request),
+            metadata=parsed_metadata,
+            collection_name=collection_name
+        )
+        return IngestDocumentResponse(**result)
+    except (UpstreamError, InvalidCollectionName):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -94,17 +274,63 @@ async def ingest_document(request: IngestDocumentRequest):
         )
 
 
+@router.get("/ingest/progress/{document_id}")
+async def get_ingest_progress(document_id: str, collection_name: str = "documents") -> dict:
+    """Get progress counters of a streaming ingestion job"""
+    progress = rag_service.get_ingest_progress(document_id, collection_name)
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No ingestion job found for document '{document_id}'"
+        )
+    return progress
+
+
+@router.delete("/document/{document_id}", response_model=DeleteDocumentResponse)
+async def delete_document(document_id: str, collection_name: str = "documents"):
+    """
+    Delete a document and all of its chunks
+    
+    Args:
+        document_id: Document to delete
+        collection_name: Collection containing the document (query parameter)
+        
+    Returns:
+        Number of chunks deleted (404 if the document has no stored chunks)
+    """
+    try:
+        result = await rag_service.delete_document(
+            document_id=document_id,
+            collection_name=collection_name
+        )
+    except (UpstreamError, InvalidCollectionName):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Document deletion failed: {str(e)}"
+        )
+    if result["status"] == "not_found":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Document '{document_id}' not found in collection '{collection_name}'"
+        )
+    return DeleteDocumentResponse(**result)
+
+
 @router.post("/retrieve")
 async def retrieve_context(request: RetrieveContextRequest) -> RetrieveContextResponse:
     """
     Retrieve relevant document chunks for a query
     
-    Finds the most relevant chunks from the knowledge base based on semantic similarity
+    Finds the most relevant chunks from the knowledge base based on semantic
+    similarity, BM25 keyword matching, or both fused by reciprocal rank
     
     Args:
         query: Question or search query
         collection_name: Name of the collection to search
         n_results: Number of chunks to retrieve
+        retrieval_mode: "vector", "hybrid" or "lexical" (no embedding call)
         
     Returns:
         List of relevant chunks with similarity scores
@@ -113,9 +339,56 @@ async def retrieve_context(request: RetrieveContextRequest) -> RetrieveContextRe
         chunks = await rag_service.retrieve_context(
             query=request.query,
             collection_name=request.collection_name,
-            n_results=request.n_results
+            n_results=request.n_results,
+            mode=request.retrieval_mode
         )
         return RetrieveContextResponse(chunks=chunks, source_count=len(chunks))
+    except (UpstreamError, InvalidCollectionName):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Context retrieval failed: {str(e)}"
+        )
+
+
+@router.post("/retrieve/batch")
+async def retrieve_context_batch(request: BatchRetrieveRequest) -> BatchRetrieveResponse:
+    """
+    Retrieve relevant document chunks for several queries at once
+    
+    All queries are embedded in one batched embedding call and searched with
+    one multi-vector query, so N sub-questions cost one round trip to each
+    dependency instead of N
+    
+    Args:
+        queries: Questions or search queries
+        collection_name: Name of the collection to search
+        n_results: Number of chunks to retrieve per query
+        retrieval_mode: "vector", "hybrid" or "lexical" (no embedding call)
+        deduplicate: Return each chunk only once, for the first query that
+            retrieves it; later queries get their next best chunks
+        
+    Returns:
+        Ranked chunks per query, in request order
+    """
+    try:
+        retrieved = await rag_service.retrieve_context_batch(
+            queries=request.queries,
+            collection_name=request.collection_name,
+            n_results=request.n_results,
+            mode=request.retrieval_mode,
+            deduplicate=request.deduplicate
+        )
+        return BatchRetrieveResponse(
+            results=[
+                BatchRetrieveResult(query=query, chunks=chunks, source_count=len(chunks))
+                for query, chunks in zip(request.queries, retrieved)
+            ],
+            unique_chunks=len({chunk["chunk_id"] for chunks in retrieved for chunk in chunks})
+        )
+    except (UpstreamError, InvalidCollectionName):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -136,9 +409,17 @@ async def rag_query(request: RAGQueryRequest) -> RAGQueryResponse:
         n_context_chunks: Number of chunks to use for context
         temperature: LLM creativity (0-2)
         max_tokens: Max response length
+        use_cache: Reuse a cached answer for a semantically similar earlier query
+        retrieval_mode: "vector", "hybrid" (vector + BM25) or "lexical" (BM25 only)
+        priority: Generation lane ("interactive", "default" or "bulk"); when the
+            generation queue is saturated the request fails fast with 429 and
+            a Retry-After header
+        context_token_budget: Estimated tokens of context in the prompt; chunks
+            are packed in relevance order, overlapping ones merged
         
     Returns:
-        Generated answer with source chunks
+        Generated answer with source chunks, context_tokens, tokens_saved and
+        tokens_dropped (cached=true if served from cache)
     """
     try:
         result = await rag_service.rag_query(
@@ -146,9 +427,16 @@ async def rag_query(request: RAGQueryRequest) -> RAGQueryResponse:
             collection_name=request.collection_name,
             n_context_chunks=request.n_context_chunks,
             temperature=request.temperature,
-            max_tokens=request.max_tokens
+            max_tokens=request.max_tokens,
+            use_cache=request.use_cache,
+            retrieval_mode=request.retrieval_mode,
+            priority=request.priority,
+            context_token_budget=request.context_token_budget
         )
         return RAGQueryResponse(**result)
+    except (UpstreamError, InvalidCollectionName):
+        # Answered with 429/503/504 by the app-level handler
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -160,7 +448,7 @@ async def rag_query(request: RAGQueryRequest) -> RAGQueryResponse:
 async def list_collections() -> dict:
     """Get list of all available collections"""
     try:
-        collections = chroma_service.list_collections()
+        collections = await chroma_service.list_collections()
         return {
             "collections": collections,
             "count": len(collections)
@@ -176,8 +464,10 @@ async def list_collections() -> dict:
 async def get_collection_stats(collection_name: str) -> dict:
     """Get statistics about a collection"""
     try:
-        stats = chroma_service.get_collection_stats(collection_name)
+        stats = await chroma_service.get_collection_stats(collection_name)
         return stats
+    except InvalidCollectionName:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -209,6 +499,8 @@ async def generate_embedding(request: dict) -> dict:
             "embedding_dimension": len(embedding),
             "embedding": embedding[:50]  # Return only first 50 dimensions for readability
         }
+    except (UpstreamError, InvalidCollectionName):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -216,23 +508,52 @@ async def generate_embedding(request: dict) -> dict:
         )
 
 
+@router.get("/embedding/cache/stats")
+async def get_embedding_cache_stats() -> dict:
+    """Get hit rate, size and eviction counters for the embedding cache"""
+    return embedding_cache.stats()
+
+
+@router.get("/embedding/batch/stats")
+async def get_query_batch_stats() -> dict:
+    """Get batch counts and sizes for micro-batched query embeddings"""
+    return query_batcher.stats()
+
+
+@router.get("/query/cache/stats")
+async def get_answer_cache_stats() -> dict:
+    """Get hit rate, size and eviction counters for the semantic answer cache"""
+    return answer_cache.stats()
+
+
+@router.get("/lexical/stats")
+async def get_lexical_index_stats() -> dict:
+    """Get document and term counts of the loaded BM25 indexes"""
+    return lexical_index.stats()
+
+
 @router.get("/rag/health")
 async def rag_health_check() -> dict:
     """
     Check health of RAG system components
     
-    Returns status of ChromaDB and embedding model
+    Returns status of ChromaDB and embedding model as last seen by the
+    background health prober (no upstream calls)
     """
     try:
-        chroma_healthy = await chroma_service.check_health()
-        embedding_model_available = await embedding_service.check_embedding_model_available()
+        chroma_healthy = health_monitor.is_healthy("chromadb")
+        embedding_model_available = health_monitor.is_healthy("embedding_model")
         
         return {
             "status": "healthy" if (chroma_healthy and embedding_model_available) else "degraded",
             "chromadb": "running" if chroma_healthy else "not running",
             "embedding_model": f"{embedding_service.EMBEDDING_MODEL} available" if embedding_model_available else "not available",
             "chunk_size": embedding_service.CHUNK_SIZE,
-            "chunk_overlap": embedding_service.CHUNK_OVERLAP
+            "chunk_overlap": embedding_service.CHUNK_OVERLAP,
+            "chunking": chunker.describe(),
+            "embedding_batch_size": embedding_service.EMBEDDING_BATCH_SIZE,
+            "embedding_concurrency": embedding_service.EMBEDDING_CONCURRENCY,
+            "components": health_monitor.snapshot()
         }
     except Exception as e:
         raise HTTPException(
@@ -9,6 +9,7 @@ from app.services.query_service import query_service
 from app.services.embedding_service import embedding_service
 from app.services.chroma_service import chroma_service
 from app.services.ollama_service import ollama_service
+from app.services.http_service import http_service
 
 __all__ = [
     "rag_service",           # Facade for RAG pipeline
@@ -17,4 +18,5 @@ __all__ = [
     "embedding_service",     # Shared embedding service
     "chroma_service",        # Shared vector storage service
     "ollama_service",        # Shared LLM service
+    "http_service",          # Shared pooled HTTP client
 ]
@@ -0,0 +1,157 @@
+"""
+Batching Service - Cross-request micro-batching of small upstream calls
+Concurrent requests that each need one small upstream call (e.g. one query
+embedding) are collected for a short window and sent as one batched call;
+the results are fanned back out to the waiting callers
+
+A batch is sent when its window (counted from its first item) closes or
+when it reaches max_size, whichever comes first. An item that arrives while
+no batch for its key is open or in flight is sent at once: a lone request
+never pays the window, batches only form behind calls already in progress.
+Items are grouped by key (e.g. the embedding model), since one upstream
+call serves one key.
+"""
+
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set, Tuple
+from app.services.upstream_service import DeadlineExceeded, upstream
+
+
+class MicroBatcher:
+    """Collects single items into batched calls of `flush(key, items) -> results`"""
+
+    def __init__(
+        self,
+        name: str,
+        flush: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+        window: float,
+        max_size: int
+    ):
+        """
+        Args:
+            name: Name used in errors and stats
+            flush: Coroutine function returning one result per item, in order
+            window: Seconds to wait for more items (0 = no batching)
+            max_size: Items per batch at most
+        """
+        self.name = name
+        self.flush = flush
+        self.window = window
+        self.max_size = max(max_size, 1)
+        # key -> (items with their futures, time the first item arrived)
+        self._pending: Dict[Hashable, Tuple[List[Tuple[Any, asyncio.Future]], float]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        # key -> batches in flight
+        self._running: Dict[Hashable, int] = {}
+        # Strong references to running batches
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {"items": 0, "batches": 0, "full_batches": 0, "immediate": 0, "max_batch": 0, "wait_seconds": 0.0}
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        """
+        Add one item to the next batch for `key` and wait for its result
+
+        The caller waits at most its remaining deadline budget; the batch
+        itself runs without it, so one impatient caller never fails the
+        others.
+
+        Raises:
+            Whatever the batched call raised
+            DeadlineExceeded: The caller's budget ran out first
+        """
+        if self.window <= 0:
+            return (await self.flush(key, [item]))[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = ([], time.perf_counter())
+            if self._running.get(key):
+                self._timers[key] = loop.call_later(self.window, self._send, key)
+        pending[0].append((item, future))
+        if key not in self._timers:
+            # Upstream idle for this key: nothing to wait for
+            self._stats["immediate"] += 1
+            self._send(key)
+        elif len(pending[0]) >= self.max_size:
+            self._stats["full_batches"] += 1
+            self._send(key)
+
+        left = upstream.remaining()
+        if left is None:
+            return await future
+        try:
+            return await asyncio.wait_for(future, max(left, 0.0))
+        except asyncio.TimeoutError:
+            if not upstream.expired():
+                raise
+            raise DeadlineExceeded(f"Request deadline exceeded while waiting for a {self.name} batch")
+
+    def _send(self, key: Hashable) -> None:
+        """Close the batch for `key` and run it in the background"""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        batch, started = pending
+
+        stats = self._stats
+        stats["batches"] += 1
+        stats["items"] += len(batch)
+        stats["max_batch"] = max(stats["max_batch"], len(batch))
+        stats["wait_seconds"] += time.perf_counter() - started
+
+        # The batch serves several requests: drop the deadline of the one
+        # that happened to open it (other context, e.g. metric labels, is kept)
+        context = contextvars.copy_context()
+        context.run(upstream.set_deadline, None)
+        task = context.run(asyncio.ensure_future, self._run(key, batch))
+        self._running[key] = self._running.get(key, 0) + 1
+        self._tasks.add(task)
+        task.add_done_callback(lambda task: self._done(key, task))
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._running[key] -= 1
+        if not self._running[key]:
+            del self._running[key]
+
+    async def _run(self, key: Hashable, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        """Make the batched call and hand each caller its result"""
+        # Callers that gave up already are left out
+        live = [(item, future) for item, future in batch if not future.done()]
+        if not live:
+            return
+        try:
+            results = await self.flush(key, [item for item, _ in live])
+        except Exception as e:
+            for _, future in live:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(live, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict:
+        """Batch count, average/maximum batch size and average time a batch stayed open"""
+        stats = self._stats
+        batches = stats["batches"]
+        return {
+            "window_ms": round(self.window * 1000, 3),
+            "max_size": self.max_size,
+            "items": stats["items"],
+            "batches": batches,
+            "full_batches": stats["full_batches"],
+            "immediate": stats["immediate"],
+            "avg_batch": round(stats["items"] / batches, 2) if batches else 0.0,
+            "max_batch": stats["max_batch"],
+            "avg_open_ms": round(stats["wait_seconds"] / batches * 1000, 3) if batches else 0.0,
+            "pending": sum(len(batch) for batch, _ in self._pending.values()),
+            "in_flight": sum(self._running.values()),
+        }
@@ -0,0 +1,545 @@
+"""
+Cache Service - Bounded in-memory LRU caches with an optional SQLite tier
+Used to avoid recomputing expensive upstream results (embeddings, chat
+responses, and RAG answers matched by query similarity)
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from itertools import count
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+import numpy as np
+from app.services.logging_service import get_logger
+from app.services.storage_service import data_path
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+# Empty path keeps the cache in memory only (relative paths are under the service root)
+EMBEDDING_CACHE_PATH = data_path(os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite3"))
+EMBEDDING_CACHE_DISK_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "200000"))
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+# Empty (default) keeps chat responses in memory only
+RESPONSE_CACHE_PATH = data_path(os.getenv("RESPONSE_CACHE_PATH", ""))
+RESPONSE_CACHE_DISK_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_DISK_MAX_ENTRIES", "20000"))
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+
+
+def hash_key(*parts: str) -> str:
+    """Build a content-addressed cache key from its parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss/eviction counters"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(max_entries, 1)
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value (and mark it recently used) or None"""
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        """Insert or refresh a value, evicting the least recently used entry if full"""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        """Drop a single entry if present"""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteStore:
+    """
+    Persistent key/blob store backing an LRUCache
+
+    Bounded to max_entries rows: once a write pushes it past the bound, the
+    oldest rows (by write time) are deleted, plus some slack so pruning does
+    not run on every write.
+    """
+
+    # Fraction of max_entries pruned beyond the bound
+    PRUNE_SLACK = 0.1
+
+    def __init__(self, path: str, max_entries: int):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max(max_entries, 1)
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_created_at ON cache (created_at)")
+        self._conn.commit()
+        # Upper bound on the row count (replaced keys are counted as new)
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """Fetch the blobs stored for the given keys"""
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def set_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        """Insert or replace blobs, pruning the oldest rows past max_entries"""
+        now = time.time()
+        rows = [(key, value, now) for key, value in items]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, created_at) VALUES (?, ?, ?)",
+                rows
+            )
+            self._rows += len(rows)
+            if self._rows > self.max_entries:
+                self._prune()
+            self._conn.commit()
+
+    def _prune(self) -> None:
+        """Delete the oldest rows down to max_entries minus the slack (lock held)"""
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if self._rows <= self.max_entries:
+            return
+        excess = self._rows - self.max_entries + int(self.max_entries * self.PRUNE_SLACK)
+        self._conn.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY created_at LIMIT ?)",
+            (excess,)
+        )
+        self._rows -= excess
+        self.evictions += excess
+
+    def delete_many(self, keys: List[str]) -> None:
+        """Remove blobs by key"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM cache WHERE key = ?", [(key,) for key in keys])
+            self._conn.commit()
+
+    def count(self) -> int:
+        """Number of stored entries"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the underlying connection"""
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """
+    Two-tier cache: a bounded in-memory LRU in front of an optional SQLite store
+
+    Values are kept decoded in memory and encoded to bytes on disk. Disk
+    access runs in a worker thread so it never blocks the event loop. The
+    SQLite file is opened by open() (the app's startup hook), not on
+    construction; until then the cache is memory-only.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        path: Optional[str] = None,
+        encode: Callable[[Any], bytes] = None,
+        decode: Callable[[bytes], Any] = None,
+        enabled: bool = True,
+        disk_max_entries: int = EMBEDDING_CACHE_DISK_MAX_ENTRIES
+    ):
+        self.name = name
+        self.enabled = enabled
+        self.memory = LRUCache(max_entries)
+        self.encode = encode
+        self.decode = decode
+        self.path = path
+        self.disk_max_entries = disk_max_entries
+        self.disk: Optional[SQLiteStore] = None
+        self.disk_hits = 0
+        self.disk_errors = 0
+
+    def open(self) -> None:
+        """Open the SQLite tier, if configured (no-op when already open)"""
+        if not self.enabled or not self.path or self.disk is not None:
+            return
+        try:
+            self.disk = SQLiteStore(self.path, self.disk_max_entries)
+        except Exception as e:
+            logger.warning("Persistent cache tier disabled", extra={"cache": self.name, "error": str(e)})
+
+    def close(self) -> None:
+        """Close the SQLite tier (the memory tier stays usable)"""
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Look up several keys at once
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            Dict of key -> value for every key that was found
+        """
+        if not self.enabled:
+            return {}
+
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.memory.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+
+        if missing and self.disk is not None:
+            try:
+                blobs = await asyncio.to_thread(self.disk.get_many, missing)
+            except sqlite3.Error as e:
+                # A locked or corrupt cache file is a miss, not a failed request
+                self.disk_errors += 1
+                logger.warning("Failed to read cache entries", extra={"cache": self.name, "count": len(missing), "error": str(e)})
+                blobs = {}
+            for key, blob in blobs.items():
+                value = self.decode(blob)
+                # Promote to the memory tier
+                self.memory.set(key, value)
+                found[key] = value
+            self.disk_hits += len(blobs)
+
+        return found
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Look up a single key"""
+        return (await self.get_many([key])).get(key)
+
+    async def set_many(self, items: Dict[str, Any]) -> None:
+        """Store several values in both tiers"""
+        if not self.enabled or not items:
+            return
+
+        for key, value in items.items():
+            self.memory.set(key, value)
+
+        if self.disk is not None:
+            encoded = [(key, self.encode(value)) for key, value in items.items()]
+            try:
+                await asyncio.to_thread(self.disk.set_many, encoded)
+            except Exception as e:
+                self.disk_errors += 1
+                logger.warning("Failed to persist cache entries", extra={"cache": self.name, "count": len(encoded), "error": str(e)})
+
+    async def set(self, key: str, value: Any) -> None:
+        """Store a single value"""
+        await self.set_many({key: value})
+
+    def stats(self) -> Dict:
+        """Hit rate, size and eviction counters for both tiers"""
+        # Every lookup consults the memory tier first, so its counters see all lookups
+        lookups = self.memory.hits + self.memory.misses
+        hits = self.memory.hits + self.disk_hits
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "lookups": lookups,
+            "hits": hits,
+            "misses": lookups - hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk_hits,
+            "memory_entries": len(self.memory),
+            "memory_max_entries": self.memory.max_entries,
+            "evictions": self.memory.evictions,
+            "disk_path": self.disk.path if self.disk else None,
+            "disk_max_entries": self.disk.max_entries if self.disk else None,
+            "disk_evictions": self.disk.evictions if self.disk else 0,
+            "disk_errors": self.disk_errors,
+        }
+
+
+class SemanticCache:
+    """
+    Answer cache matched by query-embedding similarity
+
+    Entries are bucketed by (collection, generation parameters). A lookup
+    returns the stored answer of the most similar earlier query in the same
+    bucket if its cosine similarity reaches the threshold. Entries expire after
+    a TTL, the cache is bounded with LRU eviction, and a whole collection can
+    be invalidated when it is re-ingested.
+
+    Each collection has a generation counter that invalidate() bumps. Callers
+    read it before retrieval and pass it to store(), so an answer built from
+    context that changed while it was being generated is never cached.
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl: float, enabled: bool = True):
+        self.threshold = threshold
+        self.max_entries = max(max_entries, 1)
+        self.ttl = ttl
+        self.enabled = enabled
+        self._ids = count()
+        # entry_id -> {"bucket", "vector", "value", "created_at"}, in LRU order
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        # bucket -> {"ids": [...], "matrix": stacked vectors or None when stale}
+        self._buckets: Dict[Tuple[str, str], Dict] = {}
+        # collection -> number of invalidations so far
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_stores = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> Optional[np.ndarray]:
+        array_ = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array_))
+        return array_ / norm if norm else None
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        bucket = self._buckets.get(entry["bucket"])
+        if bucket is not None:
+            bucket["ids"].remove(entry_id)
+            bucket["matrix"] = None
+            if not bucket["ids"]:
+                del self._buckets[entry["bucket"]]
+
+    def generation(self, collection: str) -> int:
+        """Current generation of a collection (read before retrieval, passed to store)"""
+        return self._generations.get(collection, 0)
+
+    def lookup(self, collection: str, params_key: str, embedding: List[float]) -> Optional[Tuple[Any, float]]:
+        """
+        Find a cached answer for a semantically similar query
+
+        Args:
+            collection: Collection the query ran against
+            params_key: Generation parameters that must match exactly
+            embedding: Query embedding
+
+        Returns:
+            (cached value, similarity) or None
+        """
+        if not self.enabled:
+            return None
+
+        bucket = self._buckets.get((collection, params_key))
+        query = self._normalize(embedding)
+        if bucket is None or query is None:
+            self.misses += 1
+            return None
+
+        # Drop expired entries first
+        now = time.time()
+        for entry_id in [i for i in bucket["ids"] if now - self._entries[i]["created_at"] > self.ttl]:
+            self._remove(entry_id)
+        bucket = self._buckets.get((collection, params_key))
+        if bucket is None:
+            self.misses += 1
+            return None
+
+        if bucket["matrix"] is None:
+            bucket["matrix"] = np.vstack([self._entries[i]["vector"] for i in bucket["ids"]])
+        if bucket["matrix"].shape[1] != query.shape[0]:
+            self.misses += 1
+            return None
+
+        similarities = bucket["matrix"] @ query
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        if similarity < self.threshold:
+            self.misses += 1
+            return None
+
+        entry_id = bucket["ids"][best]
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        return self._entries[entry_id]["value"], similarity
+
+    def store(
+        self,
+        collection: str,
+        params_key: str,
+        embedding: List[float],
+        value: Any,
+        generation: Optional[int] = None
+    ) -> None:
+        """
+        Cache an answer for a query embedding
+
+        Args:
+            generation: Collection generation read before the answer's context
+                was retrieved; the answer is dropped if the collection has been
+                invalidated since (None = store unconditionally)
+        """
+        if not self.enabled:
+            return
+        if generation is not None and generation != self.generation(collection):
+            self.stale_stores += 1
+            return
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+
+        entry_id = next(self._ids)
+        bucket_key = (collection, params_key)
+        self._entries[entry_id] = {
+            "bucket": bucket_key,
+            "vector": vector,
+            "value": value,
+            "created_at": time.time(),
+        }
+        bucket = self._buckets.setdefault(bucket_key, {"ids": [], "matrix": None})
+        bucket["ids"].append(entry_id)
+        bucket["matrix"] = None
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, collection: str) -> int:
+        """
+        Drop every cached answer for a collection (e.g. after re-ingestion)
+
+        Returns:
+            Number of entries removed
+        """
+        # Answers still being generated from the old contents must not be stored
+        self._generations[collection] = self.generation(collection) + 1
+        entry_ids = [
+            entry_id
+            for (bucket_collection, _), bucket in self._buckets.items()
+            if bucket_collection == collection
+            for entry_id in bucket["ids"]
+        ]
+        for entry_id in entry_ids:
+            self._remove(entry_id)
+        if entry_ids:
+            self.invalidations += 1
+        return len(entry_ids)
+
+    def stats(self) -> Dict:
+        """Hit rate, size and eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "lookups": lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale_stores": self.stale_stores,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl,
+        }
+
+
+def _pack_vector(vector: List[float]) -> bytes:
+    """Encode an embedding losslessly as float64 bytes"""
+    return array("d", vector).tobytes()
+
+
+def _unpack_vector(blob: bytes) -> List[float]:
+    """Decode an embedding written by _pack_vector"""
+    return array("d", blob).tolist()
+
+
+def _pack_json(value: Any) -> bytes:
+    """Encode a JSON-serializable value"""
+    return json.dumps(value).encode("utf-8")
+
+
+def _unpack_json(blob: bytes) -> Any:
+    """Decode a value written by _pack_json"""
+    return json.loads(blob.decode("utf-8"))
+
+
+# Create singleton instances
+embedding_cache = TieredCache(
+    name="embedding",
+    max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+    path=EMBEDDING_CACHE_PATH,
+    encode=_pack_vector,
+    decode=_unpack_vector,
+    enabled=EMBEDDING_CACHE_ENABLED,
+    disk_max_entries=EMBEDDING_CACHE_DISK_MAX_ENTRIES
+)
+
+response_cache = TieredCache(
+    name="response",
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    path=RESPONSE_CACHE_PATH,
+    encode=_pack_json,
+    decode=_unpack_json,
+    enabled=RESPONSE_CACHE_ENABLED,
+    disk_max_entries=RESPONSE_CACHE_DISK_MAX_ENTRIES
+)
+
+answer_cache = SemanticCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl=SEMANTIC_CACHE_TTL,
+    enabled=SEMANTIC_CACHE_ENABLED
+)
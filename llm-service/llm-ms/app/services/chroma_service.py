@@ -1,71 +1,170 @@
 """
 ChromaDB Service - Manages vector storage and retrieval
 Handles collections, document storage, and semantic search
+
+The chromadb HttpClient is synchronous, so every call is run on a dedicated,
+bounded thread pool and awaited with a per-operation timeout (capped by the
+request's deadline budget) behind the "chromadb" circuit breaker. This keeps
+vector I/O off the event loop and lets concurrent requests overlap.
+
+VECTOR_STORE_BACKEND=local swaps the shared chroma_service instance for the
+embedded LocalVectorStore; chromadb is then never imported.
 """
 
-from chromadb import HttpClient
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
 import os
-from typing import List, Dict, Optional, Tuple
+from typing import Any, Callable, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
+from app.services.health_service import health_monitor
+from app.services.logging_service import get_logger
+from app.services.metrics_service import metrics
+from app.services.upstream_service import upstream
+from app.services.vector_store_service import VectorStore, VECTOR_STORE_BACKEND
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
 CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
 CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
 
+# Thread pool size for blocking Chroma calls
+CHROMA_MAX_WORKERS = int(os.getenv("CHROMA_MAX_WORKERS", "8"))
+
+# Per-operation timeouts (seconds)
+CHROMA_TIMEOUT = float(os.getenv("CHROMA_TIMEOUT", "30"))
+CHROMA_TIMEOUTS = {
+    "query": float(os.getenv("CHROMA_QUERY_TIMEOUT", str(CHROMA_TIMEOUT))),
+    "add": float(os.getenv("CHROMA_ADD_TIMEOUT", "120")),
+    "delete": float(os.getenv("CHROMA_DELETE_TIMEOUT", str(CHROMA_TIMEOUT))),
+    "admin": float(os.getenv("CHROMA_ADMIN_TIMEOUT", "10")),
+}
 
-class ChromaDBService:
+
+class ChromaDBService(VectorStore):
     """Service to interact with ChromaDB for vector storage"""
 
     def __init__(self):
-        """Initialize ChromaDB client"""
+        """Initialize ChromaDB client and its worker pool"""
+        # Imported here so the local backend runs without chromadb installed
+        from chromadb import HttpClient
+
         self.client = HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
         self.collections = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=CHROMA_MAX_WORKERS,
+            thread_name_prefix="chroma"
+        )
+
+    async def _run(self, operation: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking Chroma call on the worker pool
+
+        Args:
+            operation: Timeout class ("query", "add", "delete" or "admin")
+            func: Blocking callable
+
+        Returns:
+            Whatever func returns
+        """
+        loop = asyncio.get_running_loop()
+        timeout = upstream.timeout(CHROMA_TIMEOUTS.get(operation, CHROMA_TIMEOUT), "chromadb")
+        try:
+            async with upstream.guard("chromadb", is_failure=self._is_failure):
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, partial(func, *args, **kwargs)),
+                    timeout=timeout
+                )
+            health_monitor.mark_healthy("chromadb")
+            return result
+        except asyncio.TimeoutError:
+            health_monitor.mark_unhealthy("chromadb", f"{operation} timed out")
+            raise Exception(f"ChromaDB {operation} timed out after {timeout:.0f}s")
+        except Exception as e:
+            if self._is_connection_error(e):
+                health_monitor.mark_unhealthy("chromadb", str(e) or type(e).__name__)
+            raise
+
+    @staticmethod
+    def _is_connection_error(error: Exception) -> bool:
+        """True for transport failures (as opposed to e.g. a missing collection)"""
+        # requests raises OSError subclasses; httpx transport errors live in httpx
+        return isinstance(error, OSError) or type(error).__module__.startswith("httpx")
+
+    @classmethod
+    def _is_failure(cls, error: BaseException) -> bool:
+        """Errors that count against the circuit breaker: timeouts and transport failures"""
+        return isinstance(error, asyncio.TimeoutError) or cls._is_connection_error(error)
+
+    def close(self) -> None:
+        """Stop the worker pool (called on shutdown)"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
     async def check_health(self) -> bool:
         """
         Check if ChromaDB is running and accessible
-        
+
         Returns:
             True if healthy, False otherwise
         """
         try:
-            # Test heartbeat
-            _ = self.client.list_collections()
+            # Cheap heartbeat instead of listing every collection
+            _ = await self._run("admin", self.client.heartbeat)
             return True
         except Exception as e:
-            print(f"❌ ChromaDB health check failed: {e}")
+            logger.warning("ChromaDB health check failed", extra={"error": str(e)})
             return False
 
-    def get_or_create_collection(self, collection_name: str, metadata: Optional[Dict] = None) -> str:
+    def _get_or_create_collection(self, collection_name: str, metadata: Optional[Dict] = None) -> str:
+        safe_name = self.safe_name(collection_name)
+
+        # Get or create collection
+        collection = self.client.get_or_create_collection(
+            name=safe_name,
+            metadata=metadata or {}
+        )
+
+        self.collections[safe_name] = collection
+        return safe_name
+
+    async def get_or_create_collection(self, collection_name: str, metadata: Optional[Dict] = None) -> str:
         """
         Get or create a ChromaDB collection
-        
+
         Args:
             collection_name: Name of the collection
             metadata: Optional metadata for the collection
-            
+
         Returns:
             Collection ID
         """
         try:
-            # Clean collection name (ChromaDB has strict naming rules)
-            safe_name = collection_name.replace(" ", "_").replace("-", "_").lower()[:63]
-            
-            # Get or create collection
-            collection = self.client.get_or_create_collection(
-                name=safe_name,
-                metadata=metadata or {}
-            )
-            
-            self.collections[safe_name] = collection
-            print(f"✅ Collection '{safe_name}' ready")
+            safe_name = await self._run("admin", self._get_or_create_collection, collection_name, metadata)
+            logger.debug("Collection ready", extra={"collection": safe_name})
             return safe_name
         except Exception as e:
-            print(f"❌ Error creating/getting collection: {e}")
+            logger.error("Error creating/getting collection", extra={"collection": collection_name, "error": str(e)})
             raise
 
-    def add_documents(
+    def _add_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        ids: List[str],
+        embeddings: List[List[float]]
+    ) -> None:
+        collection = self._get_collection(collection_name)
+        collection.add(
+            ids=ids,
+            documents=documents,
+            metadatas=metadatas,
+            embeddings=embeddings
+        )
+
+    async def add_documents(
         self,
         collection_name: str,
         documents: List[str],
@@ -75,7 +174,7 @@ class ChromaDBService:
     ) -> None:
         """
         Add documents (with pre-computed embeddings) to a collection
-        
+
         Args:
             collection_name: Name of the collection
             documents: List of document texts
@@ -84,21 +183,77 @@ class ChromaDBService:
             embeddings: List of pre-computed embeddings
         """
         try:
-            collection = self.get_collection(collection_name)
-            
-            collection.add(
-                ids=ids,
-                documents=documents,
-                metadatas=metadatas,
-                embeddings=embeddings
-            )
-            
-            print(f"✅ Added {len(documents)} documents to '{collection_name}'")
+            with metrics.stage("vector_add", collection=self.safe_name(collection_name)):
+                await self._run("add", self._add_documents, collection_name, documents, metadatas, ids, embeddings)
+            logger.debug("Added documents", extra={"collection": collection_name, "count": len(documents)})
         except Exception as e:
-            print(f"❌ Error adding documents: {e}")
+            logger.error("Error adding documents", extra={"collection": collection_name, "error": str(e)})
             raise
 
-    def query(
+    def _upsert_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        ids: List[str],
+        embeddings: List[List[float]]
+    ) -> None:
+        collection = self._get_collection(collection_name)
+        collection.upsert(
+            ids=ids,
+            documents=documents,
+            metadatas=metadatas,
+            embeddings=embeddings
+        )
+
+    async def upsert_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        ids: List[str],
+        embeddings: List[List[float]]
+    ) -> None:
+        """
+        Insert documents, or overwrite those whose IDs already exist
+
+        Args:
+            collection_name: Name of the collection
+            documents: List of document texts
+            metadatas: List of metadata dicts
+            ids: List of document IDs
+            embeddings: List of pre-computed embeddings
+        """
+        try:
+            with metrics.stage("vector_add", collection=self.safe_name(collection_name)):
+                await self._run("add", self._upsert_documents, collection_name, documents, metadatas, ids, embeddings)
+            logger.debug("Upserted documents", extra={"collection": collection_name, "count": len(documents)})
+        except Exception as e:
+            logger.error("Error upserting documents", extra={"collection": collection_name, "error": str(e)})
+            raise
+
+    def _query(
+        self,
+        collection_name: str,
+        query_texts: List[str],
+        query_embeddings: Optional[List[List[float]]] = None,
+        n_results: int = 5
+    ) -> Dict:
+        collection = self._get_collection(collection_name)
+
+        if query_embeddings:
+            # Query using pre-computed embeddings
+            return collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results
+            )
+        # Query using text (ChromaDB will embed internally)
+        return collection.query(
+            query_texts=query_texts,
+            n_results=n_results
+        )
+
+    async def query(
         self,
         collection_name: str,
         query_texts: List[str],
@@ -107,93 +262,136 @@ class ChromaDBService:
     ) -> Dict:
         """
         Query a collection using text or embeddings
-        
+
         Args:
             collection_name: Name of the collection
             query_texts: List of query texts (if not using embeddings)
             query_embeddings: Optional pre-computed query embeddings
             n_results: Number of results to return
-            
+
         Returns:
             Query results with distances and metadata
         """
         try:
-            collection = self.get_collection(collection_name)
-            
-            if query_embeddings:
-                # Query using pre-computed embeddings
-                results = collection.query(
-                    query_embeddings=query_embeddings,
-                    n_results=n_results
-                )
-            else:
-                # Query using text (ChromaDB will embed internally)
-                results = collection.query(
-                    query_texts=query_texts,
-                    n_results=n_results
-                )
-            
-            return results
+            with metrics.stage("vector_query", collection=self.safe_name(collection_name)):
+                return await self._run("query", self._query, collection_name, query_texts, query_embeddings, n_results)
         except Exception as e:
-            print(f"❌ Error querying collection: {e}")
+            logger.error("Error querying collection", extra={"collection": collection_name, "error": str(e)})
             raise
 
-    def get_collection(self, collection_name: str):
-        """Get a collection by name"""
-        safe_name = collection_name.replace(" ", "_").replace("-", "_").lower()[:63]
-        
+    def _get_collection(self, collection_name: str):
+        safe_name = self.safe_name(collection_name)
+
         if safe_name not in self.collections:
             self.collections[safe_name] = self.client.get_collection(name=safe_name)
-        
+
         return self.collections[safe_name]
 
-    def delete_collection(self, collection_name: str) -> None:
+    async def get_collection(self, collection_name: str):
+        """Get a collection by name"""
+        return await self._run("admin", self._get_collection, collection_name)
+
+    def _delete_collection(self, collection_name: str) -> str:
+        safe_name = self.safe_name(collection_name)
+        self.client.delete_collection(name=safe_name)
+        self.collections.pop(safe_name, None)
+        return safe_name
+
+    async def delete_collection(self, collection_name: str) -> None:
         """Delete a collection"""
         try:
-            safe_name = collection_name.replace(" ", "_").replace("-", "_").lower()[:63]
-            self.client.delete_collection(name=safe_name)
-            
-            if safe_name in self.collections:
-                del self.collections[safe_name]
-            
-            print(f"✅ Deleted collection '{safe_name}'")
+            safe_name = await self._run("delete", self._delete_collection, collection_name)
+            logger.info("Deleted collection", extra={"collection": safe_name})
         except Exception as e:
-            print(f"❌ Error deleting collection: {e}")
+            logger.error("Error deleting collection", extra={"collection": collection_name, "error": str(e)})
             raise
 
-    def list_collections(self) -> List[str]:
+    def _list_collections(self) -> List[str]:
+        return [c.name for c in self.client.list_collections()]
+
+    async def list_collections(self) -> List[str]:
         """List all available collections"""
         try:
-            collections = self.client.list_collections()
-            return [c.name for c in collections]
+            return await self._run("admin", self._list_collections)
         except Exception as e:
-            print(f"❌ Error listing collections: {e}")
+            logger.error("Error listing collections", extra={"error": str(e)})
             return []
 
-    def get_collection_stats(self, collection_name: str) -> Dict:
+    def _has_collection(self, collection_name: str) -> bool:
+        return self.safe_name(collection_name) in self._list_collections()
+
+    async def has_collection(self, collection_name: str) -> bool:
+        """True if the collection exists; errors (outage, open breaker, deadline) propagate"""
+        return await self._run("admin", self._has_collection, collection_name)
+
+    def _get_collection_stats(self, collection_name: str) -> Dict:
+        collection = self._get_collection(collection_name)
+        return {
+            "name": collection_name,
+            "document_count": collection.count()
+        }
+
+    async def get_collection_stats(self, collection_name: str) -> Dict:
         """Get statistics about a collection"""
         try:
-            collection = self.get_collection(collection_name)
-            count = collection.count()
-            
-            return {
-                "name": collection_name,
-                "document_count": count
-            }
+            return await self._run("admin", self._get_collection_stats, collection_name)
+        except Exception as e:
+            logger.error("Error getting collection stats", extra={"collection": collection_name, "error": str(e)})
+            raise
+
+    def _get_documents(self, collection_name: str, where: Dict) -> Dict:
+        collection = self._get_collection(collection_name)
+        result = collection.get(where=where, include=["metadatas"])
+        return {"ids": result.get("ids", []), "metadatas": result.get("metadatas", [])}
+
+    async def get_documents(self, collection_name: str, where: Dict) -> Dict:
+        """IDs and metadata of documents matching a metadata filter"""
+        try:
+            return await self._run("query", self._get_documents, collection_name, where)
         except Exception as e:
-            print(f"❌ Error getting collection stats: {e}")
+            logger.error("Error getting documents", extra={"collection": collection_name, "error": str(e)})
             raise
 
-    def delete_documents(self, collection_name: str, ids: List[str]) -> None:
-        """Delete documents from a collection"""
+    def _update_metadatas(self, collection_name: str, ids: List[str], metadatas: List[Dict]) -> None:
+        collection = self._get_collection(collection_name)
+        collection.update(ids=ids, metadatas=metadatas)
+
+    async def update_metadatas(self, collection_name: str, ids: List[str], metadatas: List[Dict]) -> None:
+        """Replace the metadata of existing documents (embeddings are kept)"""
+        try:
+            await self._run("add", self._update_metadatas, collection_name, ids, metadatas)
+            logger.debug("Updated document metadata", extra={"collection": collection_name, "count": len(ids)})
+        except Exception as e:
+            logger.error("Error updating documents", extra={"collection": collection_name, "error": str(e)})
+            raise
+
+    def _delete_documents(
+        self,
+        collection_name: str,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict] = None
+    ) -> None:
+        collection = self._get_collection(collection_name)
+        collection.delete(ids=ids, where=where)
+
+    async def delete_documents(
+        self,
+        collection_name: str,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict] = None
+    ) -> None:
+        """Delete documents from a collection by ID and/or metadata filter"""
         try:
-            collection = self.get_collection(collection_name)
-            collection.delete(ids=ids)
-            print(f"✅ Deleted {len(ids)} documents from '{collection_name}'")
+            await self._run("delete", self._delete_documents, collection_name, ids, where)
+            logger.debug("Deleted documents", extra={"collection": collection_name, "count": len(ids) if ids is not None else None, "where": where})
         except Exception as e:
-            print(f"❌ Error deleting documents: {e}")
+            logger.error("Error deleting documents", extra={"collection": collection_name, "error": str(e)})
             raise
 
 
-# Create singleton instance
-chroma_service = ChromaDBService()
+# Create singleton instance (VECTOR_STORE_BACKEND picks the implementation)
+if VECTOR_STORE_BACKEND == "local":
+    from app.services.local_vector_service import LocalVectorStore
+    chroma_service = LocalVectorStore()
+else:
+    chroma_service = ChromaDBService()
@@ -0,0 +1,306 @@
+"""
+Chunking Service - Offset-based, boundary-aware document chunking
+Splits text into chunks for embedding without copying intermediate slices:
+chunkers work on character offsets and only the final chunk text is sliced
+
+Strategies (CHUNKING_STRATEGY):
+    boundary  Packs whole sentences up to a token budget, ending chunks at
+              content-defined sentence anchors so that an edit only changes
+              the chunks around it (default)
+    fixed     Fixed-size character windows with overlap (the original behaviour)
+"""
+
+import os
+import re
+import zlib
+from typing import AsyncIterator, Dict, Iterator, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "boundary").lower()
+
+# Fixed strategy: window size and overlap in characters
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+
+# Boundary strategy: budget per chunk and carried-over context, in tokens
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+# Token estimate for budgeting (no tokenizer dependency); ~4 for English
+CHUNK_CHARS_PER_TOKEN = float(os.getenv("CHUNK_CHARS_PER_TOKEN", "4"))
+# A boundary is only used if the chunk is at least this full
+CHUNK_MIN_FILL = float(os.getenv("CHUNK_MIN_FILL", "0.7"))
+# About one sentence boundary in this many is an anchor (a preferred cut)
+CHUNK_ANCHOR_EVERY = int(os.getenv("CHUNK_ANCHOR_EVERY", "4"))
+# Characters before a boundary that decide whether it is an anchor
+_ANCHOR_CONTEXT = 32
+
+# Boundary classes, strongest first; a cut is made at the start of the match
+_PARAGRAPH_RE = re.compile(r"\n[ \t]*\n\s*")
+_SENTENCE_RE = re.compile(r"(?<=[.!?;:])[\"'\)\]]*\s+|\n\s*")
+_WORD_RE = re.compile(r"\s+")
+_NON_SPACE_RE = re.compile(r"\S")
+
+
+class Chunk(NamedTuple):
+    """A chunk of a document; start/end are character offsets into the full text"""
+    text: str
+    number: int
+    start: int
+    end: int
+
+
+# (chunk_start, chunk_end, next_start)
+Span = Tuple[int, int, int]
+
+
+class Chunker:
+    """
+    Base chunker
+
+    Subclasses implement next_span(); chunks() and chunk_stream() build on it,
+    so the streamed and in-memory paths produce identical chunks.
+    """
+
+    name = "base"
+
+    def next_span(self, text: str, start: int, final: bool) -> Optional[Span]:
+        """
+        Locate the chunk beginning at or after `start`
+
+        Args:
+            text: Text (or streaming buffer) to chunk
+            start: Offset where the previous chunk handed over
+            final: True when no more text will follow
+
+        Returns:
+            (chunk_start, chunk_end, next_start), or None when the rest of the
+            text is empty (final) or more text is needed to decide (not final)
+        """
+        raise NotImplementedError
+
+    def chunks(self, text: str) -> Iterator[Chunk]:
+        """
+        Lazily chunk an in-memory text
+
+        Yields:
+            Chunk tuples with offsets into text
+        """
+        number = 0
+        position = 0
+        while (span := self.next_span(text, position, final=True)) is not None:
+            chunk_start, chunk_end, position = span
+            if chunk_end > chunk_start:
+                yield Chunk(text[chunk_start:chunk_end], number, chunk_start, chunk_end)
+                number += 1
+
+    async def chunk_stream(self, pieces: AsyncIterator[str]) -> AsyncIterator[Chunk]:
+        """
+        Chunk text that arrives in pieces
+
+        Only about one chunk of text plus the latest piece is buffered.
+
+        Yields:
+            Chunk tuples with offsets into the concatenated text
+        """
+        number = 0
+        base = 0  # Offset of buffer[0] in the full text
+        position = 0
+        buffer = ""
+
+        async def drain(final: bool):
+            nonlocal number, base, position, buffer
+            while (span := self.next_span(buffer, position, final)) is not None:
+                chunk_start, chunk_end, position = span
+                if chunk_end > chunk_start:
+                    yield Chunk(buffer[chunk_start:chunk_end], number, base + chunk_start, base + chunk_end)
+                    number += 1
+            # Drop consumed text
+            buffer = buffer[position:]
+            base += position
+            position = 0
+
+        async for piece in pieces:
+            buffer += piece
+            async for chunk in drain(final=False):
+                yield chunk
+
+        async for chunk in drain(final=True):
+            yield chunk
+
+    def describe(self) -> Dict:
+        """Strategy name and settings (for health/benchmark output)"""
+        return {"strategy": self.name}
+
+
+class FixedSizeChunker(Chunker):
+    """Fixed-size character windows with overlap (the original chunk_text)"""
+
+    name = "fixed"
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
+        self.chunk_size = max(chunk_size, 1)
+        self.overlap = overlap
+        self.step = max(chunk_size - overlap, 1)
+
+    def next_span(self, text: str, start: int, final: bool) -> Optional[Span]:
+        length = len(text)
+        while start < length:
+            end = start + self.chunk_size
+            # The last window waits for EOF: more text would make it longer
+            if end >= length and not final:
+                return None
+            if end >= length:
+                end = length
+            # Whitespace-only windows are skipped, like the original
+            if _NON_SPACE_RE.search(text, start, end):
+                return start, end, (end if end >= length else start + self.step)
+            if end >= length:
+                break
+            start += self.step
+        return None
+
+    def describe(self) -> Dict:
+        return {"strategy": self.name, "chunk_size": self.chunk_size, "chunk_overlap": self.overlap}
+
+
+class BoundaryChunker(Chunker):
+    """
+    Packs text up to a token budget and cuts at a sentence boundary
+
+    A chunk ends at the first anchor past the minimum fill: a sentence or
+    paragraph boundary whose preceding text hashes to 0 mod
+    CHUNK_ANCHOR_EVERY. Anchors depend only on nearby content, not on where
+    the chunk started, so after an edit the chunk boundaries fall back onto
+    the same anchors within a chunk or two and later chunks are unchanged
+    (content-defined chunking). Without an anchor in the window, the
+    strongest boundary wins: paragraph break, sentence end (or line break),
+    whitespace; only a single unbroken run longer than the budget is cut
+    mid-word. Chunks never start or end with whitespace. With an overlap
+    budget, the next chunk starts at a sentence inside the tail of the
+    previous one.
+    """
+
+    name = "boundary"
+
+    def __init__(
+        self,
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        chars_per_token: float = CHUNK_CHARS_PER_TOKEN,
+        min_fill: float = CHUNK_MIN_FILL,
+        anchor_every: int = CHUNK_ANCHOR_EVERY
+    ):
+        self.max_tokens = max(max_tokens, 1)
+        self.overlap_tokens = max(overlap_tokens, 0)
+        self.chars_per_token = chars_per_token
+        self.max_chars = max(int(self.max_tokens * chars_per_token), 1)
+        self.min_chars = int(self.max_chars * min(max(min_fill, 0.0), 1.0))
+        self.overlap_chars = min(int(self.overlap_tokens * chars_per_token), self.max_chars // 2)
+        self.anchor_every = max(anchor_every, 1)
+
+    def _is_anchor(self, text: str, position: int, start: int) -> bool:
+        """Content-defined cut point: decided by the text just before position"""
+        context = text[max(position - _ANCHOR_CONTEXT, start):position]
+        return zlib.crc32(context.encode("utf-8")) % self.anchor_every == 0
+
+    @staticmethod
+    def _last_match(pattern: re.Pattern, text: str, start: int, end: int) -> Optional[re.Match]:
+        """
+        Last match of pattern within text[start:end] (no slicing)
+
+        Scans backwards in growing windows, since the best boundary is usually
+        close to the end of the budget.
+        """
+        window = 128
+        while True:
+            low = max(start, end - window)
+            last = None
+            for match in pattern.finditer(text, low, end):
+                last = match
+            if last is not None or low == start:
+                return last
+            window *= 4
+
+    def next_span(self, text: str, start: int, final: bool) -> Optional[Span]:
+        # Chunks start at the first non-whitespace character
+        first = _NON_SPACE_RE.search(text, start)
+        if first is None:
+            return None  # Only whitespace left (wait for more if streaming)
+        start = first.start()
+        limit = start + self.max_chars
+
+        if limit >= len(text):
+            if not final:
+                return None  # The rest might still fit in this chunk
+            end = len(text)
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            return start, end, len(text)
+
+        # Search boundaries in (start + min_chars, limit]; one extra character
+        # lets whitespace right after the budget act as a break
+        lower = start + max(self.min_chars, 1)
+        match = None
+        for candidate in _SENTENCE_RE.finditer(text, lower, limit + 1):
+            if self._is_anchor(text, candidate.start(), start):
+                match = candidate
+                break
+
+        if match is None:
+            # Paragraph breaks need a newline in the window
+            has_newline = text.find("\n", lower, limit + 1) != -1
+            for pattern in (_PARAGRAPH_RE, _SENTENCE_RE, _WORD_RE):
+                if pattern is _PARAGRAPH_RE and not has_newline:
+                    continue
+                match = self._last_match(pattern, text, lower, limit + 1)
+                if match is not None:
+                    break
+
+        if match is not None:
+            end, next_start = match.start(), match.end()
+        else:
+            end = next_start = limit  # One unbroken run: hard cut
+        while end > start and text[end - 1].isspace():
+            end -= 1
+
+        if self.overlap_chars:
+            # Restart at the first sentence beginning inside the overlap window
+            carry = _SENTENCE_RE.search(text, max(end - self.overlap_chars, start + 1), end)
+            if carry is not None and carry.end() < end:
+                next_start = carry.end()
+
+        return start, end, next_start
+
+    def describe(self) -> Dict:
+        return {
+            "strategy": self.name,
+            "max_tokens": self.max_tokens,
+            "overlap_tokens": self.overlap_tokens,
+            "chars_per_token": self.chars_per_token,
+            "anchor_every": self.anchor_every,
+        }
+
+
+CHUNKERS = {
+    FixedSizeChunker.name: FixedSizeChunker,
+    BoundaryChunker.name: BoundaryChunker,
+}
+
+
+def get_chunker(strategy: Optional[str] = None) -> Chunker:
+    """
+    Chunker for a strategy name (default: CHUNKING_STRATEGY)
+
+    Raises:
+        ValueError: Unknown strategy
+    """
+    strategy = (strategy or CHUNKING_STRATEGY).lower()
+    if strategy not in CHUNKERS:
+        raise ValueError(f"Unknown chunking strategy '{strategy}' (expected one of {', '.join(CHUNKERS)})")
+    return CHUNKERS[strategy]()
+
+
+# Create default instance
+chunker = get_chunker()
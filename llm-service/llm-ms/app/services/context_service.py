@@ -0,0 +1,212 @@
+"""
+Context Service - Token-budgeted packing of retrieved chunks into RAG context
+Retrieved chunks are selected in relevance order until CONTEXT_TOKEN_BUDGET
+is filled, and chunks of the same document that overlap or follow each
+other are merged into one passage, so the text repeated by the chunk
+overlap (and the per-chunk header) is sent to the model only once
+
+Overlap is found from the character offsets stored with each chunk
+(metadata start/end). Chunks ingested without offsets fall back to
+chunk_number adjacency and matching the end of one chunk's text against
+the start of the next.
+"""
+
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from app.services.chunking_service import CHUNK_CHARS_PER_TOKEN
+
+load_dotenv()
+
+# Estimated tokens of chunk text per RAG prompt (0 = no budget, merge only)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Between passages in the prompt
+PASSAGE_SEPARATOR = "\n\n---\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Token estimate (same ratio as the chunker, no tokenizer dependency)"""
+    return math.ceil(len(text) / CHUNK_CHARS_PER_TOKEN)
+
+
+def _overlap(head: str, tail: str) -> int:
+    """Length of the longest suffix of `head` that is a prefix of `tail`"""
+    if not tail:
+        return 0
+    # Candidate starts are the occurrences of tail's first character; the leftmost match is the longest
+    position = head.find(tail[0], max(len(head) - len(tail), 0))
+    while position != -1:
+        if tail.startswith(head[position:]):
+            return len(head) - position
+        position = head.find(tail[0], position + 1)
+    return 0
+
+
+class _Piece:
+    """One retrieved chunk, positioned within its document"""
+
+    __slots__ = ("rank", "document_id", "number", "start", "end", "text", "overlaps")
+
+    def __init__(self, rank: int, chunk: Dict):
+        metadata = chunk.get("metadata") or {}
+        self.rank = rank
+        self.document_id = chunk.get("document_id")
+        self.number = chunk.get("chunk_number")
+        start, end = metadata.get("start"), metadata.get("end")
+        # Offsets are only trusted if they describe this exact text
+        if isinstance(start, int) and isinstance(end, int) and end - start == len(chunk["text"]):
+            self.start, self.end = start, end
+        else:
+            self.start = self.end = None
+        self.text = chunk["text"]
+        # Text overlap with a preceding chunk, by id (offset-less fallback; packing re-merges often)
+        self.overlaps: Dict[int, int] = {}
+
+    def overlap_with(self, previous: "_Piece") -> int:
+        overlap = self.overlaps.get(id(previous))
+        if overlap is None:
+            overlap = self.overlaps[id(previous)] = _overlap(previous.text, self.text)
+        return overlap
+
+    def position(self) -> Tuple:
+        return (self.start is None, self.start if self.start is not None else self.number or 0)
+
+
+class _Passage:
+    """Consecutive chunks of one document merged into one span of text"""
+
+    __slots__ = ("document_id", "first", "last", "end", "parts", "rank", "tail")
+
+    def __init__(self, piece: _Piece):
+        self.document_id = piece.document_id
+        self.first = self.last = piece.number
+        self.end = piece.end
+        self.parts = [piece.text]
+        self.rank = piece.rank
+        # Last chunk appended
+        self.tail = piece
+
+    def extend(self, piece: _Piece) -> bool:
+        """Append a chunk that overlaps or follows this passage; False if it does not"""
+        numbered = isinstance(self.last, int) and isinstance(piece.number, int)
+        if self.end is not None and piece.start is not None:
+            if piece.start <= self.end:
+                # Overlap: keep only the part past the passage's end
+                self.parts.append(piece.text[self.end - piece.start:])
+            elif numbered and piece.number == self.last + 1:
+                # Next chunk; only the whitespace between them was dropped (may have been a line break)
+                self.parts.append("\n" + piece.text)
+            else:
+                return False
+        elif numbered and piece.number == self.last + 1:
+            overlap = piece.overlap_with(self.tail)
+            self.parts.append(piece.text[overlap:] if overlap else "\n" + piece.text)
+        else:
+            return False
+        if isinstance(piece.number, int) and (not isinstance(self.last, int) or piece.number > self.last):
+            self.last = piece.number
+        if piece.end is not None:
+            self.end = piece.end if self.end is None else max(self.end, piece.end)
+        self.rank = min(self.rank, piece.rank)
+        self.tail = piece
+        return True
+
+    def chunk(self) -> Dict:
+        """The passage in the shape the prompt builder expects"""
+        number = self.first if self.first == self.last else f"{self.first}-{self.last}"
+        return {"document_id": self.document_id, "chunk_number": number, "text": "".join(self.parts)}
+
+
+class ContextPacker:
+    """Selects and merges retrieved chunks into a token budget"""
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+
+    @staticmethod
+    def _header(chunk: Dict) -> str:
+        return f"[Document: {chunk['document_id']}, Chunk {chunk['chunk_number']}]\n"
+
+    @staticmethod
+    def tokens(chunks: List[Dict]) -> int:
+        """Estimated tokens of the context block built from these chunks"""
+        if not chunks:
+            return 0
+        return estimate_tokens(PASSAGE_SEPARATOR.join(ContextPacker._header(chunk) + chunk["text"] for chunk in chunks))
+
+    @staticmethod
+    def _merge(pieces: List[_Piece]) -> List[Dict]:
+        """Passages of the selected pieces, most relevant first"""
+        by_document: Dict[Optional[str], List[_Piece]] = {}
+        for piece in pieces:
+            by_document.setdefault(piece.document_id, []).append(piece)
+
+        passages: List[_Passage] = []
+        for document_pieces in by_document.values():
+            current = None
+            for piece in sorted(document_pieces, key=_Piece.position):
+                if current is None or not current.extend(piece):
+                    current = _Passage(piece)
+                    passages.append(current)
+
+        passages.sort(key=lambda passage: passage.rank)
+        return [passage.chunk() for passage in passages]
+
+    def pack(self, chunks: List[Dict], token_budget: Optional[int] = None) -> Tuple[List[Dict], Dict]:
+        """
+        Pack ranked chunks into prompt passages
+
+        The most relevant chunk always goes first, cut to the budget if need
+        be. The others follow in relevance order; a chunk is skipped if
+        adding it would exceed the budget (counting only the text it adds to
+        what is already selected), and later, smaller ones may still fit.
+
+        Args:
+            chunks: Retrieved chunks, most relevant first
+            token_budget: Estimated tokens for the context (default:
+                CONTEXT_TOKEN_BUDGET; 0 = no budget)
+
+        Returns:
+            (passages for the prompt, stats) - passages carry document_id,
+            chunk_number ("3-5" when merged) and text; stats has
+            context_tokens, tokens_saved (merging versus joining the used
+            chunks verbatim), tokens_dropped (chunks, or the part of the top
+            chunk, left out by the budget), chunks_used and passages
+        """
+        if not chunks:
+            return [], {"context_tokens": 0, "tokens_saved": 0, "tokens_dropped": 0, "chunks_used": 0, "passages": 0}
+        budget = self.token_budget if token_budget is None else token_budget
+        pieces = [_Piece(rank, chunk) for rank, chunk in enumerate(chunks)]
+
+        selected = pieces[:1]
+        passages = ContextPacker._merge(selected)
+        if budget > 0 and ContextPacker.tokens(passages) > budget:
+            # The top chunk alone overflows: cut it, nothing else fits
+            merged_tokens = ContextPacker.tokens(passages)
+            top = passages[0]
+            room = budget - estimate_tokens(ContextPacker._header(top))
+            passages = [{**top, "text": top["text"][:max(int(room * CHUNK_CHARS_PER_TOKEN), 0)]}]
+        else:
+            for piece in pieces[1:]:
+                candidate = ContextPacker._merge(selected + [piece])
+                if budget <= 0 or ContextPacker.tokens(candidate) <= budget:
+                    selected.append(piece)
+                    passages = candidate
+            merged_tokens = ContextPacker.tokens(passages)
+
+        context_tokens = ContextPacker.tokens(passages)
+        verbatim_tokens = ContextPacker.tokens([chunks[piece.rank] for piece in selected])
+        tokens_saved = max(verbatim_tokens - merged_tokens, 0)
+        return passages, {
+            "context_tokens": context_tokens,
+            "tokens_saved": tokens_saved,
+            "tokens_dropped": max(ContextPacker.tokens(chunks) - context_tokens - tokens_saved, 0),
+            "chunks_used": len(selected),
+            "passages": len(passages),
+        }
+
+
+# Create singleton instance
+context_packer = ContextPacker()
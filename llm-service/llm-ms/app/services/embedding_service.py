@@ -1,19 +1,44 @@
 """
 Embedding Service - Generates embeddings using Ollama's embedding model
-Handles document chunking and embedding generation
+Handles document chunking (via the chunking engine) and embedding generation
 """
 
 import aiohttp
+import asyncio
 import os
-from typing import List, Dict, Tuple
+from typing import AsyncIterator, List, Dict, Optional
 from dotenv import load_dotenv
+from app.services.http_service import http_service
+from app.services.metrics_service import metrics
+from app.services.logging_service import get_logger
+from app.services.cache_service import embedding_cache, hash_key
+from app.services.health_service import health_monitor
+from app.services.singleflight_service import singleflight
+from app.services.ollama_pool_service import embedding_pool
+from app.services.upstream_service import UpstreamError, upstream
+from app.services.batching_service import MicroBatcher
+from app.services.chunking_service import Chunk, Chunker, chunker as default_chunker, CHUNK_SIZE, CHUNK_OVERLAP
 
 load_dotenv()
 
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+logger = get_logger(__name__)
+
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text:latest")
-CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
-CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# Embedding batches in flight per embedding backend
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "2"))
+# Per-request timeout: base seconds plus 2s per text, capped by the request's deadline budget
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "60"))
+# Send a duplicate embedding request when the first has not answered after
+# this many seconds (0 = off); only for query embeddings, not ingestion
+EMBEDDING_HEDGE_AFTER = float(os.getenv("EMBEDDING_HEDGE_AFTER", "0"))
+# Query embeddings arriving within this window are sent as one request (0 = off)
+QUERY_EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("QUERY_EMBEDDING_BATCH_WINDOW_MS", "2"))
+QUERY_EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("QUERY_EMBEDDING_BATCH_MAX_SIZE", "32"))
+
+# Bounds how many embedding batches are in flight across all requests
+_batch_semaphore = asyncio.Semaphore(max(EMBEDDING_CONCURRENCY, 1) * len(embedding_pool.backends))
 
 
 class EmbeddingService:
@@ -23,49 +48,60 @@ class EmbeddingService:
     EMBEDDING_MODEL = EMBEDDING_MODEL
     CHUNK_SIZE = CHUNK_SIZE
     CHUNK_OVERLAP = CHUNK_OVERLAP
+    EMBEDDING_BATCH_SIZE = EMBEDDING_BATCH_SIZE
+    EMBEDDING_CONCURRENCY = EMBEDDING_CONCURRENCY
 
     @staticmethod
-    def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[Tuple[str, int]]:
+    def chunk_text(text: str, chunker: Optional[Chunker] = None) -> List[Chunk]:
         """
-        Split text into overlapping chunks
+        Split text into chunks
         
         Args:
             text: Text to chunk
-            chunk_size: Size of each chunk
-            overlap: Overlap between chunks
+            chunker: Chunking strategy (default: the configured chunker)
             
         Returns:
-            List of (chunk_text, chunk_number) tuples
+            List of Chunk(text, number, start, end) tuples
         """
         if not text or not text.strip():
             return []
+        return list((chunker or default_chunker).chunks(text))
 
-        chunks = []
-        chunk_number = 0
-        start = 0
-        step = max(chunk_size - overlap, 1)
+    @staticmethod
+    async def chunk_stream(
+        pieces: AsyncIterator[str],
+        chunker: Optional[Chunker] = None
+    ) -> AsyncIterator[Chunk]:
+        """
+        Incremental version of chunk_text for text that arrives in pieces
         
-        while start < len(text):
-            end = min(start + chunk_size, len(text))
-            chunk = text[start:end]
-            
-            if chunk.strip():  # Only add non-empty chunks
-                chunks.append((chunk, chunk_number))
-                chunk_number += 1
+        Produces exactly the chunks chunk_text would for the concatenated text,
+        but only ever buffers about one chunk plus the latest piece.
+        
+        Args:
+            pieces: Async iterator of text fragments (any sizes)
+            chunker: Chunking strategy (default: the configured chunker)
             
-            # Move forward by the non-overlapping step and stop at the end of the text
-            if end >= len(text):
-                break
+        Yields:
+            Chunk(text, number, start, end) tuples
+        """
+        async for chunk in (chunker or default_chunker).chunk_stream(pieces):
+            yield chunk
 
-            start += step
-        
-        return chunks
+    @staticmethod
+    def _cache_key(text: str, model_name: str) -> str:
+        """Content-addressed embedding cache key: (model, hash of text)"""
+        return hash_key(model_name, text)
 
     @staticmethod
     async def generate_embedding(text: str, model: str = None) -> List[float]:
         """
         Generate embedding for text using Ollama
         
+        Served from the embedding cache when the same text was embedded before
+        with the same model; concurrent identical requests share one call, and
+        concurrent different ones are micro-batched into one /api/embed request.
+        
         Args:
             text: Text to embed
             model: Model to use (or use default from .env)
@@ -74,69 +110,211 @@ class EmbeddingService:
             Embedding vector
         """
         model_name = model or EMBEDDING_MODEL
+        cache_key = EmbeddingService._cache_key(text, model_name)
+
+        cached = await embedding_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        async def fetch() -> List[float]:
+            # Same /api/embed path as batches, so cached vectors are interchangeable
+            embedding = await query_batcher.submit(model_name, text)
+            if embedding:
+                await embedding_cache.set(cache_key, embedding)
+            return embedding
+
+        # Identical concurrent requests share one upstream call
+        return await singleflight.do("embedding", cache_key, fetch)
+
+    @staticmethod
+    async def _embed_request(texts: List[str], model_name: str) -> List[List[float]]:
+        """One /api/embed request to the least busy embedding backend"""
+        async with embedding_pool.backend(model_name) as backend:
+            async with http_service.session.post(
+                f"{backend.url}/api/embed",
+                json={
+                    "model": model_name,
+                    "input": texts
+                },
+                timeout=aiohttp.ClientTimeout(total=upstream.timeout(EMBEDDING_TIMEOUT + 2 * len(texts), "embedding"))
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    health_monitor.mark_healthy("embedding_model")
+                    embeddings = data.get("embeddings", [])
+                    if len(embeddings) != len(texts):
+                        raise Exception(
+                            f"Embedding API returned {len(embeddings)} vectors for {len(texts)} inputs"
+                        )
+                    return embeddings
+                else:
+                    error_text = await response.text()
+                    raise Exception(f"Embedding API error ({response.status}): {error_text}")
+
+    @staticmethod
+    async def _embed_batch(texts: List[str], model_name: str, hedge: bool = False) -> List[List[float]]:
+        """
+        Embed several texts in one request using Ollama's batched /api/embed input
+        
+        Hedged requests (query embeddings, when EMBEDDING_HEDGE_AFTER is set):
+        a slow request gets a duplicate (which goes to the least busy backend)
+        and the first answer wins.
         
+        Args:
+            texts: Texts to embed (one sub-batch)
+            model_name: Embedding model
+            hedge: Allow a hedged duplicate request
+            
+        Returns:
+            Embedding vectors in the same order as texts
+        """
+        metrics.observe_embedding_batch(len(texts), model_name)
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{OLLAMA_BASE_URL}/api/embeddings",
-                    json={
-                        "model": model_name,
-                        "prompt": text
-                    },
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("embedding", [])
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"Embedding API error ({response.status}): {error_text}")
-        except aiohttp.ClientError as e:
-            raise Exception(f"Failed to connect to Ollama for embeddings: {str(e)}")
+            with metrics.stage("embedding", model=model_name):
+                async with upstream.guard("embedding"):
+                    if hedge and EMBEDDING_HEDGE_AFTER > 0:
+                        return await upstream.hedged(
+                            lambda: EmbeddingService._embed_request(texts, model_name),
+                            EMBEDDING_HEDGE_AFTER,
+                            "embedding"
+                        )
+                    return await EmbeddingService._embed_request(texts, model_name)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Unhealthy only once no embedding backend is left
+            if not embedding_pool.available():
+                health_monitor.mark_unhealthy("embedding_model", str(e) or type(e).__name__)
+            raise Exception(f"Failed to connect to Ollama for embeddings: {str(e) or type(e).__name__}")
+
+    @staticmethod
+    async def _embed_batch_with_retry(texts: List[str], model_name: str, hedge: bool = False) -> List[List[float]]:
+        """
+        Embed one sub-batch behind the concurrency semaphore, retrying it on its own
+        
+        Args:
+            texts: Texts in this sub-batch
+            model_name: Embedding model
+            hedge: Allow a hedged duplicate request
+            
+        Returns:
+            Embedding vectors for this sub-batch
+        """
+        last_error = None
+        for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+            try:
+                async with _batch_semaphore:
+                    return await EmbeddingService._embed_batch(texts, model_name, hedge)
+            except UpstreamError:
+                # Open breaker or spent budget: retrying cannot help
+                raise
+            except Exception as e:
+                last_error = e
+                if attempt < EMBEDDING_MAX_RETRIES:
+                    logger.warning("Embedding sub-batch failed, retrying", extra={"texts": len(texts), "attempt": attempt + 1, "error": str(e)})
+                    await asyncio.sleep(0.5 * (2 ** attempt))
+
+        raise Exception(
+            f"Embedding sub-batch of {len(texts)} failed after {EMBEDDING_MAX_RETRIES + 1} attempts: {last_error}"
+        )
 
     @staticmethod
-    async def generate_embeddings_batch(texts: List[str], model: str = None) -> List[List[float]]:
+    async def generate_embeddings_batch(
+        texts: List[str],
+        model: str = None,
+        batch_size: int = None
+    ) -> List[List[float]]:
         """
         Generate embeddings for multiple texts
         
+        Cached embeddings are reused and duplicate texts are embedded once. The
+        remaining texts are split into sub-batches that are sent to Ollama in
+        parallel (bounded by EMBEDDING_CONCURRENCY); each sub-batch is retried
+        independently.
+        
         Args:
             texts: List of texts to embed
             model: Model to use
+            batch_size: Texts per request (or use EMBEDDING_BATCH_SIZE)
             
         Returns:
-            List of embedding vectors
+            List of embedding vectors, in input order
+        """
+        if not texts:
+            return []
+
+        model_name = model or EMBEDDING_MODEL
+        keys = [EmbeddingService._cache_key(text, model_name) for text in texts]
+        cached = await embedding_cache.get_many(list(set(keys)))
+
+        # Unique texts that still need embedding
+        pending: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in pending:
+                pending[key] = text
+
+        if pending:
+            fresh = await EmbeddingService._embed_texts(list(pending.values()), model_name, batch_size)
+            computed = dict(zip(pending.keys(), fresh))
+            await embedding_cache.set_many(computed)
+            cached.update(computed)
+
+        return [cached[key] for key in keys]
+
+    @staticmethod
+    async def _embed_texts(
+        texts: List[str],
+        model_name: str,
+        batch_size: int = None
+    ) -> List[List[float]]:
         """
-        embeddings = []
-        for text in texts:
-            embedding = await EmbeddingService.generate_embedding(text, model)
-            embeddings.append(embedding)
+        Embed texts through parallel, independently retried sub-batches
         
-        return embeddings
+        Args:
+            texts: Texts to embed
+            model_name: Embedding model
+            batch_size: Texts per request (or use EMBEDDING_BATCH_SIZE)
+            
+        Returns:
+            Embedding vectors in input order
+        """
+        size = max(batch_size or EMBEDDING_BATCH_SIZE, 1)
+        batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+
+        tasks = [
+            asyncio.create_task(EmbeddingService._embed_batch_with_retry(batch, model_name))
+            for batch in batches
+        ]
+        try:
+            results = await asyncio.gather(*tasks)
+        except Exception:
+            # Don't leave sibling batches running once the whole call has failed
+            for task in tasks:
+                task.cancel()
+            raise
+
+        # gather preserves task order, so flattening keeps the input order
+        return [embedding for batch in results for embedding in batch]
 
     @staticmethod
     async def check_embedding_model_available() -> bool:
         """
         Check if embedding model is available
         
+        Refreshes the model list of every embedding backend on the way.
+        
         Returns:
-            True if available, False otherwise
+            True if a live backend has the model, False otherwise
         """
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{OLLAMA_BASE_URL}/api/tags",
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        models = data.get("models", [])
-                        model_names = [m.get("name") for m in models]
-                        return any(EMBEDDING_MODEL in name for name in model_names)
-                    return False
-        except Exception as e:
-            print(f"❌ Failed to check embedding model: {e}")
+        if not await embedding_pool.refresh():
             return False
+        return embedding_pool.has_model(EMBEDDING_MODEL)
 
 
-# Create singleton instance
+# Create singleton instances
 embedding_service = EmbeddingService()
+# Query embeddings (generate_embedding) from concurrent requests, batched per model
+query_batcher = MicroBatcher(
+    "query embedding",
+    lambda model_name, texts: EmbeddingService._embed_batch_with_retry(texts, model_name, hedge=True),
+    QUERY_EMBEDDING_BATCH_WINDOW_MS / 1000,
+    QUERY_EMBEDDING_BATCH_MAX_SIZE
+)
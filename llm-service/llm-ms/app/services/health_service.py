@@ -0,0 +1,133 @@
+"""
+Health Service - Background prober with a cached dependency status
+Probes Ollama, the embedding model and ChromaDB on an interval so request
+handlers and /health endpoints can read status without doing any I/O
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+from app.services.logging_service import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "10"))
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    """Render an epoch timestamp as ISO-8601 (UTC)"""
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+class HealthMonitor:
+    """Keeps the last known health of each upstream dependency"""
+
+    def __init__(self):
+        self._probes: Dict[str, Callable[[], Awaitable[bool]]] = {}
+        self._status: Dict[str, Dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, component: str, probe: Callable[[], Awaitable[bool]]) -> None:
+        """
+        Register a probe for a component
+
+        Args:
+            component: Component name (e.g. "ollama", "chromadb")
+            probe: Coroutine function returning True when healthy
+        """
+        self._probes[component] = probe
+        self._status.setdefault(component, {
+            "healthy": None,  # Unknown until the first probe completes
+            "last_checked": None,
+            "last_seen": None,
+            "last_error": None,
+        })
+
+    async def start(self) -> None:
+        """Start probing in the background (the first round runs immediately)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background prober"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        """Probe loop"""
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.warning("Health probe round failed", extra={"error": str(e)})
+            await asyncio.sleep(HEALTH_PROBE_INTERVAL)
+
+    async def _probe(self, component: str) -> None:
+        """Run one probe and record its outcome"""
+        try:
+            healthy = await asyncio.wait_for(self._probes[component](), timeout=HEALTH_PROBE_TIMEOUT)
+            error = None if healthy else "probe reported unhealthy"
+        except Exception as e:
+            healthy, error = False, str(e) or type(e).__name__
+
+        if healthy:
+            self.mark_healthy(component)
+        else:
+            self.mark_unhealthy(component, error)
+
+    async def probe_all(self) -> None:
+        """Probe every registered component concurrently"""
+        await asyncio.gather(*(self._probe(component) for component in self._probes))
+
+    def mark_healthy(self, component: str) -> None:
+        """Record a successful probe or live request"""
+        now = time.time()
+        status = self._status.setdefault(component, {})
+        status.update(healthy=True, last_checked=now, last_seen=now, last_error=None)
+
+    def mark_unhealthy(self, component: str, error: str = None) -> None:
+        """Record a failed probe or live request (takes effect immediately)"""
+        status = self._status.setdefault(component, {"last_seen": None})
+        status.update(healthy=False, last_checked=time.time(), last_error=error)
+
+    def is_healthy(self, component: str) -> bool:
+        """
+        Cached health of a component
+
+        Unknown components (not probed yet) are treated as healthy so a slow
+        first probe never rejects traffic.
+        """
+        healthy = self._status.get(component, {}).get("healthy")
+        return healthy is not False
+
+    def status(self, component: str) -> Dict:
+        """Cached status of one component with ISO timestamps"""
+        status = self._status.get(component, {})
+        healthy = status.get("healthy")
+        return {
+            "status": "unknown" if healthy is None else ("healthy" if healthy else "unhealthy"),
+            "last_checked": _iso(status.get("last_checked")),
+            "last_seen": _iso(status.get("last_seen")),
+            "last_error": status.get("last_error"),
+        }
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Cached status of every component"""
+        return {component: self.status(component) for component in self._status}
+
+
+# Create singleton instance
+health_monitor = HealthMonitor()
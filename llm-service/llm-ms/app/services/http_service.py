@@ -0,0 +1,75 @@
+"""
+HTTP Client Service - Shared, pooled aiohttp session for upstream traffic
+One connection pool is opened at startup and reused by every Ollama call
+"""
+
+import aiohttp
+import os
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connection pool configuration
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "32"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+
+
+class HTTPClientService:
+    """Owns the shared aiohttp.ClientSession used by all upstream services"""
+
+    def __init__(self):
+        """Session is created lazily by start() (or on first use)"""
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """Build a session backed by a keep-alive, DNS-caching connection pool"""
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            use_dns_cache=True,
+        )
+        # Per-request timeouts are passed by each caller
+        return aiohttp.ClientSession(connector=connector)
+
+    async def start(self) -> None:
+        """Open the connection pool (called from the app startup hook)"""
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+
+    async def close(self) -> None:
+        """Close the pool and release all sockets (called on shutdown)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        Get the shared session
+
+        Falls back to creating it on first use so scripts that import the
+        services without running the FastAPI lifecycle keep working.
+        """
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+
+    def stats(self) -> dict:
+        """Current pool configuration"""
+        connector = self._session.connector if self._session and not self._session.closed else None
+        return {
+            "open": connector is not None,
+            "limit": HTTP_POOL_LIMIT,
+            "limit_per_host": HTTP_POOL_LIMIT_PER_HOST,
+            "keepalive_timeout": HTTP_KEEPALIVE_TIMEOUT,
+            "dns_cache_ttl": HTTP_DNS_CACHE_TTL,
+        }
+
+
+# Create singleton instance
+http_service = HTTPClientService()
@@ -3,15 +3,162 @@ Ingestion Service - Document ingestion and vector embedding pipeline
 Handles document chunking, embedding generation, and vector storage
 """
 
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from app.services.embedding_service import embedding_service, EmbeddingService
+from app.services.chunking_service import Chunk
 from app.services.chroma_service import chroma_service
+from app.services.vector_store_service import InvalidCollectionName
+from app.services.cache_service import answer_cache, hash_key
+from app.services.lexical_service import lexical_index
+from app.services.metrics_service import metrics
+from app.services.logging_service import get_logger
+from dotenv import load_dotenv
+import asyncio
+import os
+import time
 import uuid
 
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Streaming ingestion pipeline: max chunk batches waiting between stages
+INGEST_PIPELINE_DEPTH = int(os.getenv("INGEST_PIPELINE_DEPTH", "4"))
+# Bulk ingestion: documents processed together (sharing embedding batches)
+INGEST_BATCH_CONCURRENCY = int(os.getenv("INGEST_BATCH_CONCURRENCY", "8"))
+# Bulk ingestion: max chunks per coalesced ChromaDB upsert
+INGEST_WRITE_BATCH_SIZE = int(os.getenv("INGEST_WRITE_BATCH_SIZE", "2000"))
+# Finished ingestion jobs kept for progress lookups
+INGEST_PROGRESS_HISTORY = int(os.getenv("INGEST_PROGRESS_HISTORY", "1000"))
+
 
 class IngestionService:
     """Service for document ingestion: chunk, embed, and store in ChromaDB"""
 
+    # Progress of streaming ingestion jobs, keyed by "collection/document_id"
+    _progress: "OrderedDict[str, Dict]" = OrderedDict()
+
+    @staticmethod
+    def _collection_changed(collection_name: str) -> None:
+        """Invalidate answers cached for a collection whose contents changed"""
+        removed = answer_cache.invalidate(chroma_service.safe_name(collection_name))
+        if removed:
+            logger.info("Invalidated cached answers", extra={"collection": collection_name, "count": removed})
+
+    @staticmethod
+    def _chunk_id(document_id: str, content_hash: str, seen: Dict[str, int]) -> str:
+        """
+        Content-addressed ChromaDB ID of a document chunk
+
+        Unchanged text keeps its ID across re-ingestions; repeated text within a
+        document gets an occurrence suffix.
+        """
+        occurrence = seen.get(content_hash, 0)
+        seen[content_hash] = occurrence + 1
+        if occurrence:
+            return f"{document_id}_{content_hash}_{occurrence}"
+        return f"{document_id}_{content_hash}"
+
+    @staticmethod
+    def _chunk_metadata(document_id: str, chunk: Chunk, content_hash: str, metadata: Optional[Dict]) -> Dict:
+        """Metadata stored with each chunk (start/end are offsets into the document)"""
+        return {
+            "document_id": document_id,
+            "chunk_number": chunk.number,
+            "chunk_size": len(chunk.text),
+            "start": chunk.start,
+            "end": chunk.end,
+            "content_hash": content_hash,
+            **(metadata or {})
+        }
+
+    @staticmethod
+    def _chunk_rows(
+        document_id: str,
+        chunks: List[Chunk],
+        metadata: Optional[Dict],
+        seen: Optional[Dict[str, int]] = None
+    ) -> Tuple[List[str], List[str], List[Dict]]:
+        """
+        (ids, texts, metadatas) columns for a document's chunks
+
+        Args:
+            seen: Occurrence counts of content hashes so far (for streamed
+                documents chunked across several calls)
+        """
+        seen = {} if seen is None else seen
+        ids, texts, metadatas = [], [], []
+        for chunk in chunks:
+            content_hash = hash_key(chunk.text)[:16]
+            ids.append(IngestionService._chunk_id(document_id, content_hash, seen))
+            texts.append(chunk.text)
+            metadatas.append(IngestionService._chunk_metadata(document_id, chunk, content_hash, metadata))
+        return ids, texts, metadatas
+
+    @staticmethod
+    async def _existing_chunks(collection_name: str, document_id: str) -> Dict[str, Dict]:
+        """Stored chunks of a document: chunk ID -> metadata"""
+        stored = await chroma_service.get_documents(collection_name, where={"document_id": document_id})
+        return dict(zip(stored["ids"], stored["metadatas"]))
+
+    @staticmethod
+    def _diff(
+        ids: List[str],
+        metadatas: List[Dict],
+        existing: Dict[str, Dict]
+    ) -> Tuple[List[int], List[int]]:
+        """
+        Compare new chunk rows with the stored ones
+
+        Returns:
+            (new, moved): indexes of chunks that must be embedded, and of
+            unchanged chunks whose metadata (e.g. offsets) changed
+        """
+        new, moved = [], []
+        for index, (chunk_id, metadata) in enumerate(zip(ids, metadatas)):
+            stored = existing.get(chunk_id)
+            if stored is None:
+                new.append(index)
+            elif stored != metadata:
+                moved.append(index)
+        return new, moved
+
+    @staticmethod
+    async def _write_changes(
+        collection_name: str,
+        new_rows: Tuple[List[str], List[str], List[Dict], List[List[float]]],
+        moved_rows: Tuple[List[str], List[str], List[Dict]],
+        stale_ids: List[str]
+    ) -> None:
+        """
+        Apply a chunk diff to the vector store and the BM25 index
+
+        New chunks are written before stale ones are deleted, so a document
+        never disappears from search while it is being updated.
+        """
+        ids, texts, metadatas, embeddings = new_rows
+        for start in range(0, len(ids), INGEST_WRITE_BATCH_SIZE):
+            end = start + INGEST_WRITE_BATCH_SIZE
+            await chroma_service.upsert_documents(
+                collection_name=collection_name,
+                ids=ids[start:end],
+                documents=texts[start:end],
+                metadatas=metadatas[start:end],
+                embeddings=embeddings[start:end]
+            )
+            await lexical_index.add(collection_name, ids[start:end], texts[start:end], metadatas[start:end])
+
+        ids, texts, metadatas = moved_rows
+        for start in range(0, len(ids), INGEST_WRITE_BATCH_SIZE):
+            end = start + INGEST_WRITE_BATCH_SIZE
+            await chroma_service.update_metadatas(collection_name, ids[start:end], metadatas[start:end])
+            await lexical_index.add(collection_name, ids[start:end], texts[start:end], metadatas[start:end])
+
+        if stale_ids:
+            await chroma_service.delete_documents(collection_name, ids=stale_ids)
+            await lexical_index.delete(collection_name, stale_ids)
+
     @staticmethod
     async def ingest_document(
         document_id: str,
@@ -22,6 +169,10 @@ class IngestionService:
         """
         Ingest a document: chunk, embed, and store in ChromaDB
         
+        Idempotent: re-ingesting a document only embeds and writes chunks whose
+        text is new, updates the metadata of chunks that merely moved, and
+        deletes chunks that disappeared.
+        
         Args:
             document_id: Unique document identifier
             document_text: Full text of the document
@@ -29,18 +180,19 @@ class IngestionService:
             collection_name: Name of the ChromaDB collection
             
         Returns:
-            Ingestion result with chunk count and status
+            Ingestion result with chunk counts and status
             
         Flow:
             1. Create or get ChromaDB collection
-            2. Split document into overlapping chunks
-            3. Generate embeddings for all chunks (batch)
-            4. Prepare metadata for each chunk
-            5. Store chunks with embeddings in ChromaDB
+            2. Split document into boundary-aware chunks
+            3. Hash chunks and diff them against the stored ones
+            4. Generate embeddings for new chunks only (batch)
+            5. Upsert new chunks, update moved ones, delete stale ones
         """
+        metrics.set_collection(collection_name)
         try:
             # 1. Create or get collection
-            collection_id = chroma_service.get_or_create_collection(
+            collection_id = await chroma_service.get_or_create_collection(
                 collection_name,
                 metadata={"type": "documents"}
             )
@@ -49,47 +201,444 @@ class IngestionService:
             chunks = EmbeddingService.chunk_text(document_text)
             if not chunks:
                 raise ValueError(f"No textual content extracted from document '{document_id}'")
-            print(f"📦 Created {len(chunks)} chunks from document '{document_id}'")
+            logger.debug("Chunked document", extra={"document_id": document_id, "chunks": len(chunks)})
 
-            # 3. Generate embeddings for chunks (batch processing)
-            chunk_texts = [chunk[0] for chunk in chunks]
-            embeddings = await embedding_service.generate_embeddings_batch(chunk_texts)
-            print(f"🧠 Generated {len(embeddings)} embeddings")
+            # 3. Diff against what is stored
+            ids, texts, metadatas = IngestionService._chunk_rows(document_id, chunks, metadata)
+            existing = await IngestionService._existing_chunks(collection_name, document_id)
+            new, moved = IngestionService._diff(ids, metadatas, existing)
+            stale_ids = sorted(set(existing) - set(ids))
 
-            # 4. Prepare documents for ChromaDB
-            ids = [f"{document_id}_chunk_{i}" for i, _ in chunks]
-            metadatas = [
-                {
-                    "document_id": document_id,
-                    "chunk_number": chunk_num,
-                    "chunk_size": len(chunk_text),
-                    **(metadata or {})
-                }
-                for chunk_text, chunk_num in chunks
-            ]
+            # 4. Generate embeddings for new chunks (batch processing)
+            embeddings = await embedding_service.generate_embeddings_batch([texts[i] for i in new]) if new else []
+            logger.debug("Embedded new chunks", extra={"document_id": document_id, "embedded": len(embeddings), "unchanged": len(chunks) - len(new)})
 
-            # 5. Store in ChromaDB
-            chroma_service.add_documents(
-                collection_name=collection_name,
-                documents=chunk_texts,
-                metadatas=metadatas,
-                ids=ids,
-                embeddings=embeddings
+            # 5. Store the changes in ChromaDB and the BM25 index
+            await IngestionService._write_changes(
+                collection_name,
+                ([ids[i] for i in new], [texts[i] for i in new], [metadatas[i] for i in new], embeddings),
+                ([ids[i] for i in moved], [texts[i] for i in moved], [metadatas[i] for i in moved]),
+                stale_ids
             )
+            if new or moved or stale_ids:
+                IngestionService._collection_changed(collection_name)
 
             return {
                 "status": "success",
                 "document_id": document_id,
                 "chunk_count": len(chunks),
-                "collection_id": collection_id
+                "collection_id": collection_id,
+                "chunks_embedded": len(new),
+                "chunks_unchanged": len(chunks) - len(new),
+                "chunks_deleted": len(stale_ids)
             }
 
         except Exception as e:
-            print(f"❌ Error ingesting document: {e}")
+            logger.error("Error ingesting document", extra={"document_id": document_id, "collection": collection_name, "error": str(e)})
+            raise
+
+    @staticmethod
+    async def ingest_documents_batch(documents: List[Dict]) -> Dict:
+        """
+        Ingest many documents in one call
+        
+        Documents are processed in groups of INGEST_BATCH_CONCURRENCY. Within a
+        group, the new chunks of all documents share embedding batches, and
+        ChromaDB writes are coalesced into large upserts per collection. As with
+        ingest_document, unchanged chunks are not re-embedded. A failing
+        document is reported in its own result and does not fail the batch.
+        When the same document_id appears more than once for a collection,
+        the last entry is ingested and the earlier ones fail as superseded.
+        
+        Args:
+            documents: List of {document_id, document_text, metadata, collection_name}
+            
+        Returns:
+            Per-document results plus succeeded/failed counts
+            
+        Flow:
+            1. Create or get every referenced collection once
+            2. Chunk each document of the group and diff it against stored chunks
+            3. Embed the group's new chunks together (per document on failure)
+            4. Write changes per collection in large writes (per document on failure)
+        """
+        results: Dict[int, Dict] = IngestionService._supersede_duplicates(documents)
+
+        # 1. Create or get each collection once
+        collection_ids: Dict[str, str] = {}
+        collection_errors: Dict[str, str] = {}
+        names = sorted({doc.get("collection_name") or "documents" for doc in documents})
+        created = await asyncio.gather(
+            *(chroma_service.get_or_create_collection(name, metadata={"type": "documents"}) for name in names),
+            return_exceptions=True
+        )
+        for name, outcome in zip(names, created):
+            if isinstance(outcome, BaseException):
+                collection_errors[name] = str(outcome)
+            else:
+                collection_ids[name] = outcome
+
+        # Documents of a group are diffed against one snapshot of the store,
+        # hence only one entry per document
+        pending = [(index, doc) for index, doc in enumerate(documents) if index not in results]
+        group_size = max(INGEST_BATCH_CONCURRENCY, 1)
+        for start in range(0, len(pending), group_size):
+            group = pending[start:start + group_size]
+            results.update(await IngestionService._ingest_group(group, collection_ids, collection_errors))
+
+        ordered = [results[i] for i in range(len(documents))]
+        succeeded = sum(1 for result in ordered if result["status"] == "success")
+        logger.info("Batch ingestion finished", extra={"succeeded": succeeded, "documents": len(ordered)})
+        return {
+            "results": ordered,
+            "succeeded": succeeded,
+            "failed": len(ordered) - succeeded
+        }
+
+    @staticmethod
+    def _supersede_duplicates(documents: List[Dict]) -> Dict[int, Dict]:
+        """Failed results for entries whose document comes again later in the batch"""
+        last: Dict[Tuple[str, str], int] = {}
+        keys = []
+        for index, doc in enumerate(documents):
+            collection_name = doc.get("collection_name") or "documents"
+            try:
+                collection_name = chroma_service.safe_name(collection_name)
+            except InvalidCollectionName:
+                pass  # Reported when the collection is created
+            key = (collection_name, doc.get("document_id"))
+            keys.append(key)
+            last[key] = index
+
+        return {
+            index: {
+                "status": "failed",
+                "document_id": doc.get("document_id"),
+                "chunk_count": 0,
+                "collection_id": None,
+                "error": f"Superseded by entry {last[key]} for the same document in this batch"
+            }
+            for index, (doc, key) in enumerate(zip(documents, keys))
+            if last[key] != index
+        }
+
+    @staticmethod
+    async def _ingest_group(
+        group: List[Tuple[int, Dict]],
+        collection_ids: Dict[str, str],
+        collection_errors: Dict[str, str]
+    ) -> Dict[int, Dict]:
+        """Chunk, diff, embed and store one group of documents for ingest_documents_batch"""
+        results: Dict[int, Dict] = {}
+        # index -> (document, collection_name, (ids, texts, metadatas))
+        prepared: Dict[int, Tuple[Dict, str, Tuple[List[str], List[str], List[Dict]]]] = {}
+        # index -> (new, moved, stale_ids)
+        plans: Dict[int, Tuple[List[int], List[int], List[str]]] = {}
+
+        def fail(index: int, doc: Dict, error: str) -> None:
+            results[index] = {
+                "status": "failed",
+                "document_id": doc.get("document_id"),
+                "chunk_count": 0,
+                "collection_id": None,
+                "error": error
+            }
+
+        # 2. Chunk each document and diff it against its stored chunks
+        for index, doc in group:
+            collection_name = doc.get("collection_name") or "documents"
+            if collection_name in collection_errors:
+                fail(index, doc, f"Collection unavailable: {collection_errors[collection_name]}")
+                continue
+            chunks = EmbeddingService.chunk_text(doc.get("document_text") or "")
+            if not chunks:
+                fail(index, doc, f"No textual content extracted from document '{doc.get('document_id')}'")
+                continue
+            rows = IngestionService._chunk_rows(doc.get("document_id"), chunks, doc.get("metadata"))
+            prepared[index] = (doc, collection_name, rows)
+
+        indexes = list(prepared)
+        stored_chunks = await asyncio.gather(
+            *(IngestionService._existing_chunks(prepared[i][1], prepared[i][0].get("document_id")) for i in indexes),
+            return_exceptions=True
+        )
+        for index, existing in zip(indexes, stored_chunks):
+            doc, _, (ids, _, metadatas) = prepared[index]
+            if isinstance(existing, BaseException):
+                fail(index, doc, f"Reading stored chunks failed: {existing}")
+                del prepared[index]
+                continue
+            new, moved = IngestionService._diff(ids, metadatas, existing)
+            plans[index] = (new, moved, sorted(set(existing) - set(ids)))
+
+        # 3. Embed the new chunks of the group in shared batches
+        embeddings: Dict[int, List[List[float]]] = {}
+        texts_by_index = {
+            index: [prepared[index][2][1][i] for i in plans[index][0]]
+            for index in prepared
+        }
+        try:
+            flat = await embedding_service.generate_embeddings_batch(
+                [text for texts in texts_by_index.values() for text in texts]
+            )
+            offset = 0
+            for index, texts in texts_by_index.items():
+                embeddings[index] = flat[offset:offset + len(texts)]
+                offset += len(texts)
+        except Exception as e:
+            # Isolate the failure: embed each document on its own
+            logger.warning("Shared embedding failed, retrying per document", extra={"error": str(e)})
+            indexes = list(texts_by_index)
+            outcomes = await asyncio.gather(
+                *(embedding_service.generate_embeddings_batch(texts_by_index[i]) for i in indexes),
+                return_exceptions=True
+            )
+            for index, outcome in zip(indexes, outcomes):
+                if isinstance(outcome, BaseException):
+                    fail(index, prepared[index][0], f"Embedding failed: {outcome}")
+                else:
+                    embeddings[index] = outcome
+
+        # 4. Coalesce writes per collection
+        by_collection: Dict[str, List[int]] = {}
+        for index in embeddings:
+            by_collection.setdefault(prepared[index][1], []).append(index)
+
+        def changes(indexes: List[int]) -> Tuple[Tuple, Tuple, List[str]]:
+            """Merged (new_rows, moved_rows, stale_ids) of several documents"""
+            new_rows, moved_rows, stale_ids = ([], [], [], []), ([], [], []), []
+            for index in indexes:
+                ids, texts, metadatas = prepared[index][2]
+                new, moved, stale = plans[index]
+                new_rows[0].extend(ids[i] for i in new)
+                new_rows[1].extend(texts[i] for i in new)
+                new_rows[2].extend(metadatas[i] for i in new)
+                new_rows[3].extend(embeddings[index])
+                moved_rows[0].extend(ids[i] for i in moved)
+                moved_rows[1].extend(texts[i] for i in moved)
+                moved_rows[2].extend(metadatas[i] for i in moved)
+                stale_ids.extend(stale)
+            return new_rows, moved_rows, stale_ids
+
+        for collection_name, indexes in by_collection.items():
+            try:
+                await IngestionService._write_changes(collection_name, *changes(indexes))
+                stored = indexes
+            except Exception as e:
+                # Isolate the failure: write each document on its own
+                logger.warning("Coalesced write failed, retrying per document", extra={"collection": collection_name, "error": str(e)})
+                stored = []
+                for index in indexes:
+                    try:
+                        await IngestionService._write_changes(collection_name, *changes([index]))
+                        stored.append(index)
+                    except Exception as doc_error:
+                        fail(index, prepared[index][0], f"Storage failed: {doc_error}")
+
+            if any(plans[index][0] or plans[index][1] or plans[index][2] for index in stored):
+                IngestionService._collection_changed(collection_name)
+
+            for index in stored:
+                doc, _, (ids, _, _) = prepared[index]
+                new, _, stale = plans[index]
+                results[index] = {
+                    "status": "success",
+                    "document_id": doc.get("document_id"),
+                    "chunk_count": len(ids),
+                    "collection_id": collection_ids[collection_name],
+                    "error": None,
+                    "chunks_embedded": len(new),
+                    "chunks_unchanged": len(ids) - len(new),
+                    "chunks_deleted": len(stale)
+                }
+
+        return results
+
+    @staticmethod
+    def _progress_key(document_id: str, collection_name: str) -> str:
+        return f"{collection_name}/{document_id}"
+
+    @staticmethod
+    def get_progress(document_id: str, collection_name: str = "documents") -> Optional[Dict]:
+        """
+        Progress of a streaming ingestion job
+        
+        Returns:
+            Progress counters, or None if no such job is known
+        """
+        progress = IngestionService._progress.get(IngestionService._progress_key(document_id, collection_name))
+        return dict(progress) if progress else None
+
+    @staticmethod
+    async def ingest_document_stream(
+        document_id: str,
+        text_stream: AsyncIterator[str],
+        metadata: Optional[Dict] = None,
+        collection_name: str = "documents"
+    ) -> Dict:
+        """
+        Ingest a document whose text arrives as a stream
+        
+        Chunking, embedding and ChromaDB writes run as concurrent pipeline stages
+        joined by bounded queues. A slow stage makes the earlier ones wait
+        (backpressure), so memory stays flat regardless of document size.
+        Like ingest_document, only new chunks are embedded; stale chunks are
+        deleted once the whole stream was stored.
+        
+        Args:
+            document_id: Unique document identifier
+            text_stream: Async iterator of text fragments
+            metadata: Optional metadata for the document
+            collection_name: Name of the ChromaDB collection
+            
+        Returns:
+            Ingestion result with chunk count and status
+            
+        Flow:
+            1. Create or get ChromaDB collection and load the stored chunk IDs
+            2. Chunk text as it arrives, in batches of EMBEDDING_BATCH_SIZE
+            3. Embed the new chunks of each batch (EMBEDDING_CONCURRENCY workers)
+            4. Write embedded batches to ChromaDB
+            5. Delete chunks that are no longer part of the document
+        """
+        metrics.set_collection(collection_name)
+        progress_key = IngestionService._progress_key(document_id, collection_name)
+        progress = {
+            "document_id": document_id,
+            "collection_name": collection_name,
+            "status": "running",
+            "chars_received": 0,
+            "chunks_created": 0,
+            "chunks_embedded": 0,
+            "chunks_unchanged": 0,
+            "chunks_stored": 0,
+            "chunks_deleted": 0,
+            "started_at": time.time(),
+            "finished_at": None,
+            "error": None,
+        }
+        IngestionService._progress[progress_key] = progress
+        IngestionService._progress.move_to_end(progress_key)
+        while len(IngestionService._progress) > INGEST_PROGRESS_HISTORY:
+            IngestionService._progress.popitem(last=False)
+
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_PIPELINE_DEPTH)
+        store_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_PIPELINE_DEPTH)
+        embed_workers = max(EmbeddingService.EMBEDDING_CONCURRENCY, 1)
+        # Stored chunks of the document (ID -> metadata), chunk IDs seen so far
+        existing: Dict[str, Dict] = {}
+        seen_ids = set()
+        moved_count = 0
+
+        async def counted(pieces: AsyncIterator[str]) -> AsyncIterator[str]:
+            async for piece in pieces:
+                progress["chars_received"] += len(piece)
+                yield piece
+
+        async def chunker() -> None:
+            # IDs are assigned here, in document order, so repeated text is
+            # numbered exactly as ingest_document would number it
+            occurrences: Dict[str, int] = {}
+            batch: List[Chunk] = []
+            async for chunk in EmbeddingService.chunk_stream(counted(text_stream)):
+                batch.append(chunk)
+                progress["chunks_created"] += 1
+                if len(batch) >= EmbeddingService.EMBEDDING_BATCH_SIZE:
+                    rows = IngestionService._chunk_rows(document_id, batch, metadata, occurrences)
+                    seen_ids.update(rows[0])
+                    await chunk_queue.put(rows)
+                    batch = []
+            if batch:
+                rows = IngestionService._chunk_rows(document_id, batch, metadata, occurrences)
+                seen_ids.update(rows[0])
+                await chunk_queue.put(rows)
+            for _ in range(embed_workers):
+                await chunk_queue.put(None)
+
+        async def embedder() -> None:
+            while (rows := await chunk_queue.get()) is not None:
+                ids, texts, metadatas = rows
+                new, moved = IngestionService._diff(ids, metadatas, existing)
+                embeddings = (
+                    await embedding_service.generate_embeddings_batch([texts[i] for i in new]) if new else []
+                )
+                progress["chunks_embedded"] += len(new)
+                progress["chunks_unchanged"] += len(ids) - len(new)
+                await store_queue.put((rows, new, moved, embeddings))
+            await store_queue.put(None)
+
+        async def writer() -> None:
+            nonlocal moved_count
+            finished_embedders = 0
+            while finished_embedders < embed_workers:
+                item = await store_queue.get()
+                if item is None:
+                    finished_embedders += 1
+                    continue
+                (ids, texts, metadatas), new, moved, embeddings = item
+                await IngestionService._write_changes(
+                    collection_name,
+                    ([ids[i] for i in new], [texts[i] for i in new], [metadatas[i] for i in new], embeddings),
+                    ([ids[i] for i in moved], [texts[i] for i in moved], [metadatas[i] for i in moved]),
+                    []
+                )
+                moved_count += len(moved)
+                progress["chunks_stored"] += len(ids)
+
+        try:
+            # 1. Create or get collection
+            collection_id = await chroma_service.get_or_create_collection(
+                collection_name,
+                metadata={"type": "documents"}
+            )
+            existing.update(await IngestionService._existing_chunks(collection_name, document_id))
+
+            # 2-4. Run the pipeline stages concurrently
+            stages = [
+                asyncio.create_task(chunker()),
+                *(asyncio.create_task(embedder()) for _ in range(embed_workers)),
+                asyncio.create_task(writer()),
+            ]
+            try:
+                await asyncio.gather(*stages)
+            except BaseException:
+                # One failed stage would leave the others blocked on their queues
+                for stage in stages:
+                    stage.cancel()
+                raise
+
+            if progress["chunks_created"] == 0:
+                raise ValueError(f"No textual content extracted from document '{document_id}'")
+
+            # 5. Remove chunks the new version no longer has
+            stale_ids = sorted(set(existing) - seen_ids)
+            await IngestionService._write_changes(collection_name, ([], [], [], []), ([], [], []), stale_ids)
+            progress["chunks_deleted"] = len(stale_ids)
+
+            progress["status"] = "success"
+            logger.info("Streamed document ingested", extra={"document_id": document_id, "chunks": progress["chunks_stored"], "embedded": progress["chunks_embedded"]})
+            return {
+                "status": "success",
+                "document_id": document_id,
+                "chunk_count": progress["chunks_stored"],
+                "collection_id": collection_id,
+                "chunks_embedded": progress["chunks_embedded"],
+                "chunks_unchanged": progress["chunks_unchanged"],
+                "chunks_deleted": progress["chunks_deleted"]
+            }
+
+        except BaseException as e:
+            progress["status"] = "failed"
+            progress["error"] = str(e) or type(e).__name__
+            logger.error("Error ingesting document stream", extra={"document_id": document_id, "collection": collection_name, "error": str(e)})
             raise
+        finally:
+            progress["finished_at"] = time.time()
+            if progress["chunks_embedded"] or moved_count or progress["chunks_deleted"]:
+                IngestionService._collection_changed(collection_name)
 
     @staticmethod
-    def delete_document(
+    async def delete_document(
         document_id: str,
         collection_name: str = "documents"
     ) -> Dict:
@@ -101,19 +650,42 @@ class IngestionService:
             collection_name: Collection containing the document
             
         Returns:
-            Deletion status
+            Deletion status ("success", or "not_found" if no chunks were stored)
+            
+        Flow:
+            1. Look up the document's chunk IDs by its document_id metadata
+            2. Delete the chunks through the same document_id filter
+            3. Drop them from the BM25 index and invalidate cached answers
         """
         try:
-            # Get all chunk IDs for this document
-            # This would require querying ChromaDB for chunks with matching document_id
-            # For now, implementation is framework-ready
-            print(f"⚠️  Document deletion not yet fully implemented for document '{document_id}'")
+            # 1. Find the document's chunks (a missing collection has none).
+            # has_collection raises when the store is unreachable, so an
+            # outage is never reported as "not found"
+            existing = {}
+            if await chroma_service.has_collection(collection_name):
+                existing = await IngestionService._existing_chunks(collection_name, document_id)
+            if not existing:
+                return {
+                    "status": "not_found",
+                    "document_id": document_id,
+                    "chunks_deleted": 0
+                }
+
+            # 2. Delete them by metadata filter
+            await chroma_service.delete_documents(collection_name, where={"document_id": document_id})
+
+            # 3. Keep the lexical index and answer cache in sync
+            await lexical_index.delete(collection_name, list(existing))
+            IngestionService._collection_changed(collection_name)
+
+            logger.info("Deleted document", extra={"document_id": document_id, "collection": collection_name, "chunks": len(existing)})
             return {
-                "status": "pending",
-                "message": "Document deletion framework ready, full implementation pending"
+                "status": "success",
+                "document_id": document_id,
+                "chunks_deleted": len(existing)
             }
         except Exception as e:
-            print(f"❌ Error deleting document: {e}")
+            logger.error("Error deleting document", extra={"document_id": document_id, "collection": collection_name, "error": str(e)})
             raise
 
 
@@ -0,0 +1,284 @@
+"""
+Lexical Service - In-process BM25 inverted index over document chunks
+Maintained at ingest time next to the vector store so exact-token queries
+(invoice numbers, SKUs, formula names) can be matched without embeddings
+
+Each collection is persisted as an append log of add/delete records and
+loaded lazily on first use; the log is rewritten once superseded records
+outnumber live ones.
+"""
+
+import asyncio
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from app.services.vector_store_service import VectorStore
+from app.services.logging_service import get_logger
+from app.services.storage_service import data_path
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() == "true"
+# Empty path keeps the index in memory only (relative paths are under the service root)
+LEXICAL_INDEX_PATH = data_path(os.getenv("LEXICAL_INDEX_PATH", "data/lexical_index"))
+LEXICAL_COMPACT_MIN_DEAD = int(os.getenv("LEXICAL_COMPACT_MIN_DEAD", "1000"))
+
+# BM25 parameters
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Words, optionally joined by - _ . / : # (e.g. "INV-2024-0042", "NPV_rate", "v1.2")
+_TOKEN_RE = re.compile(r"[^\W_]+(?:[-_./:#][^\W_]+)*")
+_JOINER_RE = re.compile(r"[-_./:#]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased tokens of a text
+
+    Compound tokens are kept whole, so an exact identifier matches exactly,
+    and their parts are added too, so "INV-2024-0042" also matches "2024".
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_JOINER_RE.split(token))
+    return tokens
+
+
+class BM25Index:
+    """Inverted index for one collection"""
+
+    def __init__(self, log_path: Optional[str] = None):
+        self.log_path = log_path
+        self.documents: Dict[str, Tuple[str, Dict]] = {}
+        self.terms: Dict[str, Counter] = {}
+        self.lengths: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+        self.dead_records = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    # ---------- in-memory state ----------
+
+    def _remove(self, doc_id: str) -> bool:
+        if doc_id not in self.documents:
+            return False
+        del self.documents[doc_id]
+        term_counts = self.terms.pop(doc_id)
+        self.total_length -= self.lengths.pop(doc_id)
+        for term in term_counts:
+            posting = self.postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self.postings[term]
+        self.dead_records += 1
+        return True
+
+    def _insert(self, doc_id: str, text: str, metadata: Dict) -> None:
+        self._remove(doc_id)
+        term_counts = Counter(tokenize(text))
+        self.documents[doc_id] = (text, metadata)
+        self.terms[doc_id] = term_counts
+        self.lengths[doc_id] = sum(term_counts.values())
+        self.total_length += self.lengths[doc_id]
+        for term, count in term_counts.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+
+    # ---------- persistence ----------
+
+    def load(self) -> None:
+        """Replay the append log"""
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Torn write at the tail from a crash
+                if record["op"] == "add":
+                    for doc_id, text, metadata in record["docs"]:
+                        self._insert(doc_id, text, metadata)
+                elif record["op"] == "delete":
+                    for doc_id in record["ids"]:
+                        self._remove(doc_id)
+
+    def _append_log(self, record: Dict) -> None:
+        if not self.log_path:
+            return
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def _maybe_compact(self) -> None:
+        """Rewrite the log with live documents only once most of it is dead"""
+        if not self.log_path:
+            return
+        if self.dead_records < LEXICAL_COMPACT_MIN_DEAD or self.dead_records <= len(self.documents):
+            return
+        tmp_path = self.log_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            docs = [[doc_id, text, metadata] for doc_id, (text, metadata) in self.documents.items()]
+            if docs:
+                f.write(json.dumps({"op": "add", "docs": docs}, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.log_path)
+        self.dead_records = 0
+
+    # ---------- operations ----------
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict]) -> None:
+        """Index documents (existing IDs are replaced)"""
+        metadatas = [dict(metadata or {}) for metadata in metadatas]
+        self._append_log({"op": "add", "docs": [list(row) for row in zip(ids, documents, metadatas)]})
+        for doc_id, text, metadata in zip(ids, documents, metadatas):
+            self._insert(doc_id, text, metadata)
+        self._maybe_compact()
+
+    def delete(self, ids: List[str]) -> None:
+        """Remove documents (unknown IDs are ignored)"""
+        ids = [doc_id for doc_id in ids if doc_id in self.documents]
+        if not ids:
+            return
+        self._append_log({"op": "delete", "ids": ids})
+        for doc_id in ids:
+            self._remove(doc_id)
+        self._maybe_compact()
+
+    def search(self, query: str, n_results: int) -> List[Tuple[str, float, str, Dict]]:
+        """
+        Top-n documents by BM25 score
+
+        Returns:
+            (id, score, text, metadata) tuples, best first
+        """
+        count = len(self.documents)
+        if not count or n_results <= 0:
+            return []
+        average_length = self.total_length / count or 1.0
+
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, frequency in posting.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        best = heapq.nlargest(n_results, scores.items(), key=itemgetter(1))
+        return [(doc_id, score, *self.documents[doc_id]) for doc_id, score in best]
+
+
+class LexicalIndexService:
+    """BM25 indexes for every collection, loaded lazily from their logs"""
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH, enabled: bool = LEXICAL_INDEX_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._indexes: Dict[str, BM25Index] = {}
+        self._lock = threading.Lock()
+
+    def _index(self, collection_name: str) -> BM25Index:
+        """Index of a collection (replaying its log on first use)"""
+        safe_name = VectorStore.safe_name(collection_name)
+        with self._lock:
+            index = self._indexes.get(safe_name)
+            if index is None:
+                log_path = None
+                if self.path:
+                    # Created on first use rather than at import
+                    os.makedirs(self.path, exist_ok=True)
+                    log_path = os.path.join(self.path, f"{safe_name}.jsonl")
+                index = BM25Index(log_path)
+                index.load()
+                self._indexes[safe_name] = index
+            return index
+
+    def _add(self, collection_name: str, ids: List[str], documents: List[str], metadatas: List[Dict]) -> None:
+        index = self._index(collection_name)
+        with index.lock:
+            index.add(ids, documents, metadatas)
+
+    def _delete(self, collection_name: str, ids: List[str]) -> None:
+        index = self._index(collection_name)
+        with index.lock:
+            index.delete(ids)
+
+    def _search(self, collection_name: str, query: str, n_results: int) -> List[Tuple[str, float, str, Dict]]:
+        index = self._index(collection_name)
+        with index.lock:
+            return index.search(query, n_results)
+
+    async def add(self, collection_name: str, ids: List[str], documents: List[str], metadatas: List[Dict]) -> None:
+        """
+        Index chunks written to the vector store
+
+        The lexical index is secondary to the vector store: a failure here is
+        logged and does not fail the ingestion.
+
+        Args:
+            collection_name: Name of the collection
+            ids: Chunk IDs (same as in the vector store)
+            documents: Chunk texts
+            metadatas: Chunk metadata dicts
+        """
+        if not self.enabled or not ids:
+            return
+        try:
+            await asyncio.to_thread(self._add, collection_name, ids, documents, metadatas)
+        except Exception as e:
+            logger.warning("Lexical indexing failed", extra={"collection": collection_name, "error": str(e)})
+
+    async def delete(self, collection_name: str, ids: List[str]) -> None:
+        """Remove chunks from the lexical index"""
+        if not self.enabled or not ids:
+            return
+        try:
+            await asyncio.to_thread(self._delete, collection_name, ids)
+        except Exception as e:
+            logger.warning("Lexical delete failed", extra={"collection": collection_name, "error": str(e)})
+
+    async def search(self, collection_name: str, query: str, n_results: int = 5) -> List[Tuple[str, float, str, Dict]]:
+        """
+        BM25 search over a collection
+
+        Args:
+            collection_name: Name of the collection
+            query: Query text
+            n_results: Number of results to return
+
+        Returns:
+            (chunk_id, bm25_score, text, metadata) tuples, best first
+        """
+        if not self.enabled:
+            return []
+        return await asyncio.to_thread(self._search, collection_name, query, n_results)
+
+    def stats(self) -> Dict:
+        """Size of every loaded index"""
+        return {
+            "enabled": self.enabled,
+            "persistent": bool(self.path),
+            "collections": {
+                name: {"documents": len(index), "terms": len(index.postings)}
+                for name, index in self._indexes.items()
+            },
+        }
+
+
+# Create singleton instance
+lexical_index = LexicalIndexService()
@@ -0,0 +1,647 @@
+"""
+Local Vector Service - Embedded, in-process vector index
+Alternative to the ChromaDB server for small and medium collections: no HTTP
+round trip, no JSON serialization of vectors, and no extra service to run
+
+Each collection is a directory holding:
+    vectors.<generation>.f32  Unit-normalized float32 rows, memory-mapped
+    texts.<generation>.bin    Chunk texts (UTF-8), appended and read on demand
+    log.jsonl                 Append log of create/add/update/delete records:
+                              ids, metadata and the (offset, length) of each
+                              text, never the texts themselves
+
+Startup replays the log and maps the vector file, so nothing is re-embedded
+and the texts stay on disk; memory holds ids, metadata and text offsets.
+Deleted and overwritten (upserted) rows are masked out and reclaimed by
+compaction once they outnumber the live rows.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import threading
+from typing import Any, List, Dict, Optional, Tuple, Union
+from dotenv import load_dotenv
+import numpy as np
+from app.services.vector_store_service import VectorStore
+from app.services.metrics_service import metrics
+from app.services.logging_service import get_logger
+from app.services.storage_service import data_path
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+LOCAL_VECTOR_STORE_PATH = data_path(os.getenv("LOCAL_VECTOR_STORE_PATH", "data/vector_store"))
+# Compact once deleted rows outnumber live ones (and at least this many)
+LOCAL_VECTOR_COMPACT_MIN_DEAD = int(os.getenv("LOCAL_VECTOR_COMPACT_MIN_DEAD", "1000"))
+
+LOG_FILE = "log.jsonl"
+
+# A row's text: (offset, length) in the texts file, or the text itself for
+# rows loaded from logs written before texts had their own file
+Text = Union[Tuple[int, int], str]
+
+
+def matches(metadata: Dict, where: Optional[Dict]) -> bool:
+    """Evaluate a ChromaDB-style equality/$in metadata filter"""
+    for key, condition in (where or {}).items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class LocalCollection:
+    """One collection: vector matrix plus row-aligned ids, text spans and metadata"""
+
+    def __init__(self, path: str, name: str):
+        self.path = path
+        self.name = name
+        self.metadata: Dict = {}
+        self.dim: Optional[int] = None
+        self.generation = 0
+        self.ids: List[Optional[str]] = []
+        self.texts: List[Text] = []
+        self.metadatas: List[Dict] = []
+        self.rows: Dict[str, int] = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.vectors: Optional[np.ndarray] = None
+        self._texts_handle = None
+        self.lock = threading.Lock()
+
+    @property
+    def vectors_file(self) -> str:
+        return os.path.join(self.path, f"vectors.{self.generation}.f32")
+
+    @property
+    def texts_file(self) -> str:
+        return os.path.join(self.path, f"texts.{self.generation}.bin")
+
+    @property
+    def log_file(self) -> str:
+        return os.path.join(self.path, LOG_FILE)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    # ---------- persistence ----------
+
+    def create(self, metadata: Optional[Dict]) -> None:
+        """Write the header record of a new collection"""
+        os.makedirs(self.path, exist_ok=True)
+        self.metadata = metadata or {}
+        self._append_log({"op": "create", "metadata": self.metadata, "generation": 0})
+
+    def load(self) -> None:
+        """Replay the log and map the vector file"""
+        rows = 0
+        with open(self.log_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Torn write at the tail from a crash
+                op = record["op"]
+                if op == "create":
+                    self.metadata = record.get("metadata", {})
+                    self.generation = record.get("generation", 0)
+                    self.dim = record.get("dim")
+                elif op == "add":
+                    self.dim = record["dim"]
+                    if "spans" in record:
+                        texts = [tuple(span) for span in record["spans"]]
+                    else:
+                        texts = record["documents"]  # Older logs carry the texts inline
+                    self._apply_add(record["ids"], texts, record["metadatas"])
+                    rows += len(record["ids"])
+                elif op == "update":
+                    self._apply_update(record["ids"], record["metadatas"])
+                elif op == "delete":
+                    self._apply_delete(record["ids"])
+
+        if self.dim and rows:
+            # Drop rows written after the last complete log record
+            size = rows * self.dim * 4
+            if os.path.getsize(self.vectors_file) > size:
+                with open(self.vectors_file, "r+b") as f:
+                    f.truncate(size)
+            self._remap()
+
+        # Same for texts appended by a write whose log record never landed
+        end = max((offset + length for offset, length in self._spans()), default=0)
+        if os.path.exists(self.texts_file) and os.path.getsize(self.texts_file) > end:
+            with open(self.texts_file, "r+b") as f:
+                f.truncate(end)
+
+    def _append_log(self, record: Dict) -> None:
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _spans(self) -> List[Tuple[int, int]]:
+        return [text for text in self.texts if isinstance(text, tuple)]
+
+    def _close_texts(self) -> None:
+        if self._texts_handle is not None:
+            self._texts_handle.close()
+            self._texts_handle = None
+
+    def close(self) -> None:
+        """Release the vector mapping and the texts file"""
+        self.vectors = None
+        self._close_texts()
+
+    def text(self, row: int) -> str:
+        """Text of a row, read from the texts file (lock held)"""
+        text = self.texts[row]
+        if isinstance(text, str):
+            return text
+        offset, length = text
+        if self._texts_handle is None:
+            self._texts_handle = open(self.texts_file, "rb")
+        self._texts_handle.seek(offset)
+        return self._texts_handle.read(length).decode("utf-8")
+
+    def _append_texts(self, path: str, texts: List[str]) -> List[Tuple[int, int]]:
+        """Append texts to a texts file and return their spans"""
+        spans = []
+        with open(path, "ab") as f:
+            offset = f.tell()
+            for text in texts:
+                data = text.encode("utf-8")
+                f.write(data)
+                spans.append((offset, len(data)))
+                offset += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return spans
+
+    def _remap(self) -> None:
+        rows = len(self.ids)
+        self.vectors = (
+            np.memmap(self.vectors_file, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            if rows else None
+        )
+
+    # ---------- in-memory state ----------
+
+    def _apply_add(self, ids: List[str], texts: List[Text], metadatas: List[Dict]) -> None:
+        start = len(self.ids)
+        replaced = []
+        for offset, doc_id in enumerate(ids):
+            previous = self.rows.get(doc_id)
+            if previous is not None:
+                self.ids[previous] = None  # Upsert: the old row is dead
+                replaced.append(previous)
+            self.rows[doc_id] = start + offset
+        self.ids.extend(ids)
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas)
+        alive = np.ones(len(self.ids), dtype=bool)
+        alive[:start] = self.alive
+        alive[replaced] = False
+        self.alive = alive
+
+    def _apply_update(self, ids: List[str], metadatas: List[Dict]) -> None:
+        for doc_id, metadata in zip(ids, metadatas):
+            row = self.rows.get(doc_id)
+            if row is not None:
+                self.metadatas[row] = metadata
+
+    def _apply_delete(self, ids: List[str]) -> None:
+        for doc_id in ids:
+            row = self.rows.pop(doc_id, None)
+            if row is not None:
+                self.ids[row] = None
+                self.alive[row] = False
+
+    # ---------- operations ----------
+
+    def write(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict],
+        embeddings: List[List[float]],
+        overwrite: bool
+    ) -> None:
+        """Append rows; existing IDs are replaced (overwrite) or skipped"""
+        if not overwrite:
+            keep = [i for i, doc_id in enumerate(ids) if doc_id not in self.rows]
+            ids = [ids[i] for i in keep]
+            documents = [documents[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            embeddings = [embeddings[i] for i in keep]
+        if not ids:
+            return
+
+        # Later duplicates within one call win, like a sequence of upserts
+        latest = {doc_id: i for i, doc_id in enumerate(ids)}
+        if len(latest) < len(ids):
+            order = sorted(latest.values())
+            ids = [ids[i] for i in order]
+            documents = [documents[i] for i in order]
+            metadatas = [metadatas[i] for i in order]
+            embeddings = [embeddings[i] for i in order]
+
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            raise Exception("Embeddings must be a list of equal-length vectors")
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        elif matrix.shape[1] != self.dim:
+            raise Exception(f"Embedding dimension {matrix.shape[1]} does not match collection dimension {self.dim}")
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        metadatas = [dict(metadata or {}) for metadata in metadatas]
+
+        # Texts and vectors first, then the log record that makes them
+        # visible; rows left behind by an earlier failed write are overwritten
+        spans = self._append_texts(self.texts_file, documents)
+        with open(self.vectors_file, "ab") as f:
+            f.truncate(len(self.ids) * self.dim * 4)
+            f.write(matrix.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._append_log({
+            "op": "add",
+            "dim": self.dim,
+            "ids": ids,
+            "spans": spans,
+            "metadatas": metadatas,
+        })
+        self._apply_add(ids, spans, metadatas)
+        self._remap()
+        # Overwritten rows are dead too
+        self._maybe_compact()
+
+    def find(self, where: Dict) -> Dict:
+        """IDs and metadata of live rows matching a metadata filter"""
+        ids, metadatas = [], []
+        for doc_id, row in self.rows.items():
+            if matches(self.metadatas[row], where):
+                ids.append(doc_id)
+                metadatas.append(self.metadatas[row])
+        return {"ids": ids, "metadatas": metadatas}
+
+    def update(self, ids: List[str], metadatas: List[Dict]) -> None:
+        """Replace metadata of existing rows (unknown IDs are ignored)"""
+        pairs = [(doc_id, dict(metadata or {})) for doc_id, metadata in zip(ids, metadatas) if doc_id in self.rows]
+        if not pairs:
+            return
+        ids, metadatas = [doc_id for doc_id, _ in pairs], [metadata for _, metadata in pairs]
+        self._append_log({"op": "update", "ids": ids, "metadatas": metadatas})
+        self._apply_update(ids, metadatas)
+
+    def delete(self, ids: List[str]) -> None:
+        """Mask rows out, compacting when enough of the file is dead"""
+        ids = [doc_id for doc_id in ids if doc_id in self.rows]
+        if not ids:
+            return
+        self._append_log({"op": "delete", "ids": ids})
+        self._apply_delete(ids)
+        self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        """Compact once dead (deleted or overwritten) rows outnumber live ones"""
+        dead = len(self.ids) - len(self.rows)
+        if dead >= LOCAL_VECTOR_COMPACT_MIN_DEAD and dead > len(self.rows):
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Rewrite live rows into a new generation
+
+        The new vector and texts files are complete before the log that
+        points to them replaces the old log, so a crash leaves either
+        generation intact.
+        """
+        live = np.flatnonzero(self.alive)
+        old_vectors_file, old_texts_file = self.vectors_file, self.texts_file
+        generation = self.generation + 1
+        new_vectors_file = os.path.join(self.path, f"vectors.{generation}.f32")
+        new_texts_file = os.path.join(self.path, f"texts.{generation}.bin")
+
+        with open(new_vectors_file, "wb") as f:
+            if len(live):
+                f.write(np.ascontiguousarray(self.vectors[live]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        ids = [self.ids[row] for row in live]
+        if os.path.exists(new_texts_file):
+            os.remove(new_texts_file)  # Left by a compaction that crashed
+        spans = self._append_texts(new_texts_file, [self.text(row) for row in live])
+        metadatas = [self.metadatas[row] for row in live]
+        tmp_log = self.log_file + ".tmp"
+        with open(tmp_log, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"op": "create", "metadata": self.metadata, "generation": generation, "dim": self.dim}) + "\n")
+            if ids:
+                f.write(json.dumps({"op": "add", "dim": self.dim, "ids": ids, "spans": spans, "metadatas": metadatas}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_log, self.log_file)
+
+        self.close()  # Release the old mapping and texts before removing their files
+        for old_file in (old_vectors_file, old_texts_file):
+            if os.path.exists(old_file):
+                os.remove(old_file)
+
+        self.generation = generation
+        self.ids, self.texts, self.metadatas = [], [], []
+        self.rows = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self._apply_add(ids, spans, metadatas)
+        self._remap()
+
+    def query(self, query_embeddings: List[List[float]], n_results: int) -> Dict:
+        """Cosine top-k for each query embedding"""
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        k = min(n_results, len(self.rows))
+        if k <= 0 or self.vectors is None:
+            for key in results:
+                results[key] = [[] for _ in query_embeddings]
+            return results
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.shape[1] != self.dim:
+            raise Exception(f"Query dimension {queries.shape[1]} does not match collection dimension {self.dim}")
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries /= np.where(norms == 0, 1, norms)
+
+        # One matrix product scores every row against every query
+        scores = queries @ self.vectors.T
+        scores[:, ~self.alive] = -np.inf
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for query_scores, candidates in zip(scores, top):
+            ranked = candidates[np.argsort(-query_scores[candidates])]
+            results["ids"].append([self.ids[row] for row in ranked])
+            results["documents"].append([self.text(row) for row in ranked])
+            results["metadatas"].append([self.metadatas[row] for row in ranked])
+            results["distances"].append([float(1 - query_scores[row]) for row in ranked])
+        return results
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store backed by memory-mapped NumPy matrices"""
+
+    def __init__(self, path: str = LOCAL_VECTOR_STORE_PATH):
+        self.path = path
+        self.collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+        # Open existing collections (log replay only; vectors stay on disk)
+        for name in sorted(os.listdir(self.path)):
+            collection_path = os.path.join(self.path, name)
+            if os.path.isfile(os.path.join(collection_path, LOG_FILE)):
+                collection = LocalCollection(collection_path, name)
+                collection.load()
+                self.collections[name] = collection
+        logger.info("Local vector store ready", extra={"path": self.path, "collections": len(self.collections)})
+
+    def _get_collection(self, collection_name: str) -> LocalCollection:
+        safe_name = self.safe_name(collection_name)
+        collection = self.collections.get(safe_name)
+        if collection is None:
+            raise Exception(f"Collection {safe_name} does not exist.")
+        return collection
+
+    def _get_or_create_collection(self, collection_name: str, metadata: Optional[Dict] = None) -> str:
+        safe_name = self.safe_name(collection_name)
+        with self._lock:
+            if safe_name not in self.collections:
+                collection = LocalCollection(os.path.join(self.path, safe_name), safe_name)
+                collection.create(metadata)
+                self.collections[safe_name] = collection
+        return safe_name
+
+    def _write(self, collection_name, documents, metadatas, ids, embeddings, overwrite: bool) -> None:
+        collection = self._get_collection(collection_name)
+        with collection.lock:
+            collection.write(ids, documents, metadatas, embeddings, overwrite)
+
+    def _query(self, collection_name: str, query_embeddings: List[List[float]], n_results: int) -> Dict:
+        collection = self._get_collection(collection_name)
+        with collection.lock:
+            return collection.query(query_embeddings, n_results)
+
+    def _get_documents(self, collection_name: str, where: Dict) -> Dict:
+        collection = self._get_collection(collection_name)
+        with collection.lock:
+            return collection.find(where)
+
+    def _update_metadatas(self, collection_name: str, ids: List[str], metadatas: List[Dict]) -> None:
+        collection = self._get_collection(collection_name)
+        with collection.lock:
+            collection.update(ids, metadatas)
+
+    def _delete_documents(self, collection_name: str, ids: Optional[List[str]], where: Optional[Dict]) -> None:
+        collection = self._get_collection(collection_name)
+        with collection.lock:
+            if where is not None:
+                matched = collection.find(where)["ids"]
+                if ids is not None:
+                    wanted = set(ids)
+                    matched = [doc_id for doc_id in matched if doc_id in wanted]
+                ids = matched
+            collection.delete(ids or [])
+
+    def _delete_collection(self, collection_name: str) -> str:
+        safe_name = self.safe_name(collection_name)
+        with self._lock:
+            collection = self.collections.pop(safe_name, None)
+        if collection is None:
+            raise Exception(f"Collection {safe_name} does not exist.")
+        with collection.lock:
+            collection.close()
+            shutil.rmtree(collection.path, ignore_errors=True)
+        return safe_name
+
+    def close(self) -> None:
+        """Release every collection's vector mapping and texts file (called on shutdown)"""
+        for collection in list(self.collections.values()):
+            with collection.lock:
+                collection.close()
+
+    async def check_health(self) -> bool:
+        """
+        Check that the store directory is usable
+
+        Returns:
+            True if healthy, False otherwise
+        """
+        return os.path.isdir(self.path) and os.access(self.path, os.W_OK)
+
+    async def get_or_create_collection(self, collection_name: str, metadata: Optional[Dict] = None) -> str:
+        """
+        Get or create a local collection
+
+        Args:
+            collection_name: Name of the collection
+            metadata: Optional metadata for the collection
+
+        Returns:
+            Collection ID
+        """
+        try:
+            safe_name = await asyncio.to_thread(self._get_or_create_collection, collection_name, metadata)
+            logger.debug("Collection ready", extra={"collection": safe_name})
+            return safe_name
+        except Exception as e:
+            logger.error("Error creating/getting collection", extra={"collection": collection_name, "error": str(e)})
+            raise
+
+    async def add_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        ids: List[str],
+        embeddings: List[List[float]]
+    ) -> None:
+        """
+        Add documents (with pre-computed embeddings) to a collection
+
+        Args:
+            collection_name: Name of the collection
+            documents: List of document texts
+            metadatas: List of metadata dicts
+            ids: List of document IDs (existing IDs are skipped)
+            embeddings: List of pre-computed embeddings
+        """
+        try:
+            with metrics.stage("vector_add", collection=self.safe_name(collection_name)):
+                await asyncio.to_thread(self._write, collection_name, documents, metadatas, ids, embeddings, False)
+            logger.debug("Added documents", extra={"collection": collection_name, "count": len(documents)})
+        except Exception as e:
+            logger.error("Error adding documents", extra={"collection": collection_name, "error": str(e)})
+            raise
+
+    async def upsert_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        ids: List[str],
+        embeddings: List[List[float]]
+    ) -> None:
+        """
+        Insert documents, or overwrite those whose IDs already exist
+
+        Args:
+            collection_name: Name of the collection
+            documents: List of document texts
+            metadatas: List of metadata dicts
+            ids: List of document IDs
+            embeddings: List of pre-computed embeddings
+        """
+        try:
+            with metrics.stage("vector_add", collection=self.safe_name(collection_name)):
+                await asyncio.to_thread(self._write, collection_name, documents, metadatas, ids, embeddings, True)
+            logger.debug("Upserted documents", extra={"collection": collection_name, "count": len(documents)})
+        except Exception as e:
+            logger.error("Error upserting documents", extra={"collection": collection_name, "error": str(e)})
+            raise
+
+    async def query(
+        self,
+        collection_name: str,
+        query_texts: List[str],
+        query_embeddings: Optional[List[List[float]]] = None,
+        n_results: int = 5
+    ) -> Dict:
+        """
+        Query a collection by cosine similarity
+
+        Args:
+            collection_name: Name of the collection
+            query_texts: Query texts (unused: the local index cannot embed)
+            query_embeddings: Pre-computed query embeddings (required)
+            n_results: Number of results to return
+
+        Returns:
+            Query results with cosine distances and metadata
+        """
+        try:
+            if not query_embeddings:
+                raise Exception("The local vector store needs query_embeddings")
+            with metrics.stage("vector_query", collection=self.safe_name(collection_name)):
+                return await asyncio.to_thread(self._query, collection_name, query_embeddings, n_results)
+        except Exception as e:
+            logger.error("Error querying collection", extra={"collection": collection_name, "error": str(e)})
+            raise
+
+    async def get_collection(self, collection_name: str) -> Any:
+        """Get a collection by name"""
+        return self._get_collection(collection_name)
+
+    async def delete_collection(self, collection_name: str) -> None:
+        """Delete a collection and its files"""
+        try:
+            safe_name = await asyncio.to_thread(self._delete_collection, collection_name)
+            logger.info("Deleted collection", extra={"collection": safe_name})
+        except Exception as e:
+            logger.error("Error deleting collection", extra={"collection": collection_name, "error": str(e)})
+            raise
+
+    async def list_collections(self) -> List[str]:
+        """List all available collections"""
+        return list(self.collections)
+
+    async def has_collection(self, collection_name: str) -> bool:
+        """True if the collection exists"""
+        return self.safe_name(collection_name) in self.collections
+
+    async def get_collection_stats(self, collection_name: str) -> Dict:
+        """Get statistics about a collection"""
+        try:
+            collection = self._get_collection(collection_name)
+            return {
+                "name": collection_name,
+                "document_count": len(collection)
+            }
+        except Exception as e:
+            logger.error("Error getting collection stats", extra={"collection": collection_name, "error": str(e)})
+            raise
+
+    async def get_documents(self, collection_name: str, where: Dict) -> Dict:
+        """IDs and metadata of documents matching a metadata filter"""
+        try:
+            return await asyncio.to_thread(self._get_documents, collection_name, where)
+        except Exception as e:
+            logger.error("Error getting documents", extra={"collection": collection_name, "error": str(e)})
+            raise
+
+    async def update_metadatas(self, collection_name: str, ids: List[str], metadatas: List[Dict]) -> None:
+        """Replace the metadata of existing documents (embeddings are kept)"""
+        try:
+            await asyncio.to_thread(self._update_metadatas, collection_name, ids, metadatas)
+            logger.debug("Updated document metadata", extra={"collection": collection_name, "count": len(ids)})
+        except Exception as e:
+            logger.error("Error updating documents", extra={"collection": collection_name, "error": str(e)})
+            raise
+
+    async def delete_documents(
+        self,
+        collection_name: str,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict] = None
+    ) -> None:
+        """Delete documents from a collection by ID and/or metadata filter"""
+        try:
+            await asyncio.to_thread(self._delete_documents, collection_name, ids, where)
+            logger.debug("Deleted documents", extra={"collection": collection_name, "count": len(ids) if ids is not None else None, "where": where})
+        except Exception as e:
+            logger.error("Error deleting documents", extra={"collection": collection_name, "error": str(e)})
+            raise
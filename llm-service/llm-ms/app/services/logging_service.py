@@ -0,0 +1,161 @@
+"""
+Logging Service - Non-blocking structured (JSON lines) logging
+Replaces print() in the services: records are put on a bounded queue by the
+caller and formatted and written to stdout by a background thread, so a slow
+or blocked stdout never stalls the event loop
+
+Each line is one JSON object with the timestamp, level, logger, message,
+the request id and route of the request being handled, and any fields passed
+through `extra`:
+
+    logger.info("Retrieved context", extra={"chunks": 5, "mode": "hybrid"})
+
+LOG_LEVEL filters records before they are built. High-volume DEBUG events
+are sampled (LOG_DEBUG_SAMPLE_RATE, or a per-call "sample_rate" extra); kept
+records carry their sample_rate so counts can be scaled back up.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import traceback
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict
+from dotenv import load_dotenv
+from app.services.metrics_service import current_route
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").upper()
+# Fraction of DEBUG records kept (per-call override: extra={"sample_rate": ...})
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+# Records waiting for the writer thread; beyond this they are dropped (and counted)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Id of the request being handled ("-" outside a request)
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class _ContextFilter(logging.Filter):
+    """Samples DEBUG records and stamps request context (runs in the caller's task)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG:
+            rate = getattr(record, "sample_rate", LOG_DEBUG_SAMPLE_RATE)
+            if rate < 1.0:
+                if random.random() >= rate:
+                    return False
+                record.sample_rate = rate
+        record.request_id = request_id.get()
+        record.route = current_route.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks and leaves formatting to the writer thread"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now: args and frames may change
+        # (or be freed) before the writer thread gets to the record
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    """Queue listener whose stop() waits for room instead of failing on a full queue"""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+class LoggingService:
+    """Owns the log queue and the background writer thread"""
+
+    def __init__(self, level: str = LOG_LEVEL):
+        self.queue: queue.Queue = queue.Queue(maxsize=max(LOG_QUEUE_SIZE, 1))
+        self.handler = _QueueHandler(self.queue)
+        self.handler.addFilter(_ContextFilter())
+
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JSONFormatter())
+        self.listener = _QueueListener(self.queue, output)
+
+        # Everything under the "app" package logs through the queue
+        self.root = logging.getLogger("app")
+        self.root.setLevel(getattr(logging, level, logging.INFO))
+        self.root.addHandler(self.handler)
+        self.root.propagate = False
+
+        self.running = False
+        self.start()
+        atexit.register(self.stop)
+
+    def start(self) -> None:
+        """Start the writer thread (no-op when it is running)"""
+        if not self.running:
+            self.listener.start()
+            self.running = True
+
+    def stop(self) -> None:
+        """Flush queued records and stop the writer thread"""
+        if self.running:
+            self.listener.stop()
+            self.running = False
+
+    def stats(self) -> Dict:
+        """Queue depth and records dropped because the queue was full"""
+        return {
+            "level": logging.getLevelName(self.root.level).lower(),
+            "queued": self.queue.qsize(),
+            "dropped": self.handler.dropped,
+        }
+
+
+# Create singleton instance
+log_service = LoggingService()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for a module (pass __name__); records go through the JSON queue"""
+    return logging.getLogger(name)
@@ -0,0 +1,295 @@
+"""
+Metrics Service - Prometheus instrumentation for the request pipeline
+Records per-stage latency histograms (embedding, vector store, prompt build,
+LLM generation) labeled by route, collection and model, plus in-flight
+gauges and error counters; exposed in text format at /metrics
+
+The route label is the matched route template (e.g. "/api/rag/query"), set
+once per request by the HTTP middleware; the pipeline entry points set the
+collection the same way. Stages read both from context variables, so
+embedding and generation calls are labeled without passing them around.
+
+Collection names come from callers, so the collection label is bounded: the
+first METRICS_MAX_COLLECTIONS names seen keep their own series, later ones
+share "other".
+"""
+
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Set, Tuple
+from dotenv import load_dotenv
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from app.services.vector_store_service import VectorStore
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MAX_COLLECTIONS = int(os.getenv("METRICS_MAX_COLLECTIONS", "100"))
+OTHER_COLLECTION = "other"
+
+# Latency buckets (seconds): sub-millisecond cache hits up to long generations
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Route template of the request being handled ("none" outside a request)
+current_route: ContextVar[str] = ContextVar("metrics_route", default="none")
+# Collection the current pipeline works on ("" when not known)
+current_collection: ContextVar[str] = ContextVar("metrics_collection", default="")
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "llm_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "llm_http_requests_in_flight",
+    "HTTP requests being handled",
+    ["route"]
+)
+STAGE_SECONDS = Histogram(
+    "llm_stage_duration_seconds",
+    "Latency of one pipeline stage (embedding, vector_query, vector_add, prompt_build, llm_generate)",
+    ["stage", "route", "collection", "model"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_IN_FLIGHT = Gauge(
+    "llm_stage_in_flight",
+    "Pipeline stage calls in progress",
+    ["stage"]
+)
+STAGE_ERRORS = Counter(
+    "llm_stage_errors_total",
+    "Pipeline stage calls that raised",
+    ["stage", "route", "collection", "model"]
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "llm_embedding_batch_size",
+    "Texts per embedding request sent to Ollama",
+    ["route", "model"],
+    buckets=BATCH_SIZE_BUCKETS
+)
+GENERATION_QUEUE_DEPTH = Gauge(
+    "llm_generation_queue_depth",
+    "Generation requests waiting for a slot",
+    ["lane"]
+)
+GENERATION_QUEUE_WAIT_SECONDS = Histogram(
+    "llm_generation_queue_wait_seconds",
+    "Time generation requests waited for a slot",
+    ["lane"],
+    buckets=LATENCY_BUCKETS
+)
+GENERATION_REJECTED = Counter(
+    "llm_generation_rejected_total",
+    "Generation requests rejected by admission control",
+    ["lane", "reason"]
+)
+BACKEND_OUTSTANDING = Gauge(
+    "llm_backend_outstanding_requests",
+    "Requests in flight per Ollama backend",
+    ["pool", "backend"]
+)
+BACKEND_EJECTIONS = Counter(
+    "llm_backend_ejections_total",
+    "Times an Ollama backend was ejected after consecutive failures",
+    ["pool", "backend"]
+)
+CIRCUIT_STATE = Gauge(
+    "llm_circuit_state",
+    "Circuit breaker state per dependency (0 closed, 1 half-open, 2 open)",
+    ["dependency"]
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "llm_circuit_transitions_total",
+    "Circuit breaker state changes",
+    ["dependency", "state"]
+)
+CIRCUIT_REJECTED = Counter(
+    "llm_circuit_rejected_total",
+    "Calls refused because the dependency's breaker was open",
+    ["dependency"]
+)
+DEADLINE_EXCEEDED = Counter(
+    "llm_deadline_exceeded_total",
+    "Upstream calls cut short or skipped because the request budget ran out",
+    ["dependency"]
+)
+HEDGED_REQUESTS = Counter(
+    "llm_hedged_requests_total",
+    "Hedged duplicate requests sent, and whether the duplicate won",
+    ["dependency", "outcome"]
+)
+
+
+# Labeled children by label tuple: .labels() validates and locks on every
+# call, a dict lookup does not
+_stage_children: Dict[Tuple[str, str, str, str], Tuple] = {}
+
+
+def _children(labels: Tuple[str, str, str, str]) -> Tuple:
+    children = _stage_children.get(labels)
+    if children is None:
+        children = _stage_children[labels] = (
+            STAGE_SECONDS.labels(*labels),
+            STAGE_IN_FLIGHT.labels(labels[0]),
+        )
+    return children
+
+
+class _Stage:
+    """Context manager timing one stage call (a plain class: cheaper than @contextmanager)"""
+
+    __slots__ = ("labels", "histogram", "in_flight", "start")
+
+    def __init__(self, labels: Tuple[str, str, str, str]):
+        self.labels = labels
+        self.histogram, self.in_flight = _children(labels)
+
+    def __enter__(self):
+        self.in_flight.inc()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start)
+        self.in_flight.dec()
+        # Cancellation and generator shutdown are not failures of the stage
+        if exc_type is not None and issubclass(exc_type, Exception):
+            STAGE_ERRORS.labels(*self.labels).inc()
+        return False
+
+
+class _NoStage:
+    """Stand-in when metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+class MetricsService:
+    """Records stage timings into the Prometheus registry"""
+
+    def __init__(self, enabled: bool = METRICS_ENABLED, max_collections: int = METRICS_MAX_COLLECTIONS):
+        self.enabled = enabled
+        self.max_collections = max_collections
+        # Collection names that have their own label value
+        self.collections: Set[str] = set()
+
+    def collection_label(self, collection: str) -> str:
+        """Label value for a collection: its name, or "other" once the cap is reached"""
+        if not collection or collection in self.collections:
+            return collection
+        if len(self.collections) >= self.max_collections:
+            return OTHER_COLLECTION
+        self.collections.add(collection)
+        return collection
+
+    def stage(self, stage: str, collection: Optional[str] = None, model: Optional[str] = None):
+        """
+        Time a pipeline stage
+
+        Usage:
+            with metrics.stage("vector_query", collection=name):
+                ...
+
+        Args:
+            stage: Stage name
+            collection: Collection the stage works on (default: set_collection)
+            model: Model the stage calls, if any
+        """
+        if not self.enabled:
+            return _NO_STAGE
+        if collection:
+            collection = self.collection_label(collection)
+        else:
+            collection = current_collection.get()
+        return _Stage((stage, current_route.get(), collection, model or ""))
+
+    def set_collection(self, collection_name: str) -> None:
+        """Label the stages of the current request/task with this collection"""
+        current_collection.set(self.collection_label(VectorStore.safe_name(collection_name)))
+
+    def observe_embedding_batch(self, size: int, model: str) -> None:
+        """Record the number of texts sent in one embedding request"""
+        if self.enabled:
+            EMBEDDING_BATCH_SIZE.labels(current_route.get(), model).observe(size)
+
+    def set_generation_queue_depth(self, lane: str, depth: int) -> None:
+        """Record the number of requests waiting in a scheduler lane"""
+        if self.enabled:
+            GENERATION_QUEUE_DEPTH.labels(lane).set(depth)
+
+    def observe_generation_wait(self, lane: str, seconds: float) -> None:
+        """Record how long an admitted generation waited for its slot"""
+        if self.enabled:
+            GENERATION_QUEUE_WAIT_SECONDS.labels(lane).observe(seconds)
+
+    def count_generation_rejected(self, lane: str, reason: str) -> None:
+        """Count a generation request rejected by admission control"""
+        if self.enabled:
+            GENERATION_REJECTED.labels(lane, reason).inc()
+
+    def set_backend_outstanding(self, pool: str, backend: str, outstanding: int) -> None:
+        """Record the requests in flight on one Ollama backend"""
+        if self.enabled:
+            BACKEND_OUTSTANDING.labels(pool, backend).set(outstanding)
+
+    def count_backend_ejection(self, pool: str, backend: str) -> None:
+        """Count an Ollama backend ejection"""
+        if self.enabled:
+            BACKEND_EJECTIONS.labels(pool, backend).inc()
+
+    def set_circuit_state(self, dependency: str, state: int) -> None:
+        """Record a breaker's state (0 closed, 1 half-open, 2 open)"""
+        if self.enabled:
+            CIRCUIT_STATE.labels(dependency).set(state)
+
+    def count_circuit_transition(self, dependency: str, state: str) -> None:
+        """Count a breaker state change"""
+        if self.enabled:
+            CIRCUIT_TRANSITIONS.labels(dependency, state).inc()
+
+    def count_circuit_rejected(self, dependency: str) -> None:
+        """Count a call refused by an open breaker"""
+        if self.enabled:
+            CIRCUIT_REJECTED.labels(dependency).inc()
+
+    def count_deadline_exceeded(self, dependency: str) -> None:
+        """Count an upstream call stopped by the request budget"""
+        if self.enabled:
+            DEADLINE_EXCEEDED.labels(dependency).inc()
+
+    def count_hedge(self, dependency: str, outcome: str) -> None:
+        """Count a hedged request ("sent", then "won" or "lost")"""
+        if self.enabled:
+            HEDGED_REQUESTS.labels(dependency, outcome).inc()
+
+    def request_started(self, route: str) -> None:
+        """Mark an HTTP request as in flight"""
+        if self.enabled:
+            HTTP_REQUESTS_IN_FLIGHT.labels(route).inc()
+
+    def request_finished(self, method: str, route: str, status: int, seconds: float) -> None:
+        """Record a finished HTTP request"""
+        if self.enabled:
+            HTTP_REQUESTS_IN_FLIGHT.labels(route).dec()
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status)).observe(seconds)
+
+    @staticmethod
+    def render() -> Tuple[bytes, str]:
+        """Current metrics in Prometheus text format, and its content type"""
+        return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# Create singleton instance
+metrics = MetricsService()
@@ -0,0 +1,238 @@
+"""
+Ollama Pool Service - Load balancing over several Ollama backends
+Generation and embedding each get their own pool of backend URLs, so the
+two workloads can run on different machines and never queue behind each
+other's in-flight counts
+
+Routing is least-outstanding-requests: every call goes to the backend with
+the fewest requests in flight that has the requested model (ties rotate).
+Backends whose model list is not known yet take any model.
+
+Failures eject passively: after POOL_EJECT_AFTER consecutive connection
+errors or timeouts a backend gets no traffic for POOL_EJECT_SECONDS (doubled
+on every repeat ejection, up to POOL_EJECT_MAX_SECONDS). A successful
+request or model-list refresh puts it back. When every backend is ejected
+the pool still routes to them rather than failing outright.
+"""
+
+import aiohttp
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+from dotenv import load_dotenv
+from app.services.http_service import http_service
+from app.services.metrics_service import metrics
+from app.services.logging_service import get_logger
+from app.services.upstream_service import upstream
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+
+def _urls(value: str) -> List[str]:
+    """Parse a comma-separated URL list"""
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+# OLLAMA_BASE_URLS lists every backend; OLLAMA_BASE_URL (one URL) still works
+OLLAMA_BASE_URLS = os.getenv("OLLAMA_BASE_URLS") or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# Per-workload overrides (default: OLLAMA_BASE_URLS)
+OLLAMA_GENERATION_URLS = os.getenv("OLLAMA_GENERATION_URLS") or OLLAMA_BASE_URLS
+OLLAMA_EMBEDDING_URLS = os.getenv("OLLAMA_EMBEDDING_URLS") or OLLAMA_BASE_URLS
+
+# Consecutive failures before a backend is ejected
+POOL_EJECT_AFTER = int(os.getenv("POOL_EJECT_AFTER", "3"))
+POOL_EJECT_SECONDS = float(os.getenv("POOL_EJECT_SECONDS", "30"))
+POOL_EJECT_MAX_SECONDS = float(os.getenv("POOL_EJECT_MAX_SECONDS", "300"))
+
+
+def model_key(name: str) -> str:
+    """Normalize a model name the way Ollama resolves it ("llama3.2" -> "llama3.2:latest")"""
+    return name if ":" in name else f"{name}:latest"
+
+
+class OllamaBackend:
+    """One Ollama instance and its routing state"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        # Installed models (None until the first refresh: serves anything)
+        self.models: Optional[Set[str]] = None
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def serves(self, model: Optional[str]) -> bool:
+        return model is None or self.models is None or model_key(model) in self.models
+
+    def ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+
+class OllamaPool:
+    """Least-outstanding-requests balancer with passive ejection"""
+
+    def __init__(self, name: str, urls: List[str]):
+        self.name = name
+        self.backends: List[OllamaBackend] = []
+        self._turn = 0
+        self.set_urls(urls)
+
+    def set_urls(self, urls: List[str]) -> None:
+        """Replace the backend list (state of URLs already in the pool is kept)"""
+        if not urls:
+            raise ValueError(f"Ollama {self.name} pool needs at least one URL")
+        current = {backend.url: backend for backend in self.backends}
+        self.backends = [current.get(url) or OllamaBackend(url) for url in (u.rstrip("/") for u in urls)]
+
+    @property
+    def urls(self) -> List[str]:
+        return [backend.url for backend in self.backends]
+
+    def available(self) -> int:
+        """Backends currently taking traffic"""
+        now = time.monotonic()
+        return sum(1 for backend in self.backends if not backend.ejected(now))
+
+    def has_model(self, model: str) -> bool:
+        """True if a backend is known to have the model installed"""
+        key = model_key(model)
+        return any(backend.models is not None and key in backend.models for backend in self.backends)
+
+    def pick(self, model: Optional[str] = None) -> OllamaBackend:
+        """
+        Choose the backend for one request
+
+        Args:
+            model: Model the request needs (None: any backend)
+
+        Raises:
+            Exception: No backend has the model
+        """
+        candidates = [backend for backend in self.backends if backend.serves(model)]
+        if not candidates:
+            raise Exception(f"No Ollama {self.name} backend has model '{model}'")
+
+        now = time.monotonic()
+        # All ejected: try them anyway, a request may still get through
+        live = [backend for backend in candidates if not backend.ejected(now)] or candidates
+
+        # Rotate the starting point so ties spread; backends that just failed go last
+        self._turn += 1
+        count = len(live)
+        return min(
+            (live[(self._turn + i) % count] for i in range(count)),
+            key=lambda backend: (backend.failures > 0, backend.outstanding)
+        )
+
+    def _succeeded(self, backend: OllamaBackend) -> None:
+        if backend.ejected_until:
+            logger.info("Ollama backend recovered", extra={"pool": self.name, "backend": backend.url})
+        backend.failures = 0
+        backend.ejections = 0
+        backend.ejected_until = 0.0
+
+    def _failed(self, backend: OllamaBackend, error: BaseException) -> None:
+        backend.errors += 1
+        backend.failures += 1
+        if backend.failures >= POOL_EJECT_AFTER:
+            backend.ejections += 1
+            seconds = min(POOL_EJECT_SECONDS * 2 ** (backend.ejections - 1), POOL_EJECT_MAX_SECONDS)
+            backend.ejected_until = time.monotonic() + seconds
+            backend.failures = 0
+            metrics.count_backend_ejection(self.name, backend.url)
+            logger.warning("Ollama backend ejected", extra={
+                "pool": self.name, "backend": backend.url, "seconds": seconds,
+                "error": str(error) or type(error).__name__,
+            })
+
+    @asynccontextmanager
+    async def backend(self, model: Optional[str] = None) -> AsyncIterator[OllamaBackend]:
+        """
+        Route one request; the backend counts as busy for the whole block
+
+        Connection errors and timeouts raised inside the block count towards
+        ejection (except timeouts caused by the request's deadline running
+        out); a block that completes resets the backend's failure count.
+
+        Usage:
+            async with generation_pool.backend(model) as backend:
+                async with http_service.session.post(f"{backend.url}/api/chat", ...) as response:
+                    ...
+        """
+        backend = self.pick(model)
+        backend.outstanding += 1
+        backend.requests += 1
+        metrics.set_backend_outstanding(self.name, backend.url, backend.outstanding)
+        try:
+            yield backend
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if not (isinstance(e, asyncio.TimeoutError) and upstream.expired()):
+                self._failed(backend, e)
+            raise
+        else:
+            self._succeeded(backend)
+        finally:
+            backend.outstanding -= 1
+            metrics.set_backend_outstanding(self.name, backend.url, backend.outstanding)
+
+    async def _refresh_backend(self, backend: OllamaBackend) -> bool:
+        try:
+            async with http_service.session.get(
+                f"{backend.url}/api/tags",
+                timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                if response.status != 200:
+                    return False
+                data = await response.json()
+        except Exception as e:
+            logger.warning("Ollama backend refresh failed", extra={
+                "pool": self.name, "backend": backend.url, "error": str(e) or type(e).__name__,
+            })
+            return False
+        backend.models = {model_key(m.get("name", "")) for m in data.get("models", [])}
+        self._succeeded(backend)
+        return True
+
+    async def refresh(self) -> bool:
+        """
+        Re-read every backend's model list (GET /api/tags)
+
+        Called by the health prober. A backend that answers is readmitted;
+        one that does not keeps its last known model list.
+
+        Returns:
+            True if at least one backend answered
+        """
+        results = await asyncio.gather(*(self._refresh_backend(backend) for backend in self.backends))
+        return any(results)
+
+    def stats(self) -> Dict:
+        """Per-backend in-flight count, models, request/error counts and ejection state"""
+        now = time.monotonic()
+        return {
+            "available": self.available(),
+            "backends": [
+                {
+                    "url": backend.url,
+                    "outstanding": backend.outstanding,
+                    "requests": backend.requests,
+                    "errors": backend.errors,
+                    "ejected": backend.ejected(now),
+                    "ejected_for_s": round(max(backend.ejected_until - now, 0.0), 1),
+                    "models": sorted(backend.models) if backend.models is not None else None,
+                }
+                for backend in self.backends
+            ],
+        }
+
+
+# Create singleton instances
+generation_pool = OllamaPool("generation", _urls(OLLAMA_GENERATION_URLS))
+embedding_pool = OllamaPool("embedding", _urls(OLLAMA_EMBEDDING_URLS))
@@ -4,126 +4,391 @@ This is the bridge between FastAPI and Ollama (running in Docker)
 """
 
 import aiohttp
+import asyncio
+import json
 import os
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
 from dotenv import load_dotenv
+from app.services.http_service import http_service
+from app.services.health_service import health_monitor
+from app.services.cache_service import response_cache, hash_key
+from app.services.singleflight_service import singleflight
+from app.services.metrics_service import metrics
+from app.services.scheduler_service import generation_scheduler
+from app.services.ollama_pool_service import generation_pool
+from app.services.upstream_service import upstream
+from app.services.logging_service import get_logger
 
 # Load environment variables
 load_dotenv()
 
-# Get configuration from .env
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+logger = get_logger(__name__)
+
+# Get configuration from .env (backend URLs: see ollama_pool_service)
 MODEL_NAME = os.getenv("MODEL_NAME", "llama3.2:latest")
+# How long Ollama keeps the model (and its KV cache) resident after a request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Longest generation call (non-streaming), or longest wait for the next token
+# (streaming); both are capped by the request's deadline budget
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "180"))
 
 class OllamaService:
     """Service to interact with Ollama API"""
-    
+
     @staticmethod
     async def check_health() -> bool:
         """
         Check if Ollama is running and accessible
-        Returns: True if healthy, False otherwise
+
+        Refreshes the model list of every generation backend on the way.
+
+        Returns: True if at least one backend is healthy, False otherwise
         """
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{OLLAMA_BASE_URL}/api/tags",
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as response:
-                    return response.status == 200
-        except Exception as e:
-            print(f"❌ Ollama health check failed: {e}")
-            return False
-    
+        return await generation_pool.refresh()
+
+    @staticmethod
+    def _connection_failed(e: Exception) -> Exception:
+        """Record a connection failure; Ollama is only unhealthy once no backend is left"""
+        error = str(e) or type(e).__name__
+        if not generation_pool.available():
+            # Flip the cached status right away instead of waiting for the next probe
+            health_monitor.mark_unhealthy("ollama", error)
+        return Exception(f"Failed to connect to Ollama: {error}")
+
+    @staticmethod
+    def _options(temperature: float, max_tokens: int) -> Dict:
+        """Sampling options shared by every generation request"""
+        return {
+            "temperature": temperature,
+            "num_predict": max_tokens,
+            "top_p": 0.9,
+        }
+
+    @staticmethod
+    def _result(data: Dict, text: str, model_name: str) -> Dict:
+        """Build the service result (text, model, token and prompt-eval counters)"""
+        return {
+            "response": text,
+            "model": data.get("model", model_name),
+            "tokens_used": data.get("eval_count", 0),
+            "prompt_tokens": data.get("prompt_eval_count", 0),
+            # Ollama reports durations in nanoseconds
+            "prompt_eval_ms": round(data.get("prompt_eval_duration", 0) / 1e6, 2),
+        }
+
+    @staticmethod
+    async def _post(path: str, payload: Dict, priority: Optional[str] = None) -> Dict:
+        """
+        POST a non-streaming request to Ollama
+
+        Args:
+            path: API path (e.g. "/api/generate")
+            payload: JSON body
+            priority: Scheduler lane ("interactive", "default" or "bulk")
+
+        Returns:
+            Decoded JSON response
+        """
+        # Fail fast while Ollama's breaker is open, instead of queueing
+        upstream.check("ollama")
+        # Wait for a generation slot (admission control), then time the call
+        async with generation_scheduler.slot(priority):
+            with metrics.stage("llm_generate", model=payload.get("model")):
+                attempts = len(generation_pool.backends)
+                try:
+                    async with upstream.guard("ollama"):
+                        for attempt in range(attempts):
+                            try:
+                                async with generation_pool.backend(payload.get("model")) as backend:
+                                    async with http_service.session.post(
+                                        f"{backend.url}{path}",
+                                        json=payload,
+                                        timeout=aiohttp.ClientTimeout(total=upstream.timeout(OLLAMA_TIMEOUT, "ollama"))
+                                    ) as response:
+                                        if response.status == 200:
+                                            data = await response.json()
+                                            health_monitor.mark_healthy("ollama")
+                                            return data
+                                        else:
+                                            error_text = await response.text()
+                                            raise Exception(f"Ollama API error ({response.status}): {error_text}")
+                            except aiohttp.ClientConnectorError:
+                                # Nothing reached the backend: try the next one
+                                if attempt + 1 == attempts:
+                                    raise
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    raise OllamaService._connection_failed(e)
+
+    @staticmethod
+    async def _stream(path: str, payload: Dict, priority: Optional[str] = None) -> AsyncIterator[Dict]:
+        """
+        POST a streaming request to Ollama and yield its NDJSON objects
+
+        Args:
+            path: API path (e.g. "/api/chat")
+            payload: JSON body ("stream" is forced on)
+            priority: Scheduler lane ("interactive", "default" or "bulk")
+
+        Yields:
+            One decoded object per line; the last one has "done": true
+        """
+        upstream.check("ollama")
+        # The slot is held, and the call timed, until the last token (or
+        # until the consumer stops reading)
+        async with generation_scheduler.slot(priority):
+            with metrics.stage("llm_generate", model=payload.get("model")):
+                attempts = len(generation_pool.backends)
+                try:
+                    async with upstream.guard("ollama"):
+                        for attempt in range(attempts):
+                            try:
+                                async with generation_pool.backend(payload.get("model")) as backend:
+                                    async with http_service.session.post(
+                                        f"{backend.url}{path}",
+                                        json={**payload, "stream": True},
+                                        # No total limit: a long completion is fine as long as tokens keep coming
+                                        timeout=aiohttp.ClientTimeout(
+                                            total=None,
+                                            sock_connect=10,
+                                            sock_read=upstream.timeout(OLLAMA_TIMEOUT, "ollama")
+                                        )
+                                    ) as response:
+                                        if response.status != 200:
+                                            error_text = await response.text()
+                                            raise Exception(f"Ollama API error ({response.status}): {error_text}")
+
+                                        health_monitor.mark_healthy("ollama")
+
+                                        # Ollama sends one JSON object per line
+                                        async for line in response.content:
+                                            line = line.strip()
+                                            if not line:
+                                                continue
+                                            data = json.loads(line)
+                                            if data.get("error"):
+                                                raise Exception(f"Ollama API error: {data['error']}")
+                                            yield data
+                                            if data.get("done"):
+                                                break
+                                return
+                            except aiohttp.ClientConnectorError:
+                                # Raised before the first token: try the next backend
+                                if attempt + 1 == attempts:
+                                    raise
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    raise OllamaService._connection_failed(e)
+
     @staticmethod
     async def generate(
-        prompt: str, 
-        temperature: float = 0.7, 
-        max_tokens: int = 512, 
-        model: str = None
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 512,
+        model: str = None,
+        priority: Optional[str] = None
     ) -> Dict:
         """
         Generate text using Ollama
-        
+
         Args:
             prompt: Input text to generate from
             temperature: Creativity (0=deterministic, 2=creative)
             max_tokens: Maximum length of response
             model: Model to use (or use default from .env)
-            
+            priority: Scheduler lane ("interactive", "default" or "bulk")
+
         Returns:
-            Dict with response, model name, and token count
+            Dict with response, model name, token count and prompt-eval timing
         """
         model_name = model or MODEL_NAME
-        
+        payload = {
+            "model": model_name,
+            "prompt": prompt,
+            "stream": False,  # Don't stream, return all at once
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": OllamaService._options(temperature, max_tokens)
+        }
+
+        # Identical concurrent requests in the same lane share one upstream call
+        data = await singleflight.do(
+            "generate",
+            f"{priority or 'default'}:{hash_key(json.dumps(payload, sort_keys=True))}",
+            lambda: OllamaService._post("/api/generate", payload, priority)
+        )
+        return OllamaService._result(data, data.get("response", ""), model_name)
+
+    @staticmethod
+    async def generate_stream(
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 512,
+        model: str = None,
+        priority: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Generate text using Ollama, yielding its NDJSON stream as it arrives
+
+        Args:
+            prompt: Input text to generate from
+            temperature: Creativity (0=deterministic, 2=creative)
+            max_tokens: Maximum length of response
+            model: Model to use (or use default from .env)
+            priority: Scheduler lane ("interactive", "default" or "bulk")
+
+        Yields:
+            Ollama stream objects; every object carries a "response" token and
+            the final one has "done": true plus the eval counters
+        """
+        model_name = model or MODEL_NAME
+
+        stream = OllamaService._stream("/api/generate", {
+            "model": model_name,
+            "prompt": prompt,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": OllamaService._options(temperature, max_tokens)
+        }, priority)
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{OLLAMA_BASE_URL}/api/generate",
-                    json={
-                        "model": model_name,
-                        "prompt": prompt,
-                        "stream": False,  # Don't stream, return all at once
-                        "options": {
-                            "temperature": temperature,
-                            "num_predict": max_tokens,
-                            "top_p": 0.9,
-                        }
-                    },
-                    timeout=aiohttp.ClientTimeout(total=180)  # 3 minute timeout
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return {
-                            "response": data.get("response", ""),
-                            "model": data.get("model", model_name),
-                            "tokens_used": data.get("eval_count", 0)
-                        }
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"Ollama API error ({response.status}): {error_text}")
-        except aiohttp.ClientError as e:
-            raise Exception(f"Failed to connect to Ollama: {str(e)}")
-    
+            async for data in stream:
+                yield data
+        finally:
+            # Closing this generator must release the slot and the upstream response now
+            await stream.aclose()
+
+    @staticmethod
+    def _chat_messages(messages: List[Dict]) -> List[Dict]:
+        """
+        Normalize messages for /api/chat
+
+        Only role and content are sent, in their original order, so an unchanged
+        system prompt and history render to the exact same token prefix on every
+        turn and Ollama can reuse its KV cache for that prefix.
+        """
+        return [
+            {"role": msg.get("role", "user"), "content": msg.get("content", "")}
+            for msg in messages
+        ]
+
+    @staticmethod
+    def _request_key(
+        messages: List[Dict],
+        temperature: float,
+        max_tokens: int,
+        model_name: str
+    ) -> str:
+        """
+        Exact-match key over the normalized request (response cache and single-flight)
+
+        Only line endings are normalized: leading or trailing whitespace changes
+        what the model sees, so it changes the key too.
+        """
+        normalized = [
+            {
+                "role": (msg.get("role") or "user").strip().lower(),
+                "content": (msg.get("content") or "").replace("\r\n", "\n"),
+            }
+            for msg in messages
+        ]
+        return hash_key(json.dumps({
+            "messages": normalized,
+            "model": model_name,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }, sort_keys=True))
+
     @staticmethod
     async def chat(
-        messages: List[Dict], 
-        temperature: float = 0.7, 
-        max_tokens: int = 512, 
-        model: str = None
+        messages: List[Dict],
+        temperature: float = 0.7,
+        max_tokens: int = 512,
+        model: str = None,
+        cache: Optional[bool] = None,
+        priority: Optional[str] = None
     ) -> Dict:
         """
-        Chat with Ollama (converts chat messages to a single prompt)
-        
+        Chat with Ollama using the native /api/chat endpoint
+
+        Messages keep their roles so the model's own chat template is applied,
+        and keep_alive keeps the model loaded between requests.
+
         Args:
             messages: List of {role, content} dicts
             temperature: Creativity level
             max_tokens: Max response length
             model: Model to use
-            
+            cache: Use the exact-match response cache. None (default) caches
+                only deterministic requests (temperature 0); True opts in for
+                any temperature, so a sampled answer is stored once and then
+                replayed for identical requests; False bypasses the cache.
+            priority: Scheduler lane ("interactive", "default" or "bulk")
+
         Returns:
-            Dict with response, model, tokens
-        """
-        # Convert chat messages to a single prompt
-        prompt_parts = []
-        
-        for msg in messages:
-            role = msg.get('role', 'user')
-            content = msg.get('content', '')
-            
-            if role == 'system':
-                prompt_parts.append(f"System: {content}")
-            elif role == 'user':
-                prompt_parts.append(f"User: {content}")
-            elif role == 'assistant':
-                prompt_parts.append(f"Assistant: {content}")
-        
-        # Add "Assistant:" at the end to prompt the model to respond
-        prompt_parts.append("Assistant:")
-        prompt = "\n\n".join(prompt_parts)
-        
-        # Call the generate method
-        return await OllamaService.generate(prompt, temperature, max_tokens, model)
+            Dict with response, model, tokens, prompt-eval timing and a
+            "cached" flag
+        """
+        model_name = model or MODEL_NAME
+
+        request_key = OllamaService._request_key(messages, temperature, max_tokens, model_name)
+        use_cache = (temperature == 0) if cache is None else cache
+        if use_cache:
+            cached = await response_cache.get(request_key)
+            if cached is not None:
+                return {**cached, "cached": True}
+
+        async def fetch() -> Dict:
+            data = await OllamaService._post("/api/chat", {
+                "model": model_name,
+                "messages": OllamaService._chat_messages(messages),
+                "stream": False,
+                "keep_alive": OLLAMA_KEEP_ALIVE,
+                "options": OllamaService._options(temperature, max_tokens)
+            }, priority)
+            result = OllamaService._result(data, data.get("message", {}).get("content", ""), model_name)
+            logger.debug("Prompt eval", extra={"prompt_tokens": result["prompt_tokens"], "prompt_eval_ms": result["prompt_eval_ms"]})
+            return result
+
+        # Identical concurrent requests in the same lane share one upstream call
+        result = await singleflight.do("chat", f"{priority or 'default'}:{request_key}", fetch)
+
+        if use_cache:
+            await response_cache.set(request_key, result)
+        return {**result, "cached": False}
+
+    @staticmethod
+    async def chat_stream(
+        messages: List[Dict],
+        temperature: float = 0.7,
+        max_tokens: int = 512,
+        model: str = None,
+        priority: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Streaming variant of chat()
+
+        Args:
+            messages: List of {role, content} dicts
+            temperature: Creativity level
+            max_tokens: Max response length
+            model: Model to use
+            priority: Scheduler lane ("interactive", "default" or "bulk")
+
+        Yields:
+            Ollama stream objects, with each token copied to "response" so they
+            match generate_stream() output
+        """
+        model_name = model or MODEL_NAME
+
+        stream = OllamaService._stream("/api/chat", {
+            "model": model_name,
+            "messages": OllamaService._chat_messages(messages),
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": OllamaService._options(temperature, max_tokens)
+        }, priority)
+        try:
+            async for data in stream:
+                data["response"] = data.get("message", {}).get("content", "")
+                yield data
+        finally:
+            # Closing this generator must release the slot and the upstream response now
+            await stream.aclose()
 
 # Create a singleton instance
 ollama_service = OllamaService()
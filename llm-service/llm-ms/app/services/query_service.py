@@ -4,80 +4,314 @@ Handles context retrieval from vectors and LLM-augmented answer generation
 """
 
 from typing import Dict, List, Optional
+import asyncio
 import os
 from app.services.embedding_service import embedding_service
 from app.services.chroma_service import chroma_service
-from app.services.ollama_service import ollama_service
+from app.services.ollama_service import ollama_service, MODEL_NAME
+from app.services.cache_service import answer_cache
+from app.services.lexical_service import lexical_index
+from app.services.context_service import context_packer, PASSAGE_SEPARATOR
+from app.services.metrics_service import metrics
+from app.services.logging_service import get_logger
+from dotenv import load_dotenv
+import json
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Retrieval strategy: "vector", "hybrid" (vector + BM25, fused) or "lexical" (BM25 only).
+# Hybrid and lexical are opt-in: collections ingested before the BM25 index
+# existed have no lexical entries, so they would rank differently from new ones
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector").lower()
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+# Reciprocal rank fusion constant (higher flattens the rank weighting)
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Hybrid mode: candidates fetched from each retriever per requested result
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "4"))
+
+RAG_SYSTEM_PROMPT = (
+    "You are a helpful assistant that answers questions based on provided context. "
+    "Be concise and factual.\n"
+    "Based on the context in the user's message, answer the question. "
+    "If the context doesn't contain relevant information, say so."
+)
 
 
 class QueryService:
     """Service for query processing: retrieve context and generate RAG responses"""
 
+    @staticmethod
+    def _resolve_mode(mode: Optional[str]) -> str:
+        """Requested retrieval mode, or the configured default"""
+        mode = (mode or RETRIEVAL_MODE).lower()
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}' (expected one of {', '.join(RETRIEVAL_MODES)})")
+        return mode
+
+    @staticmethod
+    def _format_vector_results(results: Dict, index: int = 0) -> List[Dict]:
+        """Flatten the results of one query embedding (by position) into ranked chunks"""
+        formatted_results = []
+        for i, (doc_id, metadata, distance, chunk_text) in enumerate(
+            zip(
+                results.get("ids", [[]])[index],
+                results.get("metadatas", [[]])[index],
+                results.get("distances", [[]])[index],
+                results.get("documents", [[]])[index]
+            )
+        ):
+            formatted_results.append({
+                "rank": i + 1,
+                "chunk_id": doc_id,
+                "document_id": metadata.get("document_id"),
+                "chunk_number": metadata.get("chunk_number"),
+                "text": chunk_text,
+                "distance": float(distance),
+                "similarity": 1 - float(distance),  # Convert distance to similarity (0-1)
+                "metadata": metadata
+            })
+        return formatted_results
+
+    @staticmethod
+    def _format_lexical_results(hits: List) -> List[Dict]:
+        """Turn BM25 hits into ranked chunks (no vector distance)"""
+        return [
+            {
+                "rank": i + 1,
+                "chunk_id": doc_id,
+                "document_id": metadata.get("document_id"),
+                "chunk_number": metadata.get("chunk_number"),
+                "text": chunk_text,
+                "distance": None,
+                "similarity": None,
+                "bm25_score": round(score, 4),
+                "metadata": metadata
+            }
+            for i, (doc_id, score, chunk_text, metadata) in enumerate(hits)
+        ]
+
+    @staticmethod
+    def _fuse(vector_chunks: List[Dict], lexical_chunks: List[Dict], n_results: int) -> List[Dict]:
+        """
+        Reciprocal rank fusion: score = sum of 1 / (RRF_K + rank) over retrievers
+
+        Ranks are comparable across retrievers where raw scores (cosine
+        distance vs. BM25) are not.
+        """
+        fused: Dict[str, Dict] = {}
+        for source, chunks in (("vector", vector_chunks), ("lexical", lexical_chunks)):
+            for chunk in chunks:
+                entry = fused.get(chunk["chunk_id"])
+                if entry is None:
+                    entry = fused[chunk["chunk_id"]] = {**chunk, "rrf_score": 0.0, "retrieved_by": []}
+                elif source == "lexical":
+                    entry["bm25_score"] = chunk["bm25_score"]
+                entry["rrf_score"] += 1.0 / (RRF_K + chunk["rank"])
+                entry["retrieved_by"].append(source)
+
+        ranked = sorted(fused.values(), key=lambda entry: entry["rrf_score"], reverse=True)[:n_results]
+        for i, entry in enumerate(ranked):
+            entry["rank"] = i + 1
+            entry["rrf_score"] = round(entry["rrf_score"], 6)
+        return ranked
+
+    @staticmethod
+    def _build_messages(query: str, context_chunks: List[Dict]) -> List[Dict]:
+        """
+        Chat messages for a RAG answer
+
+        The fixed instructions live in the system message so every query
+        shares the same cacheable prompt prefix; the user message carries the
+        context chunks and the question.
+        """
+        context_text = PASSAGE_SEPARATOR.join([
+            f"[Document: {chunk['document_id']}, Chunk {chunk['chunk_number']}]\n{chunk['text']}"
+            for chunk in context_chunks
+        ])
+
+        rag_prompt = f"""CONTEXT:
+{context_text}
+
+QUESTION: {query}
+
+ANSWER:"""
+
+        return [
+            {
+                "role": "system",
+                "content": RAG_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": rag_prompt
+            }
+        ]
+
     @staticmethod
     async def retrieve_context(
         query: str,
         collection_name: str = "documents",
         n_results: int = 5,
-        query_embedding: Optional[List[float]] = None
+        query_embedding: Optional[List[float]] = None,
+        mode: Optional[str] = None
     ) -> List[Dict]:
         """
-        Retrieve relevant document chunks based on semantic similarity
+        Retrieve relevant document chunks by semantic and/or lexical similarity
         
         Args:
             query: User query or question
             collection_name: Name of the ChromaDB collection
             n_results: Number of top-k chunks to retrieve (default: 5)
             query_embedding: Optional pre-computed query embedding
+            mode: "vector", "hybrid" or "lexical" (default: RETRIEVAL_MODE)
             
         Returns:
             List of relevant chunks ranked by similarity
             
         Flow:
-            1. Generate embedding for query (if not provided)
-            2. Semantic search in ChromaDB (cosine similarity)
-            3. Format and rank results by similarity score
-            4. Return top-k chunks with metadata and relevance scores
+            1. Lexical mode: BM25 search only, no embedding round trip
+            2. Generate embedding for query (if not provided)
+            3. Semantic search in ChromaDB (cosine similarity)
+            4. Hybrid mode: fuse with BM25 results by reciprocal rank
+            5. Return top-k chunks with metadata and relevance scores
         """
+        metrics.set_collection(collection_name)
         try:
-            # 1. Generate query embedding if not provided
+            mode = QueryService._resolve_mode(mode)
+            # Hybrid mode draws a deeper candidate list from each retriever
+            depth = n_results if mode == "vector" else n_results * max(HYBRID_CANDIDATE_FACTOR, 1)
+
+            # 1. Lexical-only fast path
+            if mode == "lexical":
+                hits = await lexical_index.search(collection_name, query, n_results)
+                formatted_results = QueryService._format_lexical_results(hits)
+                logger.debug("Retrieved context", extra={"chunks": len(formatted_results), "mode": mode})
+                return formatted_results
+
+            # 2. Generate query embedding if not provided
             if not query_embedding:
-                query_embedding = [await embedding_service.generate_embedding(query)]
+                query_embedding = await embedding_service.generate_embedding(query)
 
-            # 2. Query ChromaDB (semantic search)
-            results = chroma_service.query(
+            # 3. Query ChromaDB (semantic search), with BM25 alongside in hybrid mode
+            vector_search = chroma_service.query(
                 collection_name=collection_name,
                 query_texts=[query],
-                query_embeddings=query_embedding,
-                n_results=n_results
+                query_embeddings=[query_embedding],
+                n_results=depth
             )
+            if mode == "hybrid":
+                results, hits = await asyncio.gather(
+                    vector_search,
+                    lexical_index.search(collection_name, query, depth)
+                )
+            else:
+                results, hits = await vector_search, []
+            formatted_results = QueryService._format_vector_results(results)
 
-            # 3. Format results
-            formatted_results = []
-            
-            for i, (doc_id, metadata, distance, chunk_text) in enumerate(
-                zip(
-                    results.get("ids", [[]])[0],
-                    results.get("metadatas", [[]])[0],
-                    results.get("distances", [[]])[0],
-                    results.get("documents", [[]])[0]
+            # 4. Fuse both rankings
+            if mode == "hybrid":
+                formatted_results = QueryService._fuse(
+                    formatted_results,
+                    QueryService._format_lexical_results(hits),
+                    n_results
                 )
-            ):
-                formatted_results.append({
-                    "rank": i + 1,
-                    "chunk_id": doc_id,
-                    "document_id": metadata.get("document_id"),
-                    "chunk_number": metadata.get("chunk_number"),
-                    "text": chunk_text,
-                    "distance": float(distance),
-                    "similarity": 1 - float(distance),  # Convert distance to similarity (0-1)
-                    "metadata": metadata
-                })
-
-            print(f"🔍 Retrieved {len(formatted_results)} relevant chunks")
+
+            logger.debug("Retrieved context", extra={"chunks": len(formatted_results), "mode": mode})
             return formatted_results
 
         except Exception as e:
-            print(f"❌ Error retrieving context: {e}")
+            logger.error("Error retrieving context", extra={"collection": collection_name, "error": str(e)})
+            raise
+
+    @staticmethod
+    async def retrieve_context_batch(
+        queries: List[str],
+        collection_name: str = "documents",
+        n_results: int = 5,
+        mode: Optional[str] = None,
+        deduplicate: bool = False
+    ) -> List[List[Dict]]:
+        """
+        Retrieve chunks for several queries with one round trip per dependency
+        
+        Args:
+            queries: Queries or sub-questions
+            collection_name: Name of the ChromaDB collection
+            n_results: Number of top-k chunks per query (default: 5)
+            mode: "vector", "hybrid" or "lexical" (default: RETRIEVAL_MODE)
+            deduplicate: Return each chunk only once, for the first query
+                (in request order) that retrieves it; later queries get
+                their next best chunks instead
+            
+        Returns:
+            Ranked chunks per query, in query order
+            
+        Flow:
+            1. Embed all queries in one batched embedding call (cached
+               queries are not re-embedded; none in lexical mode)
+            2. One multi-vector ChromaDB query, BM25 searches alongside
+            3. Per query: format, fuse (hybrid), de-duplicate, top-k
+        """
+        metrics.set_collection(collection_name)
+        try:
+            mode = QueryService._resolve_mode(mode)
+            depth = n_results if mode == "vector" else n_results * max(HYBRID_CANDIDATE_FACTOR, 1)
+            # Earlier queries may claim up to n_results chunks each: fetch enough to refill
+            if deduplicate:
+                depth += n_results * (len(queries) - 1)
+
+            def lexical_search():
+                return asyncio.gather(*(lexical_index.search(collection_name, query, depth) for query in queries))
+
+            # 1. Lexical-only fast path
+            if mode == "lexical":
+                ranked = [QueryService._format_lexical_results(hits) for hits in await lexical_search()]
+            else:
+                # 2. One embedding call and one vector query for every query
+                query_embeddings = await embedding_service.generate_embeddings_batch(queries)
+                vector_search = chroma_service.query(
+                    collection_name=collection_name,
+                    query_texts=queries,
+                    query_embeddings=query_embeddings,
+                    n_results=depth
+                )
+                if mode == "hybrid":
+                    results, lexical_hits = await asyncio.gather(vector_search, lexical_search())
+                else:
+                    results, lexical_hits = await vector_search, None
+
+                # 3. Fuse each query's rankings
+                ranked = []
+                for i in range(len(queries)):
+                    chunks = QueryService._format_vector_results(results, i)
+                    if lexical_hits is not None:
+                        chunks = QueryService._fuse(
+                            chunks,
+                            QueryService._format_lexical_results(lexical_hits[i]),
+                            depth
+                        )
+                    ranked.append(chunks)
+
+            seen = set()
+            retrieved = []
+            for chunks in ranked:
+                if deduplicate:
+                    chunks = [chunk for chunk in chunks if chunk["chunk_id"] not in seen]
+                chunks = chunks[:n_results]
+                for i, chunk in enumerate(chunks):
+                    chunk["rank"] = i + 1
+                    seen.add(chunk["chunk_id"])
+                retrieved.append(chunks)
+
+            logger.debug("Retrieved context batch", extra={
+                "queries": len(queries), "chunks": sum(len(chunks) for chunks in retrieved), "mode": mode,
+            })
+            return retrieved
+
+        except Exception as e:
+            logger.error("Error retrieving context batch", extra={"collection": collection_name, "error": str(e)})
             raise
 
     @staticmethod
@@ -86,7 +320,11 @@ class QueryService:
         collection_name: str = "documents",
         n_context_chunks: int = 5,
         temperature: float = 0.7,
-        max_tokens: int = 512
+        max_tokens: int = 512,
+        use_cache: bool = True,
+        retrieval_mode: Optional[str] = None,
+        priority: Optional[str] = None,
+        context_token_budget: Optional[int] = None
     ) -> Dict:
         """
         Execute full RAG pipeline: retrieve context and generate LLM answer
@@ -97,23 +335,57 @@ class QueryService:
             n_context_chunks: Number of top-k chunks for context (default: 5)
             temperature: LLM creativity (0.0-1.0, default: 0.7)
             max_tokens: Maximum response length (default: 512)
+            use_cache: Serve/store the answer through the semantic answer cache
+            retrieval_mode: "vector", "hybrid" or "lexical" (default: RETRIEVAL_MODE)
+            priority: Generation scheduler lane ("interactive", "default" or "bulk")
+            context_token_budget: Estimated tokens of context in the prompt
+                (default: CONTEXT_TOKEN_BUDGET; 0 = no budget)
             
         Returns:
             Generated answer with retrieved context and metadata
             
         Flow:
-            1. Retrieve top-k relevant chunks via semantic search
-            2. Build context from retrieved chunks
-            3. Create RAG prompt with context + question
-            4. Send to LLM (Ollama) for answer generation
-            5. Return answer with source chunks and confidence metrics
+            1. Embed the query and check the semantic answer cache (skipped
+               in lexical mode, which needs no embedding)
+            2. Retrieve top-k relevant chunks via semantic search
+            3. Pack the chunks into the token budget in relevance order,
+               merging overlapping/adjacent chunks of the same document
+            4. Create RAG prompt with context + question
+            5. Send to LLM (Ollama) for answer generation
+            6. Cache and return answer with source chunks and confidence metrics
         """
+        metrics.set_collection(collection_name)
         try:
-            # 1. Retrieve relevant context chunks
+            retrieval_mode = QueryService._resolve_mode(retrieval_mode)
+            # The semantic answer cache is keyed by the query embedding
+            use_cache = use_cache and retrieval_mode != "lexical"
+
+            # 1. Embed once; the vector serves both the cache lookup and retrieval
+            query_embedding = None
+            if retrieval_mode != "lexical":
+                query_embedding = await embedding_service.generate_embedding(query)
+            cache_collection = chroma_service.safe_name(collection_name)
+            # Answers are only reused when they were generated the same way
+            params_key = json.dumps([
+                MODEL_NAME, n_context_chunks, temperature, max_tokens, retrieval_mode, context_token_budget
+            ])
+
+            # Read before retrieval: an ingest or delete from here on makes this answer stale
+            cache_generation = answer_cache.generation(cache_collection)
+            if use_cache:
+                hit = answer_cache.lookup(cache_collection, params_key, query_embedding)
+                if hit is not None:
+                    cached_answer, similarity = hit
+                    logger.debug("RAG answer served from cache", extra={"similarity": round(similarity, 3)})
+                    return {**cached_answer, "cached": True}
+
+            # 2. Retrieve relevant context chunks
             context_chunks = await QueryService.retrieve_context(
                 query=query,
                 collection_name=collection_name,
-                n_results=n_context_chunks
+                n_results=n_context_chunks,
+                query_embedding=query_embedding,
+                mode=retrieval_mode
             )
 
             if not context_chunks:
@@ -121,55 +393,46 @@ class QueryService:
                     "answer": "No relevant documents found in the knowledge base.",
                     "context": [],
                     "source_count": 0,
-                    "model": os.getenv("MODEL_NAME", "llama3.2:latest")
+                    "model": os.getenv("MODEL_NAME", "llama3.2:latest"),
+                    "context_tokens": 0,
+                    "tokens_saved": 0,
+                    "tokens_dropped": 0,
+                    "cached": False
                 }
 
-            # 2. Build context from chunks
-            context_text = "\n\n---\n\n".join([
-                f"[Document: {chunk['document_id']}, Chunk {chunk['chunk_number']}]\n{chunk['text']}"
-                for chunk in context_chunks
-            ])
-
-            # 3. Create RAG prompt with context and question
-            rag_prompt = f"""Based on the following context, answer the question. 
-If the context doesn't contain relevant information, say so.
-
-CONTEXT:
-{context_text}
-
-QUESTION: {query}
-
-ANSWER:"""
-
-            # 4. Generate answer using LLM
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that answers questions based on provided context. Be concise and factual."
-                },
-                {
-                    "role": "user",
-                    "content": rag_prompt
-                }
-            ]
+            # 3-4. Pack the chunks into the budget and build the RAG prompt
+            with metrics.stage("prompt_build"):
+                passages, packing = context_packer.pack(context_chunks, context_token_budget)
+                messages = QueryService._build_messages(query, passages)
 
+            # 5. Generate answer using LLM
             response = await ollama_service.chat(
                 messages=messages,
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                priority=priority
             )
 
-            print(f"✅ RAG query completed with {len(context_chunks)} context chunks")
+            logger.debug("RAG query completed", extra={"context_chunks": len(context_chunks), **packing})
 
-            return {
+            result = {
                 "answer": response["response"],
                 "context": context_chunks,
                 "source_count": len(context_chunks),
-                "model": response["model"]
+                "model": response["model"],
+                "context_tokens": packing["context_tokens"],
+                "tokens_saved": packing["tokens_saved"],
+                "tokens_dropped": packing["tokens_dropped"]
             }
 
+            # 6. Cache the answer for semantically similar follow-up queries
+            if use_cache:
+                answer_cache.store(cache_collection, params_key, query_embedding, result, cache_generation)
+
+            return {**result, "cached": False}
+
         except Exception as e:
-            print(f"❌ Error in RAG query: {e}")
+            logger.error("Error in RAG query", extra={"collection": collection_name, "error": str(e)})
             raise
 
 
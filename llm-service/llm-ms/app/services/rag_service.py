@@ -4,7 +4,7 @@ Note: This file now delegates to separate ingestion_service and query_service
 for better separation of concerns and independent scaling
 """
 
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 from app.services.ingestion_service import ingestion_service
 from app.services.query_service import query_service
 
@@ -47,12 +47,66 @@ class RAGService:
             collection_name=collection_name
         )
 
+    @staticmethod
+    async def ingest_documents_batch(documents: List[Dict]) -> Dict:
+        """
+        Ingest many documents at once via IngestionService
+        
+        Args:
+            documents: List of {document_id, document_text, metadata, collection_name}
+            
+        Returns:
+            Per-document results plus succeeded/failed counts
+        """
+        return await ingestion_service.ingest_documents_batch(documents)
+
+    @staticmethod
+    async def ingest_document_stream(
+        document_id: str,
+        text_stream: AsyncIterator[str],
+        metadata: Optional[Dict] = None,
+        collection_name: str = "documents"
+    ) -> Dict:
+        """
+        Ingest a streamed document via IngestionService
+        
+        Args:
+            document_id: Unique document identifier
+            text_stream: Async iterator of text fragments
+            metadata: Optional metadata
+            collection_name: ChromaDB collection name
+            
+        Returns:
+            Ingestion status and chunk count
+        """
+        return await ingestion_service.ingest_document_stream(
+            document_id=document_id,
+            text_stream=text_stream,
+            metadata=metadata,
+            collection_name=collection_name
+        )
+
+    @staticmethod
+    def get_ingest_progress(document_id: str, collection_name: str = "documents") -> Optional[Dict]:
+        """
+        Progress of a streaming ingestion job via IngestionService
+        
+        Args:
+            document_id: Document being ingested
+            collection_name: ChromaDB collection name
+            
+        Returns:
+            Progress counters, or None if unknown
+        """
+        return ingestion_service.get_progress(document_id, collection_name)
+
     @staticmethod
     async def retrieve_context(
         query: str,
         collection_name: str = "documents",
         n_results: int = 5,
-        query_embedding: Optional[List[float]] = None
+        query_embedding: Optional[List[float]] = None,
+        mode: Optional[str] = None
     ) -> List[Dict]:
         """
         Retrieve relevant context via QueryService
@@ -62,6 +116,7 @@ class RAGService:
             collection_name: ChromaDB collection name
             n_results: Number of top-k chunks
             query_embedding: Optional pre-computed embedding
+            mode: "vector", "hybrid" or "lexical" retrieval
             
         Returns:
             List of relevant chunks with similarity scores
@@ -70,7 +125,37 @@ class RAGService:
             query=query,
             collection_name=collection_name,
             n_results=n_results,
-            query_embedding=query_embedding
+            query_embedding=query_embedding,
+            mode=mode
+        )
+
+    @staticmethod
+    async def retrieve_context_batch(
+        queries: List[str],
+        collection_name: str = "documents",
+        n_results: int = 5,
+        mode: Optional[str] = None,
+        deduplicate: bool = False
+    ) -> List[List[Dict]]:
+        """
+        Retrieve context for several queries at once via QueryService
+        
+        Args:
+            queries: Queries or sub-questions
+            collection_name: ChromaDB collection name
+            n_results: Number of top-k chunks per query
+            mode: "vector", "hybrid" or "lexical" retrieval
+            deduplicate: Return each chunk for the first query only
+            
+        Returns:
+            Ranked chunks per query, in query order
+        """
+        return await query_service.retrieve_context_batch(
+            queries=queries,
+            collection_name=collection_name,
+            n_results=n_results,
+            mode=mode,
+            deduplicate=deduplicate
         )
 
     @staticmethod
@@ -79,7 +164,11 @@ class RAGService:
         collection_name: str = "documents",
         n_context_chunks: int = 5,
         temperature: float = 0.7,
-        max_tokens: int = 512
+        max_tokens: int = 512,
+        use_cache: bool = True,
+        retrieval_mode: Optional[str] = None,
+        priority: Optional[str] = None,
+        context_token_budget: Optional[int] = None
     ) -> Dict:
         """
         Execute full RAG pipeline via QueryService
@@ -90,6 +179,10 @@ class RAGService:
             n_context_chunks: Number of context chunks
             temperature: LLM temperature
             max_tokens: Max response length
+            use_cache: Use the semantic answer cache
+            retrieval_mode: "vector", "hybrid" or "lexical" retrieval
+            priority: Generation scheduler lane ("interactive", "default" or "bulk")
+            context_token_budget: Estimated tokens of context in the prompt
             
         Returns:
             Generated answer with sources
@@ -99,11 +192,15 @@ class RAGService:
             collection_name=collection_name,
             n_context_chunks=n_context_chunks,
             temperature=temperature,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            use_cache=use_cache,
+            retrieval_mode=retrieval_mode,
+            priority=priority,
+            context_token_budget=context_token_budget
         )
 
     @staticmethod
-    def delete_document(
+    async def delete_document(
         document_id: str,
         collection_name: str = "documents"
     ) -> Dict:
@@ -117,7 +214,7 @@ class RAGService:
         Returns:
             Deletion status
         """
-        return ingestion_service.delete_document(
+        return await ingestion_service.delete_document(
             document_id=document_id,
             collection_name=collection_name
         )
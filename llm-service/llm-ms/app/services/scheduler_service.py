@@ -0,0 +1,296 @@
+"""
+Scheduler Service - Admission control and priority queueing for LLM generation
+Ollama can only decode a few requests at once; everything past that waits
+here instead of piling up on Ollama until its timeout
+
+At most GENERATION_CONCURRENCY generations run at a time on each live
+generation backend (see ollama_pool_service), so capacity follows the pool
+as backends are ejected and readmitted. Further requests wait in a bounded
+queue with one FIFO lane per priority; a finished generation hands its slot
+straight to the head of the highest-priority non-empty lane. A request is
+rejected (SchedulerRejected -> HTTP 429 with Retry-After) when the queue is
+full, when its estimated wait already exceeds its lane's maximum wait, or
+when it actually waited that long. The wait is also capped by what is left
+of the request's deadline budget; when that cap is what stops the request,
+it fails with DeadlineExceeded (HTTP 504) instead, since retrying with the
+same budget would not help.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+from dotenv import load_dotenv
+from app.services.logging_service import get_logger
+from app.services.metrics_service import metrics
+from app.services.ollama_pool_service import OllamaPool, generation_pool
+from app.services.upstream_service import DeadlineExceeded, UpstreamError, upstream
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Lanes, highest priority first
+PRIORITIES = ("interactive", "default", "bulk")
+
+# Concurrent generations per generation backend
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "2"))
+# Requests allowed to wait across all lanes
+GENERATION_QUEUE_SIZE = int(os.getenv("GENERATION_QUEUE_SIZE", "64"))
+# Longest queue wait (seconds) per lane before a request is rejected
+GENERATION_MAX_WAIT = {
+    "interactive": float(os.getenv("GENERATION_MAX_WAIT_INTERACTIVE", "20")),
+    "default": float(os.getenv("GENERATION_MAX_WAIT_DEFAULT", "60")),
+    "bulk": float(os.getenv("GENERATION_MAX_WAIT_BULK", "300")),
+}
+# Weight of the latest generation in the moving average of generation time
+_SERVICE_TIME_ALPHA = 0.2
+
+
+class SchedulerRejected(UpstreamError):
+    """A generation request was not admitted; retry after `retry_after` seconds"""
+
+    status_code = 429
+
+
+class GenerationScheduler:
+    """Concurrency limit plus priority lanes in front of Ollama generation"""
+
+    def __init__(
+        self,
+        concurrency: int = GENERATION_CONCURRENCY,
+        queue_size: int = GENERATION_QUEUE_SIZE,
+        max_wait: Optional[Dict[str, float]] = None,
+        pool: Optional[OllamaPool] = None
+    ):
+        self.per_backend = max(concurrency, 1)
+        # Without a pool the limit is `concurrency` in total
+        self.pool = pool
+        self.queue_size = max(queue_size, 0)
+        self.max_wait = max_wait or dict(GENERATION_MAX_WAIT)
+        self.running = 0
+        self.queued = 0
+        self.lanes: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in PRIORITIES}
+        # Moving average of how long a generation holds its slot
+        self.service_time: Optional[float] = None
+        self._stats = {
+            lane: {"admitted": 0, "rejected_queue_full": 0, "rejected_wait": 0, "deadline_exceeded": 0,
+                   "waited": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+            for lane in PRIORITIES
+        }
+
+    @property
+    def concurrency(self) -> int:
+        """Current slot count: per-backend concurrency times live backends"""
+        if self.pool is None:
+            return self.per_backend
+        return self.per_backend * max(self.pool.available(), 1)
+
+    @staticmethod
+    def lane(priority: Optional[str]) -> str:
+        """Validated lane name (None means "default")"""
+        lane = (priority or "default").lower()
+        if lane not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}' (expected one of {', '.join(PRIORITIES)})")
+        return lane
+
+    def _ahead(self, lane: str) -> int:
+        """Requests that would be served before a new request in this lane"""
+        total = 0
+        for name in PRIORITIES:
+            total += len(self.lanes[name])
+            if name == lane:
+                return total
+        return total
+
+    def _estimated_wait(self, ahead: int) -> Optional[float]:
+        """Expected queue wait behind `ahead` requests (None before the first generation finished)"""
+        if self.service_time is None:
+            return None
+        return (ahead // self.concurrency + 1) * self.service_time
+
+    def _retry_after(self, lane: str) -> int:
+        """Seconds a rejected client should wait before retrying"""
+        estimate = self._estimated_wait(self._ahead(lane))
+        if estimate is None:
+            estimate = self.max_wait[lane]
+        return max(1, math.ceil(estimate))
+
+    def _reject(self, lane: str, reason: str, message: str) -> SchedulerRejected:
+        self._stats[lane][f"rejected_{reason}"] += 1
+        metrics.count_generation_rejected(lane, reason)
+        retry_after = self._retry_after(lane)
+        logger.warning("Generation rejected", extra={
+            "lane": lane, "reason": reason, "running": self.running,
+            "queued": self.queued, "retry_after": retry_after,
+        })
+        return SchedulerRejected(message, retry_after)
+
+    def _deadline_exceeded(self, lane: str, message: str) -> DeadlineExceeded:
+        self._stats[lane]["deadline_exceeded"] += 1
+        metrics.count_deadline_exceeded("generation_queue")
+        logger.warning("Generation deadline exceeded in queue", extra={
+            "lane": lane, "running": self.running, "queued": self.queued,
+        })
+        return DeadlineExceeded(message)
+
+    def _admitted(self, lane: str, waited: float) -> None:
+        stats = self._stats[lane]
+        stats["admitted"] += 1
+        if waited:
+            stats["waited"] += 1
+            stats["wait_seconds"] += waited
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+        metrics.observe_generation_wait(lane, waited)
+
+    def _dequeued(self, lane: str, future: asyncio.Future) -> bool:
+        """Remove a waiter from its lane; False if it already left"""
+        try:
+            self.lanes[lane].remove(future)
+        except ValueError:
+            return False
+        self.queued -= 1
+        metrics.set_generation_queue_depth(lane, len(self.lanes[lane]))
+        return True
+
+    def _release_slot(self) -> None:
+        """Free a finished slot and admit waiters, highest priority first"""
+        self.running -= 1
+        # Usually one waiter takes over the slot; more are admitted when
+        # backends came back since the last release
+        concurrency = self.concurrency
+        for lane in PRIORITIES:
+            waiters = self.lanes[lane]
+            while waiters and self.running < concurrency:
+                future = waiters.popleft()
+                self.queued -= 1
+                metrics.set_generation_queue_depth(lane, len(waiters))
+                if not future.done():
+                    self.running += 1
+                    future.set_result(None)
+
+    async def acquire(self, priority: Optional[str] = None) -> None:
+        """
+        Wait for a generation slot
+
+        Args:
+            priority: "interactive", "default" or "bulk" (None = "default")
+
+        Raises:
+            SchedulerRejected: Queue full, or the wait is (or would be) longer than the lane allows
+            DeadlineExceeded: The request's budget runs out (or would) before a slot frees up
+        """
+        lane = self.lane(priority)
+        if self.running < self.concurrency and not self.queued:
+            self.running += 1
+            self._admitted(lane, 0.0)
+            return
+
+        if self.queued >= self.queue_size:
+            raise self._reject(lane, "queue_full", "Generation queue is full")
+
+        # Fail fast when the queue ahead already takes longer than this lane
+        # (or the request's remaining budget) may wait
+        max_wait = self.max_wait[lane]
+        left = upstream.remaining()
+        budget_capped = left is not None and left < max_wait
+        if budget_capped:
+            max_wait = max(left, 0.0)
+        estimate = self._estimated_wait(self._ahead(lane))
+        if estimate is not None and estimate > max_wait:
+            if budget_capped and estimate <= self.max_wait[lane]:
+                # The lane would wait this long; only this request's budget would not
+                raise self._deadline_exceeded(
+                    lane, f"Estimated queue wait {estimate:.1f}s exceeds the remaining {max_wait:.1f}s deadline budget"
+                )
+            raise self._reject(lane, "wait", f"Estimated queue wait {estimate:.1f}s exceeds {self.max_wait[lane]:g}s")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.lanes[lane].append(future)
+        self.queued += 1
+        metrics.set_generation_queue_depth(lane, len(self.lanes[lane]))
+        enqueued = time.perf_counter()
+
+        def expire() -> None:
+            if self._dequeued(lane, future):
+                if budget_capped:
+                    error = self._deadline_exceeded(lane, "Request deadline exceeded while waiting for a generation slot")
+                else:
+                    error = self._reject(lane, "wait", f"Waited {max_wait:g}s for a generation slot")
+                future.set_exception(error)
+
+        timer = loop.call_later(max_wait, expire)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The caller went away: leave the queue, or pass on a slot that
+            # was handed over at the same moment
+            if not self._dequeued(lane, future) and future.done() and not future.cancelled() \
+                    and future.exception() is None:
+                self._release_slot()
+            raise
+        finally:
+            timer.cancel()
+        self._admitted(lane, time.perf_counter() - enqueued)
+
+    def release(self, held: float) -> None:
+        """
+        Give a slot back
+
+        Args:
+            held: Seconds the slot was held (feeds the wait estimate)
+        """
+        if self.service_time is None:
+            self.service_time = held
+        else:
+            self.service_time += _SERVICE_TIME_ALPHA * (held - self.service_time)
+        self._release_slot()
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None) -> AsyncIterator[None]:
+        """
+        Hold a generation slot for the duration of the block
+
+        Usage:
+            async with generation_scheduler.slot("interactive"):
+                ...
+        """
+        await self.acquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def stats(self) -> Dict:
+        """Running/queued counts, per-lane queue depth, wait times and rejections"""
+        lanes = {}
+        for lane in PRIORITIES:
+            stats = self._stats[lane]
+            lanes[lane] = {
+                "queued": len(self.lanes[lane]),
+                "max_wait_s": self.max_wait[lane],
+                "admitted": stats["admitted"],
+                "rejected_queue_full": stats["rejected_queue_full"],
+                "rejected_wait": stats["rejected_wait"],
+                "deadline_exceeded": stats["deadline_exceeded"],
+                "avg_wait_ms": round(stats["wait_seconds"] / stats["admitted"] * 1000, 2) if stats["admitted"] else 0.0,
+                "max_wait_ms": round(stats["max_wait_seconds"] * 1000, 2),
+            }
+        return {
+            "concurrency": self.concurrency,
+            "per_backend": self.per_backend,
+            "running": self.running,
+            "queued": self.queued,
+            "queue_size": self.queue_size,
+            "avg_generation_ms": round(self.service_time * 1000, 2) if self.service_time is not None else None,
+            "lanes": lanes,
+        }
+
+
+# Create singleton instance
+generation_scheduler = GenerationScheduler(pool=generation_pool)
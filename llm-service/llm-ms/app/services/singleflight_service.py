@@ -0,0 +1,160 @@
+"""
+Single-Flight Service - Collapses identical concurrent upstream calls
+Concurrent callers with the same request key wait on one upstream call and
+share its result, so a burst of identical requests costs one Ollama call
+"""
+
+import asyncio
+import contextvars
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+from app.services.upstream_service import DeadlineExceeded, request_deadline, upstream
+
+load_dotenv()
+
+# Number of individual keys kept for per-key metrics
+SINGLEFLIGHT_TRACKED_KEYS = int(os.getenv("SINGLEFLIGHT_TRACKED_KEYS", "200"))
+
+
+class SingleFlight:
+    """
+    Deduplicates in-flight calls by key
+
+    The upstream call runs in its own task, under the latest deadline among
+    its waiters. Each caller awaits it through asyncio.shield for at most its
+    own remaining budget, so one caller disconnecting or running out of time
+    never fails the call for the others; the upstream task is only cancelled
+    once every caller has gone.
+    """
+
+    def __init__(self, tracked_keys: int = SINGLEFLIGHT_TRACKED_KEYS):
+        self._calls: Dict[str, Dict] = {}
+        self._namespaces: Dict[str, Dict[str, int]] = {}
+        self._keys: "OrderedDict[str, Dict]" = OrderedDict()
+        self._tracked_keys = max(tracked_keys, 1)
+
+    def _record(self, namespace: str, full_key: str, collapsed: bool) -> None:
+        """Update namespace and per-key counters"""
+        totals = self._namespaces.setdefault(namespace, {"calls": 0, "upstream_calls": 0, "collapsed": 0})
+        totals["calls"] += 1
+        totals["collapsed" if collapsed else "upstream_calls"] += 1
+
+        key_stats = self._keys.setdefault(full_key, {"calls": 0, "collapsed": 0})
+        key_stats["calls"] += 1
+        key_stats["collapsed"] += int(collapsed)
+        self._keys.move_to_end(full_key)
+        while len(self._keys) > self._tracked_keys:
+            self._keys.popitem(last=False)
+
+    @staticmethod
+    def _later(deadline: Optional[float], other: Optional[float]) -> bool:
+        """True if deadline `other` ends after `deadline` (None = no deadline, i.e. never)"""
+        return deadline is not None and (other is None or other > deadline)
+
+    def _extend_deadline(self, call: Dict, deadline: Optional[float]) -> None:
+        """Give the shared call the latest deadline among its waiters"""
+        if self._later(call["deadline"], deadline):
+            call["deadline"] = deadline
+            # The task only enters its context while it runs, so this is safe
+            # between its steps; budgets already turned into timeouts keep them
+            call["context"].run(request_deadline.set, deadline)
+
+    async def do(self, namespace: str, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn once for all concurrent callers with the same key
+
+        The shared call runs with the latest deadline among its waiters: the
+        caller that starts it sets the budget (so admission control and
+        timeouts still fail fast), and callers joining later extend it. A
+        caller whose budget outlasts the one the call failed on gets one
+        retry.
+
+        Args:
+            namespace: Kind of call (e.g. "embedding", "chat"), used for metrics
+            key: Request key; callers with equal keys share one call
+            fn: Coroutine function performing the upstream call
+
+        Returns:
+            The shared result (exceptions are shared too)
+
+        Raises:
+            DeadlineExceeded: The caller's budget ran out before the shared call finished
+        """
+        full_key = f"{namespace}:{key}"
+        deadline = request_deadline.get()
+        call = self._calls.get(full_key)
+        collapsed = call is not None
+
+        if call is None:
+            # Our own handle on the task's context, so joiners can extend its budget
+            context = contextvars.copy_context()
+            call = {
+                "task": asyncio.create_task(fn(), context=context),
+                "context": context,
+                "deadline": deadline,
+                "started_with": deadline,
+                "waiters": 0,
+            }
+            self._calls[full_key] = call
+
+            def forget(_task, full_key=full_key, call=call):
+                # Later callers start a fresh call once this one has finished
+                if self._calls.get(full_key) is call:
+                    del self._calls[full_key]
+
+            call["task"].add_done_callback(forget)
+        else:
+            self._extend_deadline(call, deadline)
+
+        self._record(namespace, full_key, collapsed)
+        call["waiters"] += 1
+        try:
+            left = upstream.remaining()
+            if left is None:
+                return await asyncio.shield(call["task"])
+            try:
+                return await asyncio.wait_for(asyncio.shield(call["task"]), max(left, 0.0))
+            except asyncio.TimeoutError:
+                if call["task"].done() or not upstream.expired():
+                    raise
+                raise DeadlineExceeded(f"Request deadline exceeded while waiting for a shared {namespace} call")
+        except DeadlineExceeded:
+            # The call ran out of a shorter budget than ours before we could
+            # extend it (e.g. admission control failed fast): start our own
+            if collapsed and call["task"].done() and self._later(call["started_with"], deadline) \
+                    and not upstream.expired():
+                return await self.do(namespace, key, fn)
+            raise
+        finally:
+            call["waiters"] -= 1
+            if call["waiters"] == 0 and not call["task"].done():
+                # Every caller was cancelled: nobody needs the result any more
+                call["task"].cancel()
+                if self._calls.get(full_key) is call:
+                    del self._calls[full_key]
+
+    def stats(self) -> Dict:
+        """Collapsed-call counters per namespace and for the most recent keys"""
+        keys = sorted(self._keys.items(), key=lambda item: item[1]["collapsed"], reverse=True)
+        return {
+            "in_flight": len(self._calls),
+            "namespaces": {
+                namespace: {
+                    **totals,
+                    "collapse_rate": round(totals["collapsed"] / totals["calls"], 4) if totals["calls"] else 0.0,
+                }
+                for namespace, totals in self._namespaces.items()
+            },
+            # Keys are request hashes; shorten them for display
+            "top_keys": [
+                {"key": key[:48], **counters}
+                for key, counters in keys[:20]
+                if counters["collapsed"]
+            ],
+        }
+
+
+# Create singleton instance
+singleflight = SingleFlight()
@@ -0,0 +1,25 @@
+"""
+Storage Service - Where the service keeps its on-disk state
+Relative data paths (caches, indexes, the local vector store) resolve against
+the service root (the directory holding run.py), not the working directory,
+so importing app.services from elsewhere never scatters data/ directories.
+"""
+
+import os
+
+SERVICE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def data_path(path: str) -> str:
+    """
+    Resolve a configured data path
+
+    Args:
+        path: Absolute path, path relative to the service root, or empty
+
+    Returns:
+        Absolute path, or "" when the setting is empty (in-memory only)
+    """
+    if not path:
+        return ""
+    return os.path.join(SERVICE_ROOT, os.path.expanduser(path))
@@ -0,0 +1,323 @@
+"""
+Upstream Service - Call policy shared by every upstream dependency
+(Ollama generation, Ollama embeddings, ChromaDB)
+
+Circuit breakers: each dependency has a breaker. After
+CIRCUIT_FAILURE_THRESHOLD consecutive transport failures (connection errors,
+timeouts) it opens, and calls fail immediately with CircuitOpen (HTTP 503)
+instead of each waiting out its own timeout. After CIRCUIT_OPEN_SECONDS one
+trial call is let through (half-open): success closes the breaker, failure
+opens it again.
+
+Deadline budget: the HTTP middleware gives every request a deadline
+(X-Request-Timeout header, else REQUEST_DEADLINE; ingestion uses
+INGEST_DEADLINE). Each stage - embedding, vector store, queueing for and
+running generation - gets min(its own timeout, time left), so a request
+fails with DeadlineExceeded (HTTP 504) when its budget is spent instead of
+stacking fixed timeouts. Timeouts caused by the budget running out are not
+held against the dependency.
+
+Hedging: hedged() sends a duplicate of a slow call after a delay and takes
+whichever answers first (used for small, latency-sensitive embedding calls).
+"""
+
+import aiohttp
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+from dotenv import load_dotenv
+from app.services.metrics_service import metrics
+from app.services.logging_service import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+
+# Request budgets in seconds (0 = none)
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "120"))
+INGEST_DEADLINE = float(os.getenv("INGEST_DEADLINE", "0"))
+# Upper bound for a budget asked for through X-Request-Timeout
+REQUEST_DEADLINE_MAX = float(os.getenv("REQUEST_DEADLINE_MAX", "600"))
+
+# Breaker states (also the value of the state gauge)
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+_STATE_NAMES = {CLOSED: "closed", HALF_OPEN: "half_open", OPEN: "open"}
+
+T = TypeVar("T")
+
+# Monotonic time by which the current request must finish (None = no budget)
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class UpstreamError(Exception):
+    """A call refused by the upstream policy; carries the HTTP status to answer with"""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Optional[Dict[str, str]]:
+        return {"Retry-After": str(self.retry_after)} if self.retry_after is not None else None
+
+
+class CircuitOpen(UpstreamError):
+    """The dependency's breaker is open"""
+
+    status_code = 503
+
+
+class DeadlineExceeded(UpstreamError):
+    """The request's deadline budget is spent"""
+
+    status_code = 504
+
+
+def is_transport_error(error: BaseException) -> bool:
+    """Default breaker failure test: timeouts and connection-level errors"""
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError, OSError))
+
+
+# ---------- circuit breaker ----------
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open trial call"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS
+    ):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.rejected = 0
+        metrics.set_circuit_state(name, CLOSED)
+
+    def _set(self, state: int) -> None:
+        if state != self.state:
+            (logger.warning if state == OPEN else logger.info)("Circuit breaker state changed", extra={
+                "dependency": self.name, "from": _STATE_NAMES[self.state], "to": _STATE_NAMES[state],
+            })
+            self.state = state
+            metrics.set_circuit_state(self.name, state)
+            metrics.count_circuit_transition(self.name, _STATE_NAMES[state])
+
+    def retry_after(self) -> int:
+        """Seconds until the breaker lets a trial call through"""
+        return max(1, math.ceil(self.opened_at + self.open_seconds - time.monotonic()))
+
+    def check(self) -> None:
+        """
+        Fail fast while open (no trial accounting: cheap to call before queueing)
+
+        Raises:
+            CircuitOpen: Breaker open and not yet cooled down
+        """
+        if self.state == OPEN and time.monotonic() - self.opened_at < self.open_seconds:
+            self.rejected += 1
+            metrics.count_circuit_rejected(self.name)
+            raise CircuitOpen(f"{self.name} circuit is open after repeated failures", self.retry_after())
+
+    def allow(self) -> bool:
+        """
+        Admit a call; True if it is the half-open trial
+
+        Raises:
+            CircuitOpen: Breaker open, or a trial call is already running
+        """
+        self.check()
+        if self.state == OPEN:
+            self._set(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self.trial_running:
+                self.rejected += 1
+                metrics.count_circuit_rejected(self.name)
+                raise CircuitOpen(f"{self.name} circuit is half-open, trial call in progress", 1)
+            self.trial_running = True
+            return True
+        return False
+
+    def record_success(self, trial: bool) -> None:
+        if trial:
+            self.trial_running = False
+        self.failures = 0
+        self._set(CLOSED)
+
+    def record_failure(self, trial: bool) -> None:
+        if trial:
+            self.trial_running = False
+        self.failures += 1
+        if trial or self.failures >= self.failure_threshold:
+            self.failures = 0
+            self.opened_at = time.monotonic()
+            self._set(OPEN)
+
+    def release(self, trial: bool) -> None:
+        """The call ended without telling anything about the dependency"""
+        if trial:
+            self.trial_running = False
+
+    def stats(self) -> Dict:
+        return {
+            "state": _STATE_NAMES[self.state],
+            "consecutive_failures": self.failures,
+            "retry_after_s": self.retry_after() if self.state == OPEN else None,
+            "rejected": self.rejected,
+        }
+
+
+# ---------- policy ----------
+
+class UpstreamPolicy:
+    """Deadline budget, breakers per dependency, guarded calls and hedging"""
+
+    def __init__(self):
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    @staticmethod
+    def set_deadline(seconds: Optional[float]) -> None:
+        """Give the current request/task `seconds` from now (None or <= 0: no budget)"""
+        request_deadline.set(time.monotonic() + seconds if seconds and seconds > 0 else None)
+
+    @staticmethod
+    def remaining() -> Optional[float]:
+        """Seconds left in the current budget (None when there is no budget)"""
+        deadline = request_deadline.get()
+        return None if deadline is None else deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        """True once the current budget is spent"""
+        left = self.remaining()
+        return left is not None and left <= 0
+
+    def timeout(self, default: float, dependency: str) -> float:
+        """
+        Timeout for the next call to a dependency: its own timeout, capped by the budget
+
+        Raises:
+            DeadlineExceeded: Nothing is left of the budget
+        """
+        left = self.remaining()
+        if left is None:
+            return default
+        if left <= 0:
+            metrics.count_deadline_exceeded(dependency)
+            raise DeadlineExceeded(f"Request deadline exceeded before calling {dependency}")
+        return min(default, left)
+
+    def breaker(self, dependency: str) -> CircuitBreaker:
+        breaker = self.breakers.get(dependency)
+        if breaker is None:
+            breaker = self.breakers[dependency] = CircuitBreaker(dependency)
+        return breaker
+
+    def check(self, dependency: str) -> None:
+        """Raise CircuitOpen right away if the dependency's breaker is open"""
+        self.breaker(dependency).check()
+
+    @asynccontextmanager
+    async def guard(
+        self,
+        dependency: str,
+        is_failure: Callable[[BaseException], bool] = is_transport_error
+    ) -> AsyncIterator[None]:
+        """
+        Run one upstream call under the dependency's breaker
+
+        Failures (per `is_failure`) count towards opening the breaker unless
+        the request's budget ran out, in which case the call's timeout
+        surfaces as DeadlineExceeded. Other exceptions, e.g. an API error the
+        dependency answered with, count as the dependency being up.
+
+        Usage:
+            async with upstream.guard("chromadb"):
+                ...
+
+        Raises:
+            CircuitOpen: The breaker is open
+            DeadlineExceeded: The call timed out because the budget ran out
+        """
+        breaker = self.breaker(dependency)
+        trial = breaker.allow()
+        try:
+            yield
+        except UpstreamError:
+            # Refused by a policy further down (e.g. an exhausted budget)
+            breaker.release(trial)
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError) and self.expired():
+                breaker.release(trial)
+                metrics.count_deadline_exceeded(dependency)
+                raise DeadlineExceeded(f"Request deadline exceeded while calling {dependency}") from e
+            if is_failure(e):
+                breaker.record_failure(trial)
+            else:
+                breaker.record_success(trial)
+            raise
+        except BaseException:
+            # Cancelled: no verdict on the dependency
+            breaker.release(trial)
+            raise
+        else:
+            breaker.record_success(trial)
+
+    @staticmethod
+    async def hedged(call: Callable[[], Awaitable[T]], after: float, dependency: str = "upstream") -> T:
+        """
+        Run `call`, and a second copy of it if the first has not answered
+        after `after` seconds; return the first successful result
+
+        The loser is cancelled. Only for idempotent calls.
+        """
+        primary = asyncio.ensure_future(call())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=after)
+            if done:
+                return primary.result()
+
+            hedge = asyncio.ensure_future(call())
+            tasks.add(hedge)
+            metrics.count_hedge(dependency, "sent")
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        metrics.count_hedge(dependency, "won" if task is hedge else "lost")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict:
+        """Breaker state per dependency and the configured budgets"""
+        return {
+            "breakers": {name: breaker.stats() for name, breaker in self.breakers.items()},
+            "request_deadline_s": REQUEST_DEADLINE or None,
+            "ingest_deadline_s": INGEST_DEADLINE or None,
+        }
+
+
+# Create singleton instance
+upstream = UpstreamPolicy()
@@ -0,0 +1,134 @@
+"""
+Vector Store Service - Common interface for vector storage backends
+Ingestion and retrieval only talk to this interface, so the ChromaDB server
+and the embedded local index are interchangeable (see VECTOR_STORE_BACKEND)
+"""
+
+from abc import ABC, abstractmethod
+import os
+from typing import Any, List, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "chroma" (default, ChromaDB server over HTTP) or "local" (in-process NumPy index)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma").lower()
+
+# Characters that would let a name leave the local backends' directory
+_UNSAFE_NAME_CHARS = ("/", "\\", "\x00")
+
+
+class InvalidCollectionName(ValueError):
+    """A collection name that is unsafe as a file name (answered with HTTP 400)"""
+
+
+class VectorStore(ABC):
+    """
+    Contract shared by every vector storage backend
+
+    Query results use ChromaDB's shape: a dict of "ids", "documents",
+    "metadatas" and "distances", each holding one list per query embedding.
+    Smaller distances are closer. Metadata filters ("where") use ChromaDB's
+    syntax; every backend supports equality ({"key": value}, {"key": {"$eq":
+    value}}) and membership ({"key": {"$in": [...]}}).
+    """
+
+    @staticmethod
+    def safe_name(collection_name: str) -> str:
+        """
+        Clean collection name (ChromaDB has strict naming rules)
+
+        The result is also used as a file name by the local backends, so
+        names that could leave their directory (empty, "/", "..") are refused.
+        Anything else is passed on as before; ChromaDB reports its own
+        naming errors.
+
+        Raises:
+            InvalidCollectionName: The cleaned name is unsafe as a file name
+        """
+        safe_name = collection_name.replace(" ", "_").replace("-", "_").lower()[:63]
+        if not safe_name.strip(".") or ".." in safe_name or any(c in safe_name for c in _UNSAFE_NAME_CHARS):
+            raise InvalidCollectionName(
+                f"Invalid collection name '{collection_name}': it must not be empty or contain '/', '\\' or '..'"
+            )
+        return safe_name
+
+    def close(self) -> None:
+        """Release resources (called on shutdown)"""
+
+    @abstractmethod
+    async def check_health(self) -> bool:
+        """True when the store is reachable"""
+
+    @abstractmethod
+    async def get_or_create_collection(self, collection_name: str, metadata: Optional[Dict] = None) -> str:
+        """Get or create a collection and return its (safe) name"""
+
+    @abstractmethod
+    async def add_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        ids: List[str],
+        embeddings: List[List[float]]
+    ) -> None:
+        """Add documents; IDs that already exist are left unchanged"""
+
+    @abstractmethod
+    async def upsert_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        ids: List[str],
+        embeddings: List[List[float]]
+    ) -> None:
+        """Insert documents, or overwrite those whose IDs already exist"""
+
+    @abstractmethod
+    async def query(
+        self,
+        collection_name: str,
+        query_texts: List[str],
+        query_embeddings: Optional[List[List[float]]] = None,
+        n_results: int = 5
+    ) -> Dict:
+        """Nearest neighbours of each query embedding"""
+
+    @abstractmethod
+    async def get_collection(self, collection_name: str) -> Any:
+        """Get a collection by name (raises if it does not exist)"""
+
+    @abstractmethod
+    async def delete_collection(self, collection_name: str) -> None:
+        """Delete a collection"""
+
+    @abstractmethod
+    async def list_collections(self) -> List[str]:
+        """List all available collections"""
+
+    @abstractmethod
+    async def has_collection(self, collection_name: str) -> bool:
+        """True if the collection exists (raises, unlike list_collections, when the store cannot tell)"""
+
+    @abstractmethod
+    async def get_collection_stats(self, collection_name: str) -> Dict:
+        """Name and document count of a collection"""
+
+    @abstractmethod
+    async def get_documents(self, collection_name: str, where: Dict) -> Dict:
+        """IDs and metadata ({"ids", "metadatas"}) of documents matching a metadata filter"""
+
+    @abstractmethod
+    async def update_metadatas(self, collection_name: str, ids: List[str], metadatas: List[Dict]) -> None:
+        """Replace the metadata of existing documents (embeddings are kept)"""
+
+    @abstractmethod
+    async def delete_documents(
+        self,
+        collection_name: str,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict] = None
+    ) -> None:
+        """Delete documents by ID and/or metadata filter (unknown IDs are ignored)"""
@@ -0,0 +1,5 @@
+"""
+Benchmarks for the KaryoAI LLM service
+Run from llm-service/llm-ms, e.g. `python -m benchmarks.bench_http_pool`;
+`python -m benchmarks.suite` runs the hot-path suite against baseline.json
+"""
@@ -0,0 +1,109 @@
+"""
+Benchmark: throughput as Ollama backends are added to the pools
+
+Starts 1, 2, 4, ... stub Ollama servers (own processes), each serving
+--parallel requests at a time with --latency seconds of simulated model
+time, like a real Ollama box with OLLAMA_NUM_PARALLEL. Then it drives:
+
+    generation  ollama_service.chat through the scheduler and generation pool
+                (GENERATION_CONCURRENCY slots per live backend)
+    embedding   EmbeddingService._embed_batch through the embedding pool
+
+with more concurrent callers than the backends can serve, and reports
+requests/s, the speedup over one backend and how the requests were spread.
+Linear scaling means the speedup tracks the backend count.
+
+Usage:
+    python -m benchmarks.bench_backend_pool [--backends 1 2 4] [--requests 200]
+        [--latency 0.05] [--parallel 2] [--concurrency 64]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+# Quiet, cache-free configuration; must be set before the app is imported
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+os.environ.setdefault("LOG_LEVEL", "warning")
+
+from app.services.embedding_service import EmbeddingService, EMBEDDING_MODEL
+from app.services.http_service import http_service
+from app.services.ollama_pool_service import embedding_pool, generation_pool
+from app.services.ollama_service import ollama_service
+from app.services.scheduler_service import generation_scheduler
+from benchmarks.stub_ollama import start_stub_process
+
+
+async def _run(call, total: int, concurrency: int) -> float:
+    """Issue `total` calls with bounded concurrency; return elapsed seconds"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await call(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - start
+
+
+async def _generate(i: int) -> None:
+    # Distinct prompts: no response cache or single-flight sharing
+    await ollama_service.chat(
+        messages=[{"role": "user", "content": f"request {i}"}],
+        temperature=0.7,
+        max_tokens=16,
+        cache=False
+    )
+
+
+async def _embed(i: int) -> None:
+    await EmbeddingService._embed_batch([f"text {i}"], EMBEDDING_MODEL)
+
+
+def _spread(pool) -> str:
+    return " / ".join(str(backend["requests"]) for backend in pool.stats()["backends"])
+
+
+async def main(counts, total: int, latency: float, parallel: int, concurrency: int) -> None:
+    processes = [start_stub_process(latency, parallel) for _ in range(max(counts))]
+    urls = [url for _, url in processes]
+    await http_service.start()
+    generation_scheduler.queue_size = max(generation_scheduler.queue_size, concurrency)
+
+    print(f"requests={total} latency={latency * 1000:.0f}ms parallel/backend={parallel} "
+          f"callers={concurrency} slots/backend={generation_scheduler.per_backend}")
+    print(f"{'backends':>8}{'workload':>12}{'req/s':>10}{'speedup':>10}   requests per backend")
+    try:
+        single = {}
+        for count in counts:
+            for name, pool, call in (("generation", generation_pool, _generate), ("embedding", embedding_pool, _embed)):
+                # Fresh backend state (and request counters) for every run
+                pool.backends = []
+                pool.set_urls(urls[:count])
+                await pool.refresh()
+                await call(-1)  # Warm-up: open a connection
+                for backend in pool.backends:
+                    backend.requests = 0
+
+                elapsed = await _run(call, total, concurrency)
+                rate = total / elapsed
+                single.setdefault(name, rate)
+                print(f"{count:>8}{name:>12}{rate:>10.1f}{rate / single[name]:>9.2f}x   {_spread(pool)}")
+    finally:
+        await http_service.close()
+        for process, _ in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated model time per request (s)")
+    parser.add_argument("--parallel", type=int, default=2, help="Requests each stub serves at once")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent callers")
+    args = parser.parse_args()
+    asyncio.run(main(args.backends, args.requests, args.latency, args.parallel, args.concurrency))
@@ -0,0 +1,89 @@
+"""
+Benchmark: fixed-size chunk_text vs the boundary-aware chunking engine
+
+Chunks a large synthetic document (paragraphs of varied sentences) with both
+strategies and reports chunk count, embedding calls, duplicated text from
+overlap, mid-word cuts and chunking time.
+
+Usage:
+    python -m benchmarks.bench_chunking [--size-mb 5] [--repeat 3]
+"""
+
+import argparse
+import math
+import random
+import time
+
+from app.services.chunking_service import BoundaryChunker, Chunker, FixedSizeChunker
+from app.services.embedding_service import EMBEDDING_BATCH_SIZE
+
+_WORDS = (
+    "the karyotype analysis sample chromosome report invoice total amount patient "
+    "laboratory result shows normal abnormal translocation deletion region band "
+    "reference value measured within range formula NPV_rate INV-2024-0042 SKU-88123"
+).split()
+
+
+def _document(size: int, seed: int = 7) -> str:
+    """Deterministic prose-like text of about `size` characters"""
+    rng = random.Random(seed)
+    paragraphs, total = [], 0
+    while total < size:
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            words = [rng.choice(_WORDS) for _ in range(rng.randint(5, 30))]
+            sentences.append(" ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"]))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def _measure(chunker: Chunker, text: str, repeat: int) -> dict:
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = list(chunker.chunks(text))
+        best = min(best, time.perf_counter() - start)
+
+    embedded = sum(len(chunk.text) for chunk in chunks)
+    # A cut between two word characters splits a word
+    mid_word = sum(
+        1 for chunk in chunks[:-1]
+        if chunk.end < len(text) and text[chunk.end - 1].isalnum() and text[chunk.end].isalnum()
+    )
+    sentence_end = sum(1 for chunk in chunks if chunk.text[-1] in ".?!")
+    return {
+        "chunks": len(chunks),
+        "embedding_calls": math.ceil(len(chunks) / EMBEDDING_BATCH_SIZE),
+        "embedded_chars": embedded,
+        "duplicated": embedded / len(text) - 1,
+        "mid_word": mid_word / max(len(chunks) - 1, 1),
+        "sentence_end": sentence_end / max(len(chunks), 1),
+        "seconds": best,
+    }
+
+
+def main(size_mb: float, repeat: int) -> None:
+    text = _document(int(size_mb * 1024 * 1024))
+    fixed = FixedSizeChunker()
+    boundary = BoundaryChunker()
+    results = {"fixed": _measure(fixed, text, repeat), "boundary": _measure(boundary, text, repeat)}
+
+    print(f"document={len(text):,} chars  embedding_batch_size={EMBEDDING_BATCH_SIZE}")
+    print(f"  fixed:    {fixed.describe()}")
+    print(f"  boundary: {boundary.describe()}")
+    print(f"{'':10}{'chunks':>10}{'embed calls':>13}{'embedded':>14}{'duplicated':>12}{'mid-word':>10}{'sentence end':>14}{'time':>10}")
+    for name, r in results.items():
+        print(
+            f"{name:10}{r['chunks']:>10,}{r['embedding_calls']:>13,}{r['embedded_chars']:>14,}"
+            f"{r['duplicated']:>11.1%}{r['mid_word']:>10.1%}{r['sentence_end']:>14.1%}{r['seconds'] * 1000:>8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.size_mb, args.repeat)
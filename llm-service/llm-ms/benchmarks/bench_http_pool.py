@@ -0,0 +1,73 @@
+"""
+Benchmark: per-request ClientSession vs the shared pooled session
+
+Measures the overhead the old code paid for opening a new aiohttp session
+(and TCP connection) on every Ollama call.
+
+Usage:
+    python -m benchmarks.bench_http_pool [--requests 500] [--concurrency 16]
+"""
+
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from app.services.http_service import HTTPClientService
+from benchmarks.stub_ollama import start_stub_process
+
+
+async def _run(call, total: int, concurrency: int) -> float:
+    """Issue `total` calls with bounded concurrency; return elapsed seconds"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await call(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - start
+
+
+async def main(total: int, concurrency: int) -> None:
+    process, base_url = start_stub_process()
+    url = f"{base_url}/api/embeddings"
+    timeout = aiohttp.ClientTimeout(total=60)
+
+    async def per_request_session(i: int):
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, json={"model": "m", "prompt": f"text {i}"}, timeout=timeout) as response:
+                await response.json()
+
+    pool = HTTPClientService()
+    await pool.start()
+
+    async def pooled_session(i: int):
+        async with pool.session.post(url, json={"model": "m", "prompt": f"text {i}"}, timeout=timeout) as response:
+            await response.json()
+
+    try:
+        # Warm up both paths once
+        await per_request_session(0)
+        await pooled_session(0)
+
+        baseline = await _run(per_request_session, total, concurrency)
+        pooled = await _run(pooled_session, total, concurrency)
+    finally:
+        await pool.close()
+        process.terminate()
+
+    print(f"requests={total} concurrency={concurrency}")
+    print(f"  session per request: {baseline * 1000 / total:.3f} ms/request ({total / baseline:.0f} req/s)")
+    print(f"  shared pool:         {pooled * 1000 / total:.3f} ms/request ({total / pooled:.0f} req/s)")
+    print(f"  speedup:             {baseline / pooled:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
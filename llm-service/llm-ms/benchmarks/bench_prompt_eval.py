@@ -0,0 +1,82 @@
+"""
+Benchmark: prompt-eval time per turn, flattened /api/generate vs native /api/chat
+
+Replays the same multi-turn conversation twice against a real Ollama instance:
+once the old way (messages flattened into a "System:/User:/Assistant:" string
+sent to /api/generate) and once through OllamaService.chat (/api/chat with
+keep_alive). With /api/chat the unchanged system prompt and history form a
+stable prefix, so Ollama only evaluates the new turn's tokens.
+
+Usage:
+    OLLAMA_BASE_URL=http://localhost:18080 python -m benchmarks.bench_prompt_eval [--turns 6]
+"""
+
+import argparse
+import asyncio
+
+from app.services.http_service import http_service
+from app.services.ollama_service import ollama_service
+
+SYSTEM_PROMPT = (
+    "You are KaryoAI's business writing assistant. You help small teams draft invoices, "
+    "offer letters and marketing emails. Answer briefly and keep a professional tone. "
+) * 8
+
+QUESTIONS = [
+    "Suggest a subject line for an invoice reminder.",
+    "Make it friendlier.",
+    "Now write a two-line email body to go with it.",
+    "Translate the subject line to Spanish.",
+    "Give me three hashtags for a product launch post.",
+    "Summarize everything we discussed in one sentence.",
+    "Which subject line would you pick and why?",
+    "Shorten that answer.",
+]
+
+
+def _flatten(messages) -> str:
+    """The pre-/api/chat prompt format"""
+    parts = [f"{m['role'].capitalize()}: {m['content']}" for m in messages]
+    parts.append("Assistant:")
+    return "\n\n".join(parts)
+
+
+async def _conversation(use_chat: bool, turns: int, max_tokens: int):
+    """Run one conversation and return per-turn (prompt_tokens, prompt_eval_ms)"""
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    timings = []
+    for question in QUESTIONS[:turns]:
+        messages.append({"role": "user", "content": question})
+        if use_chat:
+            result = await ollama_service.chat(messages, temperature=0, max_tokens=max_tokens)
+        else:
+            result = await ollama_service.generate(_flatten(messages), temperature=0, max_tokens=max_tokens)
+        messages.append({"role": "assistant", "content": result["response"]})
+        timings.append((result["prompt_tokens"], result["prompt_eval_ms"]))
+    return timings
+
+
+async def main(turns: int, max_tokens: int) -> None:
+    try:
+        # Load the model once so neither run pays the cold-start cost
+        await ollama_service.chat([{"role": "user", "content": "hi"}], max_tokens=1)
+
+        before = await _conversation(False, turns, max_tokens)
+        after = await _conversation(True, turns, max_tokens)
+    finally:
+        await http_service.close()
+
+    print(f"{'turn':>4} | {'generate: tokens':>16} {'ms':>9} | {'chat: tokens':>12} {'ms':>9}")
+    for turn, ((b_tokens, b_ms), (a_tokens, a_ms)) in enumerate(zip(before, after), start=1):
+        print(f"{turn:>4} | {b_tokens:>16} {b_ms:>9.1f} | {a_tokens:>12} {a_ms:>9.1f}")
+    total_before = sum(ms for _, ms in before)
+    total_after = sum(ms for _, ms in after)
+    print(f"total prompt-eval: generate {total_before:.1f} ms, chat {total_after:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--max-tokens", type=int, default=48)
+    args = parser.parse_args()
+    asyncio.run(main(min(args.turns, len(QUESTIONS)), args.max_tokens))
@@ -0,0 +1,105 @@
+"""
+Benchmark: query-embedding micro-batching, throughput versus added latency
+
+Drives EmbeddingService.generate_embedding (the query path of /api/rag/query
+and /api/rag/retrieve) with open-loop Poisson arrivals of distinct texts at
+each --rate, once per batching window, against a stub Ollama that serves
+--parallel requests at a time and charges --latency per request plus
+--per-text per input text (a batched call is cheaper than the same texts
+sent one by one, as on a real embedding model).
+
+For each window it reports the rate actually served, p50/p99 latency, how
+many /api/embed calls were made and their mean size. Window 0 is the
+unbatched baseline: a larger window buys fewer upstream calls (and more
+headroom before the backend saturates) with up to one window of extra
+latency per query; pick the smallest window that keeps up with the load.
+
+Usage:
+    python -m benchmarks.bench_query_batching [--windows 0 1 2 5 10]
+        [--rates 200 800] [--requests 1000] [--latency 0.01]
+        [--per-text 0.0005] [--parallel 4] [--max-size 32]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+# Quiet, cache-free configuration; must be set before the app is imported
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+os.environ.setdefault("LOG_LEVEL", "warning")
+
+from app.services.embedding_service import EmbeddingService, query_batcher
+from app.services.http_service import http_service
+from app.services.ollama_pool_service import embedding_pool
+from benchmarks.stub_ollama import start_stub_process
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def _run(rate: float, total: int, offset: int):
+    """Open-loop load: `total` arrivals at `rate`/s; returns (elapsed, latencies)"""
+    latencies = []
+
+    async def one(i: int) -> None:
+        start = time.perf_counter()
+        await EmbeddingService.generate_embedding(f"query {offset + i}")
+        latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    start = time.perf_counter()
+    arrival = start
+    for i in range(total):
+        arrival += random.expovariate(rate)
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(i)))
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - start, latencies
+
+
+async def main(windows, rates, total: int, latency: float, per_text: float, parallel: int, max_size: int) -> None:
+    process, url = start_stub_process(latency, parallel, per_text=per_text)
+    embedding_pool.set_urls([url])
+    await http_service.start()
+    random.seed(0)
+
+    print(f"requests={total} latency={latency * 1000:g}ms+{per_text * 1000:g}ms/text "
+          f"parallel={parallel} max_size={max_size}")
+    print(f"{'rate':>6}{'window':>8}{'served/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'calls':>7}{'avg batch':>11}")
+    try:
+        await EmbeddingService.generate_embedding("warm-up")
+        offset = 0
+        for rate in rates:
+            for window in windows:
+                query_batcher.window = window / 1000
+                query_batcher.max_size = max_size
+                before = query_batcher.stats()["batches"]
+                offset += total
+                elapsed, latencies = await _run(rate, total, offset)
+                calls = query_batcher.stats()["batches"] - before if window > 0 else total
+                print(f"{rate:>6g}{window:>8g}{total / elapsed:>10.1f}"
+                      f"{_percentile(latencies, 0.5) * 1000:>9.1f}{_percentile(latencies, 0.99) * 1000:>9.1f}"
+                      f"{calls:>7}{total / calls:>11.1f}")
+    finally:
+        await http_service.close()
+        process.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 1, 2, 5, 10], help="Batch windows (ms)")
+    parser.add_argument("--rates", type=float, nargs="+", default=[200, 800], help="Arrival rates (queries/s)")
+    parser.add_argument("--requests", type=int, default=1000, help="Queries per run")
+    parser.add_argument("--latency", type=float, default=0.01, help="Simulated time per /api/embed call (s)")
+    parser.add_argument("--per-text", type=float, default=0.0005, help="Simulated time per embedded text (s)")
+    parser.add_argument("--parallel", type=int, default=4, help="Requests the stub serves at once")
+    parser.add_argument("--max-size", type=int, default=32, help="Largest batch")
+    args = parser.parse_args()
+    asyncio.run(main(args.windows, args.rates, args.requests, args.latency, args.per_text, args.parallel, args.max_size))
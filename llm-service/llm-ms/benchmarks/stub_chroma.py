@@ -0,0 +1,109 @@
+"""
+Stub vector store - an in-memory stand-in for the ChromaDB server, so the
+ingest and query paths can be timed offline without the cost of a real index
+
+It implements the VectorStore contract (ChromaDB-shaped results, where
+filters) with an optional artificial latency per call. Queries return the
+first n documents of a collection with fixed distances: benchmarks measure
+the service around the store, not the nearest-neighbour search.
+"""
+
+import asyncio
+import sys
+from typing import Any, Dict, List, Optional
+
+from app.services.local_vector_service import matches
+from app.services.vector_store_service import VectorStore
+
+
+class StubVectorStore(VectorStore):
+    """Dict-backed VectorStore"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        # collection -> id -> (document, metadata)
+        self.collections: Dict[str, Dict[str, tuple]] = {}
+
+    async def _delay(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _collection(self, collection_name: str) -> Dict[str, tuple]:
+        name = self.safe_name(collection_name)
+        if name not in self.collections:
+            raise Exception(f"Collection {name} does not exist.")
+        return self.collections[name]
+
+    async def check_health(self) -> bool:
+        return True
+
+    async def get_or_create_collection(self, collection_name: str, metadata: Optional[Dict] = None) -> str:
+        await self._delay()
+        name = self.safe_name(collection_name)
+        self.collections.setdefault(name, {})
+        return name
+
+    async def add_documents(self, collection_name, documents, metadatas, ids, embeddings) -> None:
+        await self._delay()
+        rows = self._collection(collection_name)
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            rows.setdefault(doc_id, (document, metadata))
+
+    async def upsert_documents(self, collection_name, documents, metadatas, ids, embeddings) -> None:
+        await self._delay()
+        rows = self._collection(collection_name)
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            rows[doc_id] = (document, metadata)
+
+    async def query(self, collection_name, query_texts, query_embeddings=None, n_results=5) -> Dict:
+        await self._delay()
+        rows = list(self._collection(collection_name).items())[:n_results]
+        queries = len(query_embeddings or query_texts)
+        return {
+            "ids": [[doc_id for doc_id, _ in rows]] * queries,
+            "documents": [[document for _, (document, _) in rows]] * queries,
+            "metadatas": [[metadata for _, (_, metadata) in rows]] * queries,
+            "distances": [[0.1 + 0.01 * i for i in range(len(rows))]] * queries,
+        }
+
+    async def get_collection(self, collection_name: str) -> Any:
+        return self._collection(collection_name)
+
+    async def delete_collection(self, collection_name: str) -> None:
+        self.collections.pop(self.safe_name(collection_name), None)
+
+    async def list_collections(self) -> List[str]:
+        return list(self.collections)
+
+    async def has_collection(self, collection_name: str) -> bool:
+        return self.safe_name(collection_name) in self.collections
+
+    async def get_collection_stats(self, collection_name: str) -> Dict:
+        return {"name": self.safe_name(collection_name), "document_count": len(self._collection(collection_name))}
+
+    async def get_documents(self, collection_name: str, where: Dict) -> Dict:
+        await self._delay()
+        found = [(doc_id, metadata) for doc_id, (_, metadata) in self._collection(collection_name).items()
+                 if matches(metadata, where)]
+        return {"ids": [doc_id for doc_id, _ in found], "metadatas": [metadata for _, metadata in found]}
+
+    async def update_metadatas(self, collection_name: str, ids: List[str], metadatas: List[Dict]) -> None:
+        await self._delay()
+        rows = self._collection(collection_name)
+        for doc_id, metadata in zip(ids, metadatas):
+            if doc_id in rows:
+                rows[doc_id] = (rows[doc_id][0], metadata)
+
+    async def delete_documents(self, collection_name, ids=None, where=None) -> None:
+        await self._delay()
+        rows = self._collection(collection_name)
+        for doc_id in list(rows):
+            if (ids is None or doc_id in ids) and (where is None or matches(rows[doc_id][1], where)):
+                del rows[doc_id]
+
+
+def install(store: VectorStore) -> None:
+    """Make every loaded app module use `store` as its chroma_service"""
+    for name, module in list(sys.modules.items()):
+        if name.startswith("app") and hasattr(module, "chroma_service"):
+            module.chroma_service = store
@@ -0,0 +1,152 @@
+"""
+Stub Ollama server - a tiny aiohttp app that mimics the Ollama endpoints
+the service uses, so benchmarks can run offline without a model
+"""
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import socket
+import time
+from typing import List, Optional
+from aiohttp import web
+
+EMBEDDING_DIM = 768
+DEFAULT_MODELS = ["llama3.2:latest", "nomic-embed-text:latest"]
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> list:
+    """Deterministic pseudo-embedding derived from the text hash"""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [((digest[i % len(digest)] / 255.0) - 0.5) for i in range(dim)]
+
+
+def create_app(
+    latency: float = 0.0,
+    parallel: int = 0,
+    models: Optional[List[str]] = None,
+    per_text: float = 0.0
+) -> web.Application:
+    """
+    Build the stub application
+
+    Args:
+        latency: Artificial per-request delay in seconds
+        parallel: Requests served at once, the rest wait like on a real
+            Ollama (OLLAMA_NUM_PARALLEL); 0 = unlimited
+        models: Model names reported by /api/tags
+        per_text: Extra delay per input text of an /api/embed request
+    """
+    slots = asyncio.Semaphore(parallel) if parallel else None
+
+    async def busy(seconds: float = latency) -> None:
+        """Simulated model time"""
+        if slots is None:
+            await asyncio.sleep(seconds)
+        else:
+            async with slots:
+                await asyncio.sleep(seconds)
+
+    async def tags(request: web.Request) -> web.Response:
+        return web.json_response({"models": [{"name": name} for name in (models or DEFAULT_MODELS)]})
+
+    async def embeddings(request: web.Request) -> web.Response:
+        body = await request.json()
+        await busy()
+        return web.json_response({"embedding": fake_embedding(body.get("prompt", ""))})
+
+    async def embed(request: web.Request) -> web.Response:
+        body = await request.json()
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        await busy(latency + per_text * len(texts))
+        return web.json_response({"embeddings": [fake_embedding(text) for text in texts]})
+
+    async def _reply(request: web.Request, body: dict, wrap) -> web.StreamResponse:
+        """Answer with two tokens, streamed as NDJSON unless stream is false"""
+        await busy()
+        final = {"model": body.get("model"), "done": True, "eval_count": 2,
+                 "prompt_eval_count": 8, "prompt_eval_duration": 1_000_000}
+        if body.get("stream", True):
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            for token in ("stub ", "response"):
+                line = {"model": body.get("model"), "done": False, **wrap(token)}
+                await response.write((json.dumps(line) + "\n").encode())
+            await response.write((json.dumps({**final, **wrap("")}) + "\n").encode())
+            await response.write_eof()
+            return response
+        return web.json_response({**final, **wrap("stub response")})
+
+    async def generate(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        return await _reply(request, body, lambda text: {"response": text})
+
+    async def chat(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        return await _reply(request, body, lambda text: {"message": {"role": "assistant", "content": text}})
+
+    app = web.Application()
+    app.router.add_get("/api/tags", tags)
+    app.router.add_post("/api/embeddings", embeddings)
+    app.router.add_post("/api/embed", embed)
+    app.router.add_post("/api/generate", generate)
+    app.router.add_post("/api/chat", chat)
+    return app
+
+
+async def start_stub(port: int = 0, latency: float = 0.0):
+    """
+    Start the stub server on localhost
+
+    Returns:
+        (runner, base_url) - call `await runner.cleanup()` when done
+    """
+    runner = web.AppRunner(create_app(latency))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{bound_port}"
+
+
+def _serve(port: int, latency: float, parallel: int, models: Optional[List[str]], per_text: float) -> None:
+    """Process entry point for start_stub_process()"""
+    web.run_app(create_app(latency, parallel, models, per_text), host="127.0.0.1", port=port, print=None)
+
+
+def start_stub_process(
+    latency: float = 0.0,
+    parallel: int = 0,
+    models: Optional[List[str]] = None,
+    per_text: float = 0.0
+):
+    """
+    Start the stub server in a separate process so it does not compete
+    with the code under test for the event loop
+
+    Args:
+        latency, parallel, models, per_text: See create_app()
+
+    Returns:
+        (process, base_url) - call `process.terminate()` when done
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    process = multiprocessing.Process(target=_serve, args=(port, latency, parallel, models, per_text), daemon=True)
+    process.start()
+
+    # Wait until the port accepts connections
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    return process, f"http://127.0.0.1:{port}"
@@ -0,0 +1,363 @@
+"""
+Benchmark suite: repeatable timings of the service hot paths, checked
+against a JSON baseline
+
+Cases:
+    chunk_text          EmbeddingService.chunk_text on a multi-MB document
+    format_results      Result formatting in QueryService.retrieve_context
+                        (vector + BM25 rows, fused by reciprocal rank)
+    prompt_build        RAG prompt construction (QueryService._build_messages)
+    context_pack        Token-budgeted packing of 10 retrieved chunks, some
+                        overlapping (context_packer.pack)
+    schema_validation   Request/response model validation (app.models.schemas
+                        and the RAG route models)
+    ingest_e2e          POST /api/rag/ingest through the whole app
+    query_e2e           POST /api/rag/query through the whole app
+
+The end-to-end cases run offline: Ollama is replaced by the stub server in
+stub_ollama (own process) and ChromaDB by the in-memory StubVectorStore.
+
+Each case is timed `samples` times (after one warm-up); a sample runs the
+case `number` times and records the mean. The best (minimum) per-call time
+is compared with the baseline, since noise only ever adds time, and the run
+fails (exit code 1) when a case is slower than baseline * (1 + threshold).
+Baselines are machine-specific: record one on the machine that runs the
+comparison.
+
+Usage:
+    python -m benchmarks.suite                      # compare with benchmarks/baseline.json
+    python -m benchmarks.suite --update-baseline    # record a new baseline
+    python -m benchmarks.suite --only chunk_text prompt_build --threshold 0.3
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+# Offline, quiet, cache-free configuration; must be set before the app is imported
+os.environ.setdefault("VECTOR_STORE_BACKEND", "local")
+os.environ.setdefault("LOCAL_VECTOR_STORE_PATH", tempfile.mkdtemp(prefix="bench-vectors-"))
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+os.environ.setdefault("LEXICAL_INDEX_PATH", "")
+os.environ.setdefault("LOG_LEVEL", "warning")
+
+import httpx
+
+from app.models.schemas import ChatRequest, ChatResponse
+from app.routes.rag import IngestDocumentRequest, RAGQueryRequest, RAGQueryResponse
+from app.services.embedding_service import EmbeddingService
+from app.services.query_service import QueryService
+from app.services.context_service import context_packer
+from benchmarks.bench_chunking import _document
+from benchmarks.stub_chroma import StubVectorStore, install
+from benchmarks.stub_ollama import start_stub_process
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+
+
+class Case:
+    """A benchmark: setup() returns the (sync or async) callable to time"""
+
+    def __init__(self, name: str, setup: Callable, samples: int, number: int, e2e: bool):
+        self.name = name
+        self.setup = setup
+        self.samples = samples
+        self.number = number
+        self.e2e = e2e
+
+
+CASES: Dict[str, Case] = {}
+
+
+def case(name: str, samples: int = 7, number: int = 1, e2e: bool = False):
+    """Register a benchmark case"""
+    def register(setup: Callable) -> Callable:
+        CASES[name] = Case(name, setup, samples, number, e2e)
+        return setup
+    return register
+
+
+class Environment:
+    """Stub Ollama process, stub vector store and an ASGI client for the e2e cases"""
+
+    def __init__(self, ollama_latency: float, store_latency: float):
+        self.ollama_latency = ollama_latency
+        self.store_latency = store_latency
+        self.process = None
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def start(self) -> None:
+        self.process, url = start_stub_process(self.ollama_latency)
+
+        from app.main import app
+        from app.services.http_service import http_service
+        from app.services.ollama_pool_service import embedding_pool, generation_pool
+
+        generation_pool.set_urls([url])
+        embedding_pool.set_urls([url])
+
+        install(StubVectorStore(self.store_latency))
+        await http_service.start()
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://bench",
+            timeout=60
+        )
+
+    async def stop(self) -> None:
+        from app.services.http_service import http_service
+
+        if self.client is not None:
+            await self.client.aclose()
+            await http_service.close()
+        if self.process is not None:
+            self.process.terminate()
+
+
+# ---------- cases ----------
+
+def _chunks(count: int, text_size: int = 1000) -> List[Dict]:
+    """Synthetic retrieved chunks (vector-formatted)"""
+    body = _document(text_size, seed=3)
+    return [
+        {
+            "rank": i + 1,
+            "chunk_id": f"doc{i % 7}_{i:016x}",
+            "document_id": f"doc{i % 7}",
+            "chunk_number": i,
+            "text": body,
+            "distance": 0.1 + i / 1000,
+            "similarity": 0.9 - i / 1000,
+            "metadata": {"document_id": f"doc{i % 7}", "chunk_number": i},
+        }
+        for i in range(count)
+    ]
+
+
+@case("chunk_text", samples=5)
+def chunk_text(env: Environment):
+    text = _document(5 * 1024 * 1024)
+    return lambda: EmbeddingService.chunk_text(text)
+
+
+@case("format_results", number=1000)
+def format_results(env: Environment):
+    depth = 20
+    body = _document(1000, seed=3)
+    results = {
+        "ids": [[f"doc{i % 7}_{i:016x}" for i in range(depth)]],
+        "documents": [[body] * depth],
+        "metadatas": [[{"document_id": f"doc{i % 7}", "chunk_number": i} for i in range(depth)]],
+        "distances": [[0.1 + i / 100 for i in range(depth)]],
+    }
+    # BM25 hits overlap half of the vector hits
+    hits = [(f"doc{i % 7}_{i:016x}", 10.0 - i / 10, body, {"document_id": f"doc{i % 7}", "chunk_number": i})
+            for i in range(depth // 2, depth + depth // 2)]
+
+    def run():
+        QueryService._fuse(
+            QueryService._format_vector_results(results),
+            QueryService._format_lexical_results(hits),
+            5
+        )
+    return run
+
+
+@case("prompt_build", number=5000)
+def prompt_build(env: Environment):
+    chunks = _chunks(5)
+    return lambda: QueryService._build_messages("What does the karyotype report say about band 11q23?", chunks)
+
+
+@case("context_pack", number=1000)
+def context_pack(env: Environment):
+    pieces = list(EmbeddingService.chunk_text(_document(30_000, seed=5)))
+    # Runs of neighbouring chunks from two documents, interleaved by relevance
+    chunks = [
+        {
+            "document_id": f"doc{i % 2}",
+            "chunk_number": piece.number,
+            "text": piece.text,
+            "metadata": {"document_id": f"doc{i % 2}", "chunk_number": piece.number,
+                         "start": piece.start, "end": piece.end},
+        }
+        for i, piece in enumerate(pieces[n] for n in (4, 12, 5, 13, 3, 20, 6, 14, 21, 30))
+    ]
+    return lambda: context_packer.pack(chunks)
+
+
+@case("schema_validation", number=1000)
+def schema_validation(env: Environment):
+    chat = {
+        "messages": [{"role": "system", "content": "You are helpful."}]
+        + [{"role": "user" if i % 2 == 0 else "assistant", "content": "Some message text " * 20} for i in range(10)],
+        "temperature": 0.2,
+        "max_tokens": 256,
+    }
+    ingest = {"document_id": "doc-1", "document_text": _document(20_000), "metadata": {"source": "bench"}}
+    query = {"query": "Which invoices mention SKU-88123?", "n_context_chunks": 5}
+    answer = {"answer": "stub response " * 20, "context": _chunks(5), "source_count": 5,
+              "model": "llama3.2:latest", "cached": False}
+
+    def run():
+        ChatRequest.model_validate(chat)
+        ChatResponse(response="stub response " * 20, model="llama3.2:latest", tokens_used=40).model_dump_json()
+        IngestDocumentRequest.model_validate(ingest)
+        RAGQueryRequest.model_validate(query)
+        RAGQueryResponse.model_validate(answer).model_dump_json()
+    return run
+
+
+@case("ingest_e2e", samples=9, number=3, e2e=True)
+def ingest_e2e(env: Environment):
+    text = _document(50_000)
+    counter = iter(range(10 ** 9))
+
+    async def run():
+        # A new document in a fresh collection each time: every chunk is
+        # embedded and stored, and the timing does not grow with the store
+        n = next(counter)
+        response = await env.client.post("/api/rag/ingest", json={
+            "document_id": f"bench-{n}",
+            "document_text": text,
+            "collection_name": f"bench_ingest_{n}",
+        })
+        response.raise_for_status()
+    return run
+
+
+@case("query_e2e", samples=7, number=10, e2e=True)
+async def query_e2e(env: Environment):
+    await env.client.post("/api/rag/ingest", json={
+        "document_id": "bench-corpus",
+        "document_text": _document(50_000),
+        "collection_name": "bench_query",
+    })
+
+    async def run():
+        response = await env.client.post("/api/rag/query", json={
+            "query": "Which invoices mention SKU-88123?",
+            "collection_name": "bench_query",
+            "use_cache": False,
+        })
+        response.raise_for_status()
+    return run
+
+
+# ---------- runner ----------
+
+async def _time(case_: Case, env: Environment) -> Dict:
+    """Median and best seconds per call of one case"""
+    fn = case_.setup(env)
+    if inspect.isawaitable(fn):
+        fn = await fn
+    is_async = inspect.iscoroutinefunction(fn)
+
+    async def sample() -> float:
+        start = time.perf_counter()
+        for _ in range(case_.number):
+            if is_async:
+                await fn()
+            else:
+                fn()
+        return (time.perf_counter() - start) / case_.number
+
+    await sample()  # Warm-up
+    timings = [await sample() for _ in range(case_.samples)]
+    return {
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "samples": case_.samples,
+        "number": case_.number,
+    }
+
+
+def _compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Print a comparison table (best times); return the names of regressed cases"""
+    regressions = []
+    print(f"{'case':20}{'median':>12}{'min':>12}{'baseline':>12}{'change':>10}")
+    for name, result in results.items():
+        base = baseline.get(name, {}).get("min_s")
+        line = f"{name:20}{result['median_s'] * 1000:>10.3f}ms{result['min_s'] * 1000:>10.3f}ms"
+        if base:
+            change = result["min_s"] / base - 1
+            flag = ""
+            if change > threshold:
+                regressions.append(name)
+                flag = "  REGRESSION"
+            line += f"{base * 1000:>10.3f}ms{change:>+10.1%}{flag}"
+        else:
+            line += f"{'-':>12}{'new':>10}"
+        print(line)
+    return regressions
+
+
+async def run(names: List[str], ollama_latency: float, store_latency: float) -> Dict:
+    env = Environment(ollama_latency, store_latency)
+    try:
+        if any(CASES[name].e2e for name in names):
+            await env.start()
+        return {name: await _time(CASES[name], env) for name in names}
+    finally:
+        await env.stop()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=list(CASES), help="Cases to run (default: all)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown vs. baseline before failing (0.25 = 25%%)")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--ollama-latency", type=float, default=0.0, help="Stub Ollama delay per request (s)")
+    parser.add_argument("--store-latency", type=float, default=0.0, help="Stub vector store delay per call (s)")
+    args = parser.parse_args()
+
+    names = args.only or list(CASES)
+    results = asyncio.run(run(names, args.ollama_latency, args.store_latency))
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "cases": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("cases", {})
+    regressions = _compare(results, baseline, args.threshold)
+
+    if args.update_baseline:
+        # Keep baseline entries of cases that were not run
+        report["cases"] = {**baseline, **results}
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"FAILED: {', '.join(regressions)} slower than baseline by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
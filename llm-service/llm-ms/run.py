@@ -25,4 +25,7 @@ if __name__ == "__main__":
         host=host,
         port=port,
         reload=True,
+        # Requests are logged as JSON by the app's middleware
+        access_log=False,
+        log_level=os.getenv("LOG_LEVEL", "info").lower(),
     )
\ No newline at end of file
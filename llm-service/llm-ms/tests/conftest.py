@@ -0,0 +1,18 @@
+"""
+Shared test setup: an offline configuration (local vector store, no disk
+caches), set before the app is imported
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("VECTOR_STORE_BACKEND", "local")
+os.environ.setdefault("LOCAL_VECTOR_STORE_PATH", tempfile.mkdtemp(prefix="test-vectors-"))
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+os.environ.setdefault("RESPONSE_CACHE_PATH", "")
+os.environ.setdefault("LEXICAL_INDEX_PATH", "")
+os.environ.setdefault("LOG_LEVEL", "warning")
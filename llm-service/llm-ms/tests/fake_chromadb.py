@@ -0,0 +1,113 @@
+"""
+In-memory stand-in for the chromadb client, used to run the ChromaDB backend
+without a server
+
+It mirrors the client behaviour ChromaDBService relies on: add() skips IDs
+that already exist, upsert() overwrites them, delete() ignores unknown IDs,
+"where" filters support equality and $in, and query() returns one list per
+query embedding. Distances are cosine distances.
+"""
+
+import types
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def _matches(metadata: Dict, where: Optional[Dict]) -> bool:
+    for key, condition in (where or {}).items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    def __init__(self, name: str, metadata: Optional[Dict] = None):
+        self.name = name
+        self.metadata = metadata or {}
+        # id -> (document, metadata, embedding), in insertion order
+        self.rows: Dict[str, tuple] = {}
+
+    def count(self) -> int:
+        return len(self.rows)
+
+    def add(self, ids, documents, metadatas, embeddings) -> None:
+        for doc_id, document, metadata, embedding in zip(ids, documents, metadatas, embeddings):
+            if doc_id not in self.rows:
+                self.rows[doc_id] = (document, dict(metadata or {}), list(embedding))
+
+    def upsert(self, ids, documents, metadatas, embeddings) -> None:
+        for doc_id, document, metadata, embedding in zip(ids, documents, metadatas, embeddings):
+            self.rows[doc_id] = (document, dict(metadata or {}), list(embedding))
+
+    def update(self, ids, metadatas) -> None:
+        for doc_id, metadata in zip(ids, metadatas):
+            if doc_id in self.rows:
+                document, _, embedding = self.rows[doc_id]
+                self.rows[doc_id] = (document, dict(metadata or {}), embedding)
+
+    def get(self, where=None, include=None) -> Dict:
+        ids = [doc_id for doc_id, (_, metadata, _) in self.rows.items() if _matches(metadata, where)]
+        return {"ids": ids, "metadatas": [self.rows[doc_id][1] for doc_id in ids]}
+
+    def delete(self, ids=None, where=None) -> None:
+        for doc_id in list(self.rows):
+            if ids is not None and doc_id not in ids:
+                continue
+            if where is not None and not _matches(self.rows[doc_id][1], where):
+                continue
+            del self.rows[doc_id]
+
+    def query(self, query_embeddings=None, query_texts=None, n_results: int = 10) -> Dict:
+        if query_embeddings is None:
+            raise ValueError("The fake client cannot embed query_texts")
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        ids = list(self.rows)
+        matrix = np.asarray([self.rows[doc_id][2] for doc_id in ids], dtype=np.float64).reshape(len(ids), -1)
+        if len(ids):
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        for query in query_embeddings:
+            query = np.asarray(query, dtype=np.float64)
+            distances = 1 - matrix @ (query / np.linalg.norm(query)) if len(ids) else np.zeros(0)
+            ranked = np.argsort(distances, kind="stable")[:n_results]
+            results["ids"].append([ids[row] for row in ranked])
+            results["documents"].append([self.rows[ids[row]][0] for row in ranked])
+            results["metadatas"].append([self.rows[ids[row]][1] for row in ranked])
+            results["distances"].append([float(distances[row]) for row in ranked])
+        return results
+
+
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.collections: Dict[str, FakeCollection] = {}
+
+    def heartbeat(self) -> int:
+        return 1
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None) -> FakeCollection:
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(name, metadata)
+        return self.collections[name]
+
+    def get_collection(self, name: str) -> FakeCollection:
+        if name not in self.collections:
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.collections[name]
+
+    def delete_collection(self, name: str) -> None:
+        if self.collections.pop(name, None) is None:
+            raise ValueError(f"Collection {name} does not exist.")
+
+    def list_collections(self) -> List[FakeCollection]:
+        return list(self.collections.values())
+
+
+# Importable as `chromadb` (see test_vector_store_contract.py)
+module = types.ModuleType("chromadb")
+module.HttpClient = FakeClient
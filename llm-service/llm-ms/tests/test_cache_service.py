@@ -0,0 +1,63 @@
+"""
+TieredCache disk tier: opened lazily, bounded in size, and degrading to a miss
+on SQLite errors
+"""
+
+import asyncio
+import sqlite3
+
+from app.services.cache_service import TieredCache, _pack_json, _unpack_json
+
+
+def _cache(tmp_path, disk_max_entries: int) -> TieredCache:
+    cache = TieredCache(
+        name="test",
+        max_entries=2,
+        path=str(tmp_path / "cache.sqlite3"),
+        encode=_pack_json,
+        decode=_unpack_json,
+        disk_max_entries=disk_max_entries
+    )
+    cache.open()
+    return cache
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    cache = _cache(tmp_path, disk_max_entries=10)
+
+    async def fill():
+        for i in range(25):
+            await cache.set(f"key{i}", i)
+        return await cache.get_many(["key0", "key24"])
+
+    found = asyncio.run(fill())
+
+    assert cache.disk.count() <= 10
+    assert cache.stats()["disk_evictions"] > 0
+    # The oldest entries go first
+    assert found == {"key24": 24}
+
+
+def test_disk_read_error_is_a_miss(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, disk_max_entries=10)
+    asyncio.run(cache.set("key", "value"))
+    cache.memory.clear()
+
+    def locked(keys):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache.disk, "get_many", locked)
+
+    assert asyncio.run(cache.get("key")) is None
+    assert cache.stats()["disk_errors"] == 1
+
+
+def test_disk_tier_is_opened_by_open_only(tmp_path):
+    path = tmp_path / "nested" / "cache.sqlite3"
+    cache = TieredCache(name="test", max_entries=2, path=str(path), encode=_pack_json, decode=_unpack_json)
+
+    assert cache.disk is None and not path.parent.exists()
+    cache.open()
+    assert path.exists()
+    cache.close()
+    assert cache.disk is None
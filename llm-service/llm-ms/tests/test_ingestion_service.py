@@ -0,0 +1,56 @@
+"""
+Bulk ingestion against the local vector store, with a stand-in embedder
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.chroma_service import chroma_service
+from app.services.embedding_service import embedding_service
+from app.services.ingestion_service import ingestion_service
+
+
+@pytest.fixture(autouse=True)
+def fake_embeddings(monkeypatch):
+    async def embed(texts, model=None, batch_size=None):
+        return [[float(len(text)), 1.0, float(sum(map(ord, text)) % 97)] for text in texts]
+
+    monkeypatch.setattr(embedding_service, "generate_embeddings_batch", embed)
+
+
+def _stored_texts(collection: str, document_id: str):
+    async def fetch():
+        stored = await chroma_service.get_documents(collection, {"document_id": document_id})
+        collection_ = await chroma_service.get_collection(collection)
+        return sorted(collection_.text(collection_.rows[chunk_id]) for chunk_id in stored["ids"])
+
+    return asyncio.run(fetch())
+
+
+def test_batch_keeps_only_the_last_entry_of_a_document():
+    collection = "batch_duplicates"
+    documents = [
+        {"document_id": "d1", "document_text": "First version of the document.", "collection_name": collection},
+        {"document_id": "d2", "document_text": "Another document.", "collection_name": collection},
+        {"document_id": "d1", "document_text": "Second version, which wins.", "collection_name": collection},
+    ]
+
+    result = asyncio.run(ingestion_service.ingest_documents_batch(documents))
+
+    statuses = [entry["status"] for entry in result["results"]]
+    assert statuses == ["failed", "success", "success"]
+    assert "Superseded by entry 2" in result["results"][0]["error"]
+    assert (result["succeeded"], result["failed"]) == (2, 1)
+    assert _stored_texts(collection, "d1") == ["Second version, which wins."]
+
+
+def test_same_document_in_different_collections_is_not_a_duplicate():
+    documents = [
+        {"document_id": "d1", "document_text": "Text in the first collection.", "collection_name": "batch_one"},
+        {"document_id": "d1", "document_text": "Text in the second collection.", "collection_name": "batch_two"},
+    ]
+
+    result = asyncio.run(ingestion_service.ingest_documents_batch(documents))
+
+    assert result["succeeded"] == 2
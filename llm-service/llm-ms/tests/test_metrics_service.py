@@ -0,0 +1,29 @@
+"""
+MetricsService: the caller-supplied collection label stays bounded
+"""
+
+from app.services.metrics_service import OTHER_COLLECTION, MetricsService, current_collection
+
+
+def test_collections_past_the_cap_share_one_label():
+    metrics = MetricsService(enabled=True, max_collections=2)
+
+    labels = [metrics.collection_label(name) for name in ("a", "b", "c", "a", "d")]
+
+    assert labels == ["a", "b", OTHER_COLLECTION, "a", OTHER_COLLECTION]
+    assert metrics.collections == {"a", "b"}
+
+
+def test_stage_and_set_collection_use_the_bounded_label():
+    metrics = MetricsService(enabled=True, max_collections=1)
+
+    assert metrics.stage("vector_query", collection="first").labels[2] == "first"
+    assert metrics.stage("vector_query", collection="second").labels[2] == OTHER_COLLECTION
+
+    token = current_collection.set("")
+    try:
+        metrics.set_collection("third")
+        assert current_collection.get() == OTHER_COLLECTION
+        assert metrics.stage("embedding").labels[2] == OTHER_COLLECTION
+    finally:
+        current_collection.reset(token)
@@ -0,0 +1,55 @@
+"""
+GenerationScheduler: a wait cut short by the request budget is a 504, one
+cut short by the lane's own limit a 429
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.scheduler_service import GenerationScheduler, SchedulerRejected
+from app.services.upstream_service import DeadlineExceeded, upstream
+
+
+def _scheduler(max_wait: float = 60.0, service_time=None) -> GenerationScheduler:
+    scheduler = GenerationScheduler(
+        concurrency=1,
+        queue_size=8,
+        max_wait={"interactive": max_wait, "default": max_wait, "bulk": max_wait}
+    )
+    scheduler.service_time = service_time
+    return scheduler
+
+
+def _wait_behind_busy_slot(scheduler: GenerationScheduler, budget=None):
+    async def run():
+        await scheduler.acquire()  # Holds the only slot
+        upstream.set_deadline(budget)
+        await scheduler.acquire()
+
+    asyncio.run(run())
+
+
+def test_wait_cut_short_by_budget_is_deadline_exceeded():
+    scheduler = _scheduler()
+
+    with pytest.raises(DeadlineExceeded):
+        _wait_behind_busy_slot(scheduler, budget=0.05)
+    assert scheduler.stats()["lanes"]["default"]["deadline_exceeded"] == 1
+    assert scheduler.queued == 0
+
+
+def test_estimate_beyond_budget_is_deadline_exceeded():
+    scheduler = _scheduler(service_time=1.0)
+
+    with pytest.raises(DeadlineExceeded):
+        _wait_behind_busy_slot(scheduler, budget=0.5)
+
+
+def test_wait_cut_short_by_lane_limit_is_rejected():
+    scheduler = _scheduler(max_wait=0.05)
+
+    with pytest.raises(SchedulerRejected) as error:
+        _wait_behind_busy_slot(scheduler, budget=30)
+    assert error.value.retry_after >= 1
+    assert scheduler.stats()["lanes"]["default"]["rejected_wait"] == 1
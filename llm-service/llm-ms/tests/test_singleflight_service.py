@@ -0,0 +1,79 @@
+"""
+SingleFlight deadlines: the shared call runs under the waiters' budget, and
+one impatient caller does not fail the others; and the request key that
+decides which callers collapse
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.ollama_service import ollama_service
+from app.services.scheduler_service import generation_scheduler
+from app.services.singleflight_service import SingleFlight
+from app.services.upstream_service import DeadlineExceeded, upstream
+
+
+def test_impatient_caller_does_not_fail_the_others():
+    singleflight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.2)
+        return 42
+
+    async def caller(budget):
+        upstream.set_deadline(budget)
+        try:
+            return await singleflight.do("test", "key", fetch)
+        except DeadlineExceeded:
+            return "deadline"
+
+    async def main():
+        return await asyncio.gather(caller(0.05), caller(30))
+
+    assert asyncio.run(main()) == ["deadline", 42]
+
+
+def test_shared_call_gets_the_latest_waiter_deadline():
+    singleflight = SingleFlight()
+    seen = []
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        seen.append(upstream.remaining())
+        return 1
+
+    async def caller(budget):
+        upstream.set_deadline(budget)
+        return await singleflight.do("test", "key", fetch)
+
+    async def main():
+        return await asyncio.gather(caller(1), caller(30))
+
+    assert asyncio.run(main()) == [1, 1]
+    assert seen[0] > 1
+
+
+def test_chat_fails_fast_on_a_saturated_scheduler(monkeypatch):
+    # Every slot busy and each generation expected to take 5s
+    monkeypatch.setattr(generation_scheduler, "running", generation_scheduler.concurrency)
+    monkeypatch.setattr(generation_scheduler, "service_time", 5.0)
+
+    async def main():
+        upstream.set_deadline(1.0)
+        await ollama_service.chat([{"role": "user", "content": "hello"}], temperature=0.7)
+
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+    assert time.perf_counter() - started < 0.5
+
+
+def test_request_key_keeps_surrounding_whitespace():
+    def key(content):
+        return ollama_service._request_key([{"role": "user", "content": content}], 0.0, 100, "model")
+
+    assert key("hello\r\nworld") == key("hello\nworld")
+    assert key("hello") != key(" hello")
+    assert key("hello") != key("hello\n")
@@ -0,0 +1,273 @@
+"""
+Contract tests every VectorStore backend must pass (add_documents, upsert,
+query, delete_documents, metadata filters and collection naming), plus
+persistence and compaction of the local backend
+
+The ChromaDB backend runs against the in-memory client in fake_chromadb.
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+from app.services import local_vector_service
+from app.services.local_vector_service import LocalVectorStore
+from app.services.vector_store_service import InvalidCollectionName, VectorStore
+from tests import fake_chromadb
+
+COLLECTION = "contract_docs"
+
+# Unit vectors along the axes: document i is closest to query axis i
+EMBEDDINGS = [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0]]
+IDS = ["doc_a_0", "doc_a_1", "doc_b_0"]
+DOCUMENTS = ["alpha text", "beta text", "gamma text"]
+METADATAS = [
+    {"document_id": "doc_a", "chunk_number": 0},
+    {"document_id": "doc_a", "chunk_number": 1},
+    {"document_id": "doc_b", "chunk_number": 0},
+]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def _chroma_store(monkeypatch) -> VectorStore:
+    # Same service code, in-memory client instead of a server
+    monkeypatch.setitem(sys.modules, "chromadb", fake_chromadb.module)
+    from app.services.chroma_service import ChromaDBService
+    return ChromaDBService()
+
+
+@pytest.fixture(params=["local", "chroma"])
+def store(request, tmp_path, monkeypatch):
+    if request.param == "local":
+        vector_store = LocalVectorStore(str(tmp_path / "vectors"))
+    else:
+        vector_store = _chroma_store(monkeypatch)
+    run(vector_store.get_or_create_collection(COLLECTION))
+    run(vector_store.add_documents(COLLECTION, DOCUMENTS, METADATAS, IDS, EMBEDDINGS))
+    yield vector_store
+    vector_store.close()
+
+
+def _count(store: VectorStore, collection: str = COLLECTION) -> int:
+    return run(store.get_collection_stats(collection))["document_count"]
+
+
+def test_query_returns_chroma_shaped_results(store):
+    results = run(store.query(COLLECTION, ["q"], query_embeddings=[[0.0, 1.0, 0.1, 0.0], [0.0, 0.0, 1.0, 0.0]], n_results=2))
+
+    assert set(results) >= {"ids", "documents", "metadatas", "distances"}
+    for key in ("ids", "documents", "metadatas", "distances"):
+        assert len(results[key]) == 2
+        assert all(len(row) == 2 for row in results[key])
+    assert results["ids"][0][0] == "doc_a_1"
+    assert results["documents"][0][0] == "beta text"
+    assert results["metadatas"][0][0] == METADATAS[1]
+    assert results["ids"][1][0] == "doc_b_0"
+    # Nearest first
+    assert results["distances"][0][0] <= results["distances"][0][1]
+
+
+def test_query_caps_n_results_at_collection_size(store):
+    results = run(store.query(COLLECTION, ["q"], query_embeddings=[[1.0, 0.0, 0.0, 0.0]], n_results=10))
+
+    assert sorted(results["ids"][0]) == sorted(IDS)
+
+
+def test_add_skips_existing_ids(store):
+    run(store.add_documents(COLLECTION, ["replaced"], [{"document_id": "other"}], ["doc_a_0"], [[0.0, 0.0, 0.0, 1.0]]))
+
+    results = run(store.query(COLLECTION, ["q"], query_embeddings=[[1.0, 0.0, 0.0, 0.0]], n_results=1))
+    assert results["ids"][0] == ["doc_a_0"]
+    assert results["documents"][0] == ["alpha text"]
+    assert _count(store) == 3
+
+
+def test_upsert_overwrites_existing_ids(store):
+    run(store.upsert_documents(
+        COLLECTION, ["new alpha", "delta text"],
+        [{"document_id": "doc_a", "chunk_number": 9}, {"document_id": "doc_c", "chunk_number": 0}],
+        ["doc_a_0", "doc_c_0"], [[0.0, 0.0, 0.0, 1.0], [0.0, 0.0, 1.0, 1.0]]
+    ))
+
+    assert _count(store) == 4
+    results = run(store.query(COLLECTION, ["q"], query_embeddings=[[0.0, 0.0, 0.0, 1.0]], n_results=1))
+    assert results["ids"][0] == ["doc_a_0"]
+    assert results["documents"][0] == ["new alpha"]
+    assert results["metadatas"][0][0]["chunk_number"] == 9
+
+
+def test_delete_by_ids_ignores_unknown_ids(store):
+    run(store.delete_documents(COLLECTION, ids=["doc_a_0", "missing"]))
+
+    assert _count(store) == 2
+    results = run(store.query(COLLECTION, ["q"], query_embeddings=[[1.0, 0.0, 0.0, 0.0]], n_results=3))
+    assert "doc_a_0" not in results["ids"][0]
+
+
+def test_delete_by_where_filter(store):
+    run(store.delete_documents(COLLECTION, where={"document_id": "doc_a"}))
+
+    assert _count(store) == 1
+    assert run(store.get_documents(COLLECTION, {"document_id": "doc_b"}))["ids"] == ["doc_b_0"]
+
+
+@pytest.mark.parametrize("where, expected", [
+    ({"document_id": "doc_a"}, ["doc_a_0", "doc_a_1"]),
+    ({"document_id": {"$eq": "doc_b"}}, ["doc_b_0"]),
+    ({"document_id": {"$in": ["doc_b", "doc_x"]}}, ["doc_b_0"]),
+    ({"document_id": "doc_a", "chunk_number": 1}, ["doc_a_1"]),
+    ({"document_id": "missing"}, []),
+])
+def test_get_documents_where_filters(store, where, expected):
+    result = run(store.get_documents(COLLECTION, where))
+
+    assert sorted(result["ids"]) == expected
+    assert len(result["metadatas"]) == len(expected)
+
+
+def test_update_metadatas_keeps_embeddings(store):
+    run(store.update_metadatas(COLLECTION, ["doc_b_0", "missing"], [{"document_id": "doc_b", "stale": True}, {}]))
+
+    assert run(store.get_documents(COLLECTION, {"stale": True}))["ids"] == ["doc_b_0"]
+    results = run(store.query(COLLECTION, ["q"], query_embeddings=[[0.0, 0.0, 1.0, 0.0]], n_results=1))
+    assert results["ids"][0] == ["doc_b_0"]
+
+
+def test_collection_names_are_cleaned(store):
+    run(store.get_or_create_collection("Contract Docs-2"))
+
+    assert "contract_docs_2" in run(store.list_collections())
+    run(store.delete_collection("contract docs 2"))
+    assert "contract_docs_2" not in run(store.list_collections())
+
+
+def test_has_collection(store):
+    assert run(store.has_collection("Contract Docs"))
+    assert not run(store.has_collection("missing_docs"))
+
+
+def test_chroma_has_collection_raises_when_unreachable(monkeypatch):
+    store = _chroma_store(monkeypatch)
+
+    def unreachable():
+        raise ConnectionError("connection refused")
+
+    # list_collections reports an outage as "no collections"; has_collection must not
+    monkeypatch.setattr(store.client, "list_collections", unreachable)
+    assert run(store.list_collections()) == []
+    with pytest.raises(ConnectionError):
+        run(store.has_collection(COLLECTION))
+    store.close()
+
+
+@pytest.mark.parametrize("name", ["../escape", "a/b", "", ".."])
+def test_unsafe_collection_names_are_refused(store, name):
+    with pytest.raises(InvalidCollectionName):
+        run(store.get_or_create_collection(name))
+
+
+def test_long_collection_names_are_truncated():
+    assert VectorStore.safe_name("x" * 80) == "x" * 63
+
+
+def test_local_store_reloads_from_disk(tmp_path):
+    path = str(tmp_path / "vectors")
+    store = LocalVectorStore(path)
+    run(store.get_or_create_collection(COLLECTION, {"type": "documents"}))
+    run(store.add_documents(COLLECTION, DOCUMENTS, METADATAS, IDS, EMBEDDINGS))
+    run(store.upsert_documents(COLLECTION, ["new beta"], [METADATAS[1]], ["doc_a_1"], [[0.0, 1.0, 0.0, 0.0]]))
+    run(store.delete_documents(COLLECTION, ids=["doc_b_0"]))
+    before = run(store.query(COLLECTION, ["q"], query_embeddings=[[0.0, 1.0, 0.0, 0.0]], n_results=3))
+
+    reloaded = LocalVectorStore(path)
+
+    assert reloaded.collections[COLLECTION].metadata == {"type": "documents"}
+    assert _count(reloaded) == 2
+    assert run(reloaded.query(COLLECTION, ["q"], query_embeddings=[[0.0, 1.0, 0.0, 0.0]], n_results=3)) == before
+
+
+def test_local_store_compacts_dead_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_vector_service, "LOCAL_VECTOR_COMPACT_MIN_DEAD", 2)
+    path = str(tmp_path / "vectors")
+    store = LocalVectorStore(path)
+    run(store.get_or_create_collection(COLLECTION))
+    run(store.add_documents(COLLECTION, DOCUMENTS, METADATAS, IDS, EMBEDDINGS))
+    collection = store.collections[COLLECTION]
+    old_vectors_file = collection.vectors_file
+
+    run(store.delete_documents(COLLECTION, where={"document_id": "doc_a"}))
+
+    # Two dead rows outnumber the one live row: rewritten into a new generation
+    assert collection.generation == 1
+    assert not os.path.exists(old_vectors_file)
+    assert os.path.getsize(collection.vectors_file) == 1 * 4 * 4
+    assert collection.ids == ["doc_b_0"]
+
+    reloaded = LocalVectorStore(path)
+    results = run(reloaded.query(COLLECTION, ["q"], query_embeddings=[[0.0, 0.0, 1.0, 0.0]], n_results=3))
+    assert results["ids"] == [["doc_b_0"]]
+    assert results["documents"] == [["gamma text"]]
+    assert reloaded.collections[COLLECTION].generation == 1
+
+
+def test_local_store_compacts_overwritten_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_vector_service, "LOCAL_VECTOR_COMPACT_MIN_DEAD", 2)
+    store = LocalVectorStore(str(tmp_path / "vectors"))
+    run(store.get_or_create_collection(COLLECTION))
+    run(store.add_documents(COLLECTION, DOCUMENTS, METADATAS, IDS, EMBEDDINGS))
+    collection = store.collections[COLLECTION]
+
+    for i in range(10):
+        run(store.upsert_documents(COLLECTION, [f"version {i}"] * 3, METADATAS, IDS, EMBEDDINGS))
+
+    # Upserted rows are dead too: the files stay bounded by the live rows
+    assert collection.generation > 0
+    assert len(collection.ids) <= 2 * len(IDS)
+    assert os.path.getsize(collection.vectors_file) <= 2 * len(IDS) * 4 * 4
+    results = run(store.query(COLLECTION, ["q"], query_embeddings=[[1.0, 0.0, 0.0, 0.0]], n_results=1))
+    assert results["documents"] == [["version 9"]]
+
+
+def test_local_store_keeps_texts_out_of_the_log(tmp_path):
+    path = str(tmp_path / "vectors")
+    store = LocalVectorStore(path)
+    run(store.get_or_create_collection(COLLECTION))
+    run(store.add_documents(COLLECTION, DOCUMENTS, METADATAS, IDS, EMBEDDINGS))
+    collection = store.collections[COLLECTION]
+
+    with open(collection.log_file, encoding="utf-8") as f:
+        log = f.read()
+    assert "alpha text" not in log
+
+    reloaded = LocalVectorStore(path)
+    assert all(isinstance(text, tuple) for text in reloaded.collections[COLLECTION].texts)
+    results = run(reloaded.query(COLLECTION, ["q"], query_embeddings=[[0.0, 0.0, 1.0, 0.0]], n_results=1))
+    assert results["documents"] == [["gamma text"]]
+
+
+def test_local_store_loads_logs_with_inline_texts(tmp_path):
+    path = tmp_path / "vectors" / COLLECTION
+    path.mkdir(parents=True)
+    (path / "vectors.0.f32").write_bytes(local_vector_service.np.asarray(EMBEDDINGS, dtype="float32").tobytes())
+    (path / "log.jsonl").write_text(
+        json.dumps({"op": "create", "metadata": {}, "generation": 0}) + "\n"
+        + json.dumps({"op": "add", "dim": 4, "ids": IDS, "documents": DOCUMENTS, "metadatas": METADATAS}) + "\n",
+        encoding="utf-8"
+    )
+
+    store = LocalVectorStore(str(tmp_path / "vectors"))
+    results = run(store.query(COLLECTION, ["q"], query_embeddings=[[0.0, 1.0, 0.0, 0.0]], n_results=1))
+    assert results["documents"] == [["beta text"]]
+
+    # Compaction moves the inline texts into the texts file
+    store.collections[COLLECTION].compact()
+    reloaded = LocalVectorStore(str(tmp_path / "vectors"))
+    results = run(reloaded.query(COLLECTION, ["q"], query_embeddings=[[0.0, 1.0, 0.0, 0.0]], n_results=1))
+    assert results["documents"] == [["beta text"]]
+    assert "beta text" not in (path / "log.jsonl").read_text(encoding="utf-8")